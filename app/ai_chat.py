@@ -1,24 +1,12 @@
-import time
 import streamlit as st
-from openai import AzureOpenAI
+from streaming import FrameStream
+from feedback_cache import FeedbackCache, make_key, replay
+from llm_providers import AzureOpenAIProvider, GeminiProvider, hedged_stream
 
 class AIChat:
     """Azure OpenAI chat helper for pronunciation feedback."""
-    def __init__(self):
-        """Initialize the Azure OpenAI client and prompt buffer."""
-        try:
-            self.client = AzureOpenAI(
-                azure_endpoint=st.secrets['AzureGPT']["AZURE_OPENAI_ENDPOINT"],
-                api_key=st.secrets['AzureGPT']["AZURE_OPENAI_API_KEY"],
-                api_version="2024-02-15-preview"
-            )
-        except Exception as e:
-            st.warning(f"Error initializing Azure OpenAI: {str(e)}")
-        self.prompt = ""
-
-    def set_prompt(self, error_data):
-        """Generate conversational prompt for Azure GPT"""
-        base_prompt = """
+    model = "gpt-4.1-nano"
+    prompt_template = """
         You are a ChatGPT 4o English pronunciation tutor. I've just finished a pronunciation practice session and would like your help improving. Here are my mistakes:
 
         {error_summary}
@@ -33,7 +21,28 @@ class AIChat:
         Please keep your response friendly and supportive, as if we're having a face-to-face tutoring session!
         Please respond in Japanese!
         """
-        self.prompt = base_prompt.format(error_summary=error_data)
+
+    api_version = "2024-02-15-preview"
+    system_prompt = "You are a helpful English pronunciation tutor."
+    # seconds to wait for Azure's first token before hedging to Gemini
+    hedge_budget = 3.0
+
+    def __init__(self, providers=None, cache=None):
+        """
+        Initialize the prompt buffer; providers are created on first use.
+
+        Args:
+            providers: optional (primary, secondary) LLMProvider pair, e.g. fakes for tests
+            cache: optional FeedbackCache, defaults to the one under database/
+        """
+        self._providers = providers
+        self.last_provider = None
+        self.prompt = ""
+        self.cache = cache or FeedbackCache()
+
+    def set_prompt(self, error_data):
+        """Generate conversational prompt for Azure GPT"""
+        self.prompt = self.prompt_template.format(error_summary=error_data)
 
     def format_errors_for_azure(self, current_errors):
         """Format error data into prompt text"""
@@ -50,48 +59,60 @@ class AIChat:
         
         return "\n".join(error_summary) if error_summary else None
 
-    def stream_generator(self, response):
-        """Generate streaming response"""
-        full_response = ""
-        for chunk in response:
+    def get_providers(self):
+        """Return the (primary, secondary) providers; secondary is None without a Gemini key."""
+        if self._providers is not None:
+            return self._providers
+        primary = AzureOpenAIProvider(
+            azure_endpoint=st.secrets['AzureGPT']["AZURE_OPENAI_ENDPOINT"],
+            api_key=st.secrets['AzureGPT']["AZURE_OPENAI_API_KEY"],
+            api_version=self.api_version,
+            model=self.model
+        )
+        secondary = None
+        gemini_key = st.secrets.get("Gemini", {}).get("GOOGLE_API_KEY")
+        if gemini_key:
             try:
-                if chunk.choices and hasattr(chunk.choices[0].delta, 'content'):
-                    new_content = chunk.choices[0].delta.content
-                    if new_content is not None:  # Add null check
-                        full_response += new_content
-                        time.sleep(0.01)
-                        yield new_content
+                secondary = GeminiProvider(api_key=gemini_key)
             except Exception as e:
-                st.error(f"Streaming error: {str(e)}")
-                continue
+                print(f"Gemini hedge is unavailable: {e}")
+        self._providers = (primary, secondary)
+        return self._providers
 
-    def get_chat_response(self, error_data):
-        """Get streaming response from Azure GPT"""
+    def request_feedback(self, error_data):
+        """
+        Start a feedback stream without touching the Streamlit page.
+
+        Raises on API errors, so it can also run outside the script thread
+        (see speculative.FeedbackPrefetch). Returns None when there are no errors.
+        """
         formatted_errors = self.format_errors_for_azure(error_data)
         if not formatted_errors:
             return None
-            
+
         self.set_prompt(formatted_errors)
-        
+
+        # identical error summaries get identical feedback, so replay it from disk
+        cache_key = make_key(self.prompt_template, formatted_errors, system=self.system_prompt)
+        cached = self.cache.get(cache_key)
+        if cached:
+            return replay(cached)
+
+        # a slow first token from Azure is hedged with the same request to Gemini
+        primary, secondary = self.get_providers()
+        provider_name, chunks = hedged_stream(
+            primary, secondary, self.prompt, budget=self.hedge_budget, system=self.system_prompt
+        )
+        self.last_provider = provider_name
+
+        # coalesce tokens into frames so the UI is not re-rendered per token
+        stream = FrameStream(chunks)
+        return self.cache.stream_and_store(cache_key, stream, model=provider_name)
+
+    def get_chat_response(self, error_data):
+        """Get streaming response from Azure GPT"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4.1-nano",
-                messages=[
-                    {"role": "system", "content": "You are a helpful English pronunciation tutor."},
-                    {"role": "user", "content": self.prompt}
-                ],
-                stream=True,
-                temperature=0.7,
-                max_tokens=800
-            )
-            
-            # Add validation for response
-            if not response:
-                st.error("Empty response from API")
-                return None
-                
-            return self.stream_generator(response)
-            
+            return self.request_feedback(error_data)
         except Exception as e:
             st.error(f"Error getting chat response: {str(e)}")
             return None
@@ -0,0 +1,194 @@
+"""
+Azure Speech pronunciation assessment without any Streamlit dependency.
+
+Used by the learning page for live attempts and by tools/reassess.py to
+re-score stored recordings offline. ResilientAssessor wraps assess_file
+with jittered retries, a deadline and a circuit breaker per Speech
+resource, failing over to a fallback resource when the primary is down.
+"""
+import time
+import json
+import threading
+import azure.cognitiveservices.speech as speechsdk
+from resilience import CircuitBreaker, CircuitOpenError, retry_call
+
+# settings the learning page has always used
+DEFAULT_OPTIONS = {
+    "language": "en-US",
+    "granularity": "Phoneme",
+    "enable_miscue": True,
+    "enable_prosody": True,
+    "phoneme_alphabet": "IPA",
+}
+
+# cancellation codes worth retrying or failing over on
+TRANSIENT_ERRORS = ("TooManyRequests", "ConnectionFailure", "ServiceTimeout", "ServiceError", "ServiceUnavailable")
+
+class AssessmentError(Exception):
+    """The assessment could not be completed."""
+
+class TransientAssessmentError(AssessmentError):
+    """The Speech service failed in a way that may succeed on retry."""
+
+class NoSpeechError(AssessmentError):
+    """The recording was processed but no speech was recognised (NoMatch or empty NBest)."""
+
+def build_speech_config(speech_key, service_region, language=DEFAULT_OPTIONS["language"]):
+    """Create a SpeechConfig that can be shared by many assessments."""
+    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
+    speech_config.speech_recognition_language = language
+    return speech_config
+
+def build_pronunciation_config(reference_text, options=None):
+    """Create the PronunciationAssessmentConfig for a reference text."""
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    pronunciation_config = speechsdk.PronunciationAssessmentConfig(
+        reference_text=reference_text,
+        grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
+        granularity=getattr(speechsdk.PronunciationAssessmentGranularity, options["granularity"]),
+        enable_miscue=options["enable_miscue"],
+    )
+    if options["enable_prosody"]:
+        pronunciation_config.enable_prosody_assessment()
+    pronunciation_config.phoneme_alphabet = options["phoneme_alphabet"]
+    return pronunciation_config
+
+def assess_file(audio_file, reference_text, speech_config, options=None):
+    """
+    Assess one WAV file against its reference text.
+
+    Args:
+        audio_file: path of a mono WAV recording
+        reference_text: text the learner read
+        speech_config: SpeechConfig from build_speech_config
+        options: overrides of DEFAULT_OPTIONS
+
+    Returns:
+        the detailed JSON result as a dict (the format saved by User.save_pron_history)
+    """
+    audio_config = speechsdk.audio.AudioConfig(filename=audio_file)
+    speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+    build_pronunciation_config(reference_text, options).apply_to(speech_recognizer)
+    result = speech_recognizer.recognize_once_async().get()
+    return parse_result(result)
+
+def parse_result(result):
+    """Turn a recognition result into the JSON dict, raising the matching AssessmentError."""
+    if result.reason == speechsdk.ResultReason.Canceled:
+        details = result.cancellation_details
+        code = getattr(details.code, "name", str(details.code))
+        if details.reason == speechsdk.CancellationReason.EndOfStream:
+            raise NoSpeechError("The recording ended before any speech was recognised")
+        error_type = TransientAssessmentError if code in TRANSIENT_ERRORS else AssessmentError
+        raise error_type(f"Assessment canceled: {code} {details.error_details}")
+    if result.reason == speechsdk.ResultReason.NoMatch:
+        raise NoSpeechError(f"No speech recognised: {result.no_match_details.reason}")
+
+    json_result = result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
+    if not json_result:
+        raise TransientAssessmentError(f"Empty assessment result: {result.reason}")
+    pronunciation_result = json.loads(json_result)
+    nbest = pronunciation_result.get("NBest") or []
+    if not nbest or "PronunciationAssessment" not in nbest[0]:
+        raise NoSpeechError("The assessment result has no scored hypothesis")
+    return pronunciation_result
+
+class SpeechBackend:
+    """One Speech resource (key and region) with its own circuit breaker."""
+    def __init__(self, name, speech_key, service_region, language=DEFAULT_OPTIONS["language"],
+                 failure_threshold=3, reset_timeout=30.0):
+        """Build the shared SpeechConfig and breaker."""
+        self.name = name
+        self.speech_config = build_speech_config(speech_key, service_region, language)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+    def assess(self, audio_file, reference_text, options=None):
+        """Assess one file on this resource."""
+        return assess_file(audio_file, reference_text, self.speech_config, options)
+
+class ResilientAssessor:
+    """Assess with retries on the primary backend and fail over to the fallback."""
+    def __init__(self, primary, fallback=None, attempts=3, base_delay=0.5, deadline=20.0):
+        """
+        Args:
+            primary: SpeechBackend (or any object with name, breaker and assess)
+            fallback: optional backend used when the primary fails or its circuit is open
+            attempts: calls per backend for transient errors
+            base_delay: first retry backoff in seconds
+            deadline: seconds after which no new attempt is started
+        """
+        self.primary = primary
+        self.fallback = fallback
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.deadline = deadline
+        self.last_backend = None
+
+    def backends(self):
+        """Return the backends in failover order."""
+        return [b for b in (self.primary, self.fallback) if b is not None]
+
+    def assess(self, audio_file, reference_text, options=None, bucket=None):
+        """
+        Return the assessment of audio_file, raising NoSpeechError or the last backend error.
+
+        With a bucket (e.g. AssessmentScheduler.bucket) every call to a Speech
+        resource, retries and failover included, first takes a token from it.
+        """
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+        for backend in self.backends():
+            def call():
+                """One request to the backend, within the quota."""
+                if bucket is not None:
+                    bucket.acquire()
+                return backend.assess(audio_file, reference_text, options)
+
+            def attempt():
+                """One call through the backend's breaker."""
+                return backend.breaker.call(
+                    call,
+                    failure_types=(TransientAssessmentError,),
+                    success_types=(NoSpeechError,),
+                )
+            try:
+                result = retry_call(
+                    attempt, retryable=(TransientAssessmentError,), attempts=self.attempts,
+                    base_delay=self.base_delay, deadline=deadline,
+                )
+                self.last_backend = backend.name
+                return result
+            except NoSpeechError:
+                # the recording is the problem, another backend would not help
+                raise
+            except (AssessmentError, CircuitOpenError) as e:
+                print(f"Speech backend {backend.name} failed: {e}")
+                last_error = e
+            if time.monotonic() >= deadline:
+                break
+        raise AssessmentError(f"No Speech backend could assess the recording: {last_error}")
+
+    def status(self):
+        """Return the circuit state of every backend."""
+        return {backend.name: backend.breaker.state for backend in self.backends()}
+
+_lock = threading.Lock()
+_assessors = {}
+
+def get_assessor(primary, fallback=None):
+    """
+    Return the process-wide ResilientAssessor for these resources.
+
+    Args:
+        primary: (speech_key, service_region)
+        fallback: optional (speech_key, service_region) of a second resource
+    """
+    key = (primary, fallback)
+    if key not in _assessors:
+        with _lock:
+            if key not in _assessors:
+                _assessors[key] = ResilientAssessor(
+                    SpeechBackend("primary", *primary),
+                    SpeechBackend("fallback", *fallback) if fallback else None,
+                )
+    return _assessors[key]
@@ -0,0 +1,156 @@
+"""
+Process-wide scheduler for Azure Speech assessment requests.
+
+All sessions of one Streamlit server share the Speech resource quota, so
+every assessment goes through one scheduler instead of calling Azure
+directly:
+    - a token bucket keeps the request rate at the quota (requests/second);
+      jobs take a token for every Speech call they make, so retries and
+      failover count too (ResilientAssessor.assess(bucket=scheduler.bucket))
+    - a fixed number of worker threads keeps concurrent requests at the
+      quota's concurrency limit
+    - interactive requests (a learner waiting on the page) always run
+      before batch requests (tools/reassess.py)
+    - within a priority, learners are served round-robin, so one learner
+      with many queued requests cannot starve the others
+Tickets report their queue position so the page can show it while waiting.
+"""
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from rate_limit import TokenBucket
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = (INTERACTIVE, BATCH)
+
+# defaults for a standard (S0) Speech resource; override with get_scheduler()
+DEFAULT_RATE = 20.0
+DEFAULT_CONCURRENCY = 8
+
+class Ticket(Future):
+    """Future of one scheduled request that knows its place in the queue."""
+    def __init__(self, scheduler, user_name, priority, fn, args, kwargs):
+        """Remember the request; the scheduler fills in the result."""
+        super().__init__()
+        self.scheduler = scheduler
+        self.user_name = user_name
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def position(self):
+        """Return the number of queued requests that will start before this one (0 once started)."""
+        return self.scheduler.position(self)
+
+class AssessmentScheduler:
+    """Rate-limited, priority and per-user fair dispatch of assessment requests."""
+    def __init__(self, rate=DEFAULT_RATE, concurrency=DEFAULT_CONCURRENCY):
+        """Start the worker threads."""
+        self.bucket = TokenBucket(rate, capacity=concurrency)
+        self.concurrency = concurrency
+        # priority -> user -> deque of tickets; user order is the round-robin order
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._condition = threading.Condition()
+        self.running = 0
+        self.completed = 0
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True, name=f"assessment-worker-{i}")
+            for i in range(concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, user_name, fn, *args, priority=INTERACTIVE, **kwargs):
+        """Queue fn(*args, **kwargs) on behalf of user_name and return its Ticket."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        ticket = Ticket(self, user_name, priority, fn, args, kwargs)
+        with self._condition:
+            self._queues[priority].setdefault(user_name, deque()).append(ticket)
+            self._condition.notify()
+        return ticket
+
+    def _next_ticket(self):
+        """Pop the next ticket by priority, then round-robin over users (lock held)."""
+        for priority in PRIORITIES:
+            users = self._queues[priority]
+            if not users:
+                continue
+            user_name, tickets = next(iter(users.items()))
+            ticket = tickets.popleft()
+            # the user goes to the back of the round, or leaves it when empty
+            del users[user_name]
+            if tickets:
+                users[user_name] = tickets
+            return ticket
+        return None
+
+    def _work(self):
+        """Worker thread: take tickets and run them; the jobs take their tokens from bucket."""
+        while True:
+            with self._condition:
+                ticket = self._next_ticket()
+                while ticket is None:
+                    self._condition.wait()
+                    ticket = self._next_ticket()
+                self.running += 1
+            try:
+                if ticket.set_running_or_notify_cancel():
+                    try:
+                        ticket.set_result(ticket.fn(*ticket.args, **ticket.kwargs))
+                    except BaseException as e:
+                        ticket.set_exception(e)
+            finally:
+                with self._condition:
+                    self.running -= 1
+                    self.completed += 1
+
+    def position(self, ticket):
+        """Return how many queued tickets will be dispatched before ticket."""
+        with self._condition:
+            ahead = 0
+            for priority in PRIORITIES:
+                users = self._queues[priority]
+                if priority < ticket.priority:
+                    ahead += sum(len(tickets) for tickets in users.values())
+                    continue
+                tickets = users.get(ticket.user_name)
+                if priority > ticket.priority or tickets is None or ticket not in tickets:
+                    break
+                index = tickets.index(ticket)
+                # users before the owner in this round get index + 1 turns first, the rest index
+                before_owner = True
+                for user_name, queued in users.items():
+                    if user_name == ticket.user_name:
+                        before_owner = False
+                        ahead += index
+                    else:
+                        ahead += min(len(queued), index + 1 if before_owner else index)
+                return ahead
+            return 0
+
+    def stats(self):
+        """Return queue lengths and worker counters."""
+        with self._condition:
+            return {
+                "interactive_queued": sum(len(t) for t in self._queues[INTERACTIVE].values()),
+                "batch_queued": sum(len(t) for t in self._queues[BATCH].values()),
+                "running": self.running,
+                "completed": self.completed,
+                "concurrency": self.concurrency,
+                "rate": self.bucket.rate,
+            }
+
+_lock = threading.Lock()
+_scheduler = None
+
+def get_scheduler(rate=DEFAULT_RATE, concurrency=DEFAULT_CONCURRENCY):
+    """Return the process-wide scheduler, creating it with these limits on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = AssessmentScheduler(rate, concurrency)
+    return _scheduler
@@ -0,0 +1,132 @@
+"""
+Conversation manager for the tutor chat pages.
+
+Keeps one conversation in st.session_state and takes care of three things
+the chat pages used to do by hand on every rerun:
+    - the initial feedback for an error table is generated only once
+    - old turns are folded into a rolling summary so the prompt stays
+      within a token budget, and the retained history is bounded
+    - only the last RENDER_WINDOW (20) messages are rendered on a rerun
+"""
+import hashlib
+import streamlit as st
+
+DEFAULT_TOKEN_BUDGET = 3000
+# turns that always stay verbatim in the prompt
+KEEP_RECENT = 6
+# messages drawn on a rerun, older ones are only in the summary
+RENDER_WINDOW = 20
+SUMMARY_PROMPT = (
+    "Summarise this English pronunciation tutoring conversation in a few sentences. "
+    "Keep the learner's recurring mistakes and the advice already given.\n\n"
+    "{previous}\n\n{conversation}"
+)
+
+def estimate_tokens(text):
+    """Rough token count: about four ASCII characters or one CJK character per token."""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+def truncating_summarizer(previous, messages, limit=800):
+    """Fallback summariser that keeps the opening of every folded message."""
+    lines = [previous] if previous else []
+    for message in messages:
+        lines.append(f"{message['role']}: {message['content'][:200]}")
+    return "\n".join(lines)[-limit:]
+
+def llm_summarizer(provider):
+    """Build a summariser that asks an llm_providers.LLMProvider for the summary."""
+    def summarize(previous, messages):
+        """Summarise previous summary plus the folded messages with the provider."""
+        conversation = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = SUMMARY_PROMPT.format(previous=previous, conversation=conversation)
+        return "".join(provider.stream(prompt))
+    return summarize
+
+class ConversationManager:
+    """One tutor conversation stored in session state."""
+    def __init__(self, key="conversation", token_budget=DEFAULT_TOKEN_BUDGET,
+                 keep_recent=KEEP_RECENT, render_window=RENDER_WINDOW, summarizer=None):
+        """Attach to (or create) the conversation stored under key."""
+        if key not in st.session_state:
+            st.session_state[key] = {
+                "messages": [],
+                "summary": "",
+                "initial_feedback": [],
+            }
+        self.state = st.session_state[key]
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.render_window = render_window
+        self.summarizer = summarizer or truncating_summarizer
+
+    @property
+    def messages(self):
+        """Return the retained (not yet summarised) messages."""
+        return self.state["messages"]
+
+    def add(self, role, content):
+        """Append a message and fold old turns into the summary if over budget."""
+        if content is None:
+            return
+        self.messages.append({"role": role, "content": content})
+        self.compact()
+
+    def ensure_initial_feedback(self, error_table, generate):
+        """
+        Add the initial feedback for error_table unless it was already generated.
+
+        Args:
+            error_table: pandas.DataFrame of the current errors
+            generate: callable returning the feedback text
+
+        Returns:
+            True if new feedback was generated on this call
+
+        A table is only marked as done once generate() returned feedback, so
+        a failed or empty generation is retried on the next run.
+        """
+        if error_table is None or error_table.empty:
+            return False
+        table_key = hashlib.sha256(error_table.to_json().encode("utf-8")).hexdigest()
+        if table_key in self.state["initial_feedback"]:
+            return False
+        feedback = generate()
+        if not feedback:
+            return False
+        self.state["initial_feedback"].append(table_key)
+        self.add("assistant", feedback)
+        return True
+
+    def prompt_tokens(self):
+        """Estimate the tokens of the summary plus retained messages."""
+        return estimate_tokens(self.state["summary"]) + sum(
+            estimate_tokens(m["content"]) for m in self.messages
+        )
+
+    def compact(self):
+        """Fold the oldest messages into the rolling summary while over the token budget."""
+        while self.prompt_tokens() > self.token_budget and len(self.messages) > self.keep_recent:
+            # fold half of the foldable messages at once to keep summariser calls rare
+            fold = max((len(self.messages) - self.keep_recent) // 2, 1)
+            folded = self.messages[:fold]
+            self.state["summary"] = self.summarizer(self.state["summary"], folded)
+            del self.messages[:fold]
+
+    def prompt_text(self, user_input):
+        """Build a single prompt from the summary, recent turns and the new input."""
+        parts = []
+        if self.state["summary"]:
+            parts.append(f"Summary of the conversation so far:\n{self.state['summary']}")
+        parts.extend(f"{m['role']}: {m['content']}" for m in self.messages)
+        parts.append(f"user: {user_input}")
+        return "\n\n".join(parts)
+
+    def render(self):
+        """Draw the summary note and the most recent messages."""
+        if self.state["summary"]:
+            with st.expander("これまでの会話の要約"):
+                st.markdown(self.state["summary"])
+        for message in self.messages[-self.render_window:]:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
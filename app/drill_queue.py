@@ -0,0 +1,161 @@
+"""
+Per-learner priority queue of the words and phrases to drill next.
+
+Every item keeps a recency-weighted accuracy (an exponential moving average,
+so recent attempts count more than old ones). Items live in a min-heap keyed
+by that accuracy; updates push a new heap entry and leave the old one behind
+as stale (lazy deletion), so both updating and choosing the next item are
+O(log n) and never need to rescan the practice history.
+
+The queue is stored in database/<user>/drill_queue.json.
+"""
+import os
+import json
+import heapq
+import itertools
+import weak_index
+
+database_path = "database/"
+
+# weight of the newest attempt in the recency-weighted accuracy
+RECENCY_WEIGHT = 0.4
+# consecutive words under this accuracy are also drilled as a phrase
+LOW_SCORE = 60
+MAX_PHRASE_WORDS = 4
+
+class WeaknessQueue:
+    """Min-heap of drill items ordered by recency-weighted accuracy."""
+    def __init__(self, user_name, items=None):
+        """Build the heap from {item: {"score", "attempts", "kind"}}."""
+        self.user_name = user_name
+        self.items = items or {}
+        self._counter = itertools.count()
+        self._heap = [(entry["score"], next(self._counter), key) for key, entry in self.items.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        """Return the number of distinct drill items."""
+        return len(self.items)
+
+    def update(self, key, accuracy_score, kind="word"):
+        """Fold a new accuracy observation for an item into its weighted score."""
+        entry = self.items.get(key)
+        if entry is None:
+            entry = {"score": float(accuracy_score), "attempts": 0, "kind": kind}
+            self.items[key] = entry
+        else:
+            entry["score"] = RECENCY_WEIGHT * accuracy_score + (1 - RECENCY_WEIGHT) * entry["score"]
+        entry["attempts"] += 1
+        heapq.heappush(self._heap, (entry["score"], next(self._counter), key))
+        # drop stale entries once they dominate the heap
+        if len(self._heap) > 2 * len(self.items) + 64:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Rebuild the heap from the live items only."""
+        self._heap = [(entry["score"], next(self._counter), key) for key, entry in self.items.items()]
+        heapq.heapify(self._heap)
+
+    def _discard_stale(self):
+        """Pop heap entries whose score no longer matches their item."""
+        while self._heap:
+            score, _, key = self._heap[0]
+            entry = self.items.get(key)
+            if entry is not None and entry["score"] == score:
+                return
+            heapq.heappop(self._heap)
+
+    def peek(self):
+        """Return (item, entry) of the weakest item, or None if the queue is empty."""
+        self._discard_stale()
+        if not self._heap:
+            return None
+        key = self._heap[0][2]
+        return key, self.items[key]
+
+    def next_items(self, count=5):
+        """Return the count weakest items without removing them."""
+        taken = []
+        seen = set()
+        while len(taken) < count:
+            self._discard_stale()
+            if not self._heap:
+                break
+            entry = heapq.heappop(self._heap)
+            if entry[2] in seen:
+                continue
+            seen.add(entry[2])
+            taken.append(entry)
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return [(key, self.items[key]) for _, _, key in taken]
+
+    def update_from_result(self, pronunciation_result):
+        """Update the words and weak phrases of one assessment result."""
+        run = []
+        for word in pronunciation_result["NBest"][0]["Words"]:
+            score = word.get("PronunciationAssessment", {}).get("AccuracyScore", 0)
+            key = weak_index.normalize_word(word["Word"])
+            self.update(key, score, kind="word")
+            if score < LOW_SCORE:
+                run.append((key, score))
+                continue
+            self._update_phrase(run)
+            run = []
+        self._update_phrase(run)
+
+    def _update_phrase(self, run):
+        """Record a run of consecutive weak words as a phrase item."""
+        if len(run) < 2:
+            return
+        run = run[:MAX_PHRASE_WORDS]
+        phrase = " ".join(word for word, _ in run)
+        self.update(phrase, sum(score for _, score in run) / len(run), kind="phrase")
+
+    def save(self):
+        """Persist the queue items; the heap is rebuilt on load."""
+        queue_file = _queue_file(self.user_name)
+        os.makedirs(os.path.dirname(queue_file), exist_ok=True)
+        tmp_file = queue_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.items, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_file, queue_file)
+
+def _queue_file(user_name):
+    """Return the path of the drill queue of a user."""
+    return os.path.join(database_path, user_name, "drill_queue.json")
+
+def load_queue(user_name):
+    """Load the drill queue of a user, seeding it from the weak index on first use."""
+    queue_file = _queue_file(user_name)
+    if os.path.exists(queue_file):
+        with open(queue_file, 'r', encoding='utf-8') as f:
+            return WeaknessQueue(user_name, json.load(f))
+    index = weak_index.load_index(user_name)
+    items = {
+        word: {"score": entry["mean_accuracy"], "attempts": entry["attempts"], "kind": "word"}
+        for word, entry in index["words"].items()
+    }
+    queue = WeaknessQueue(user_name, items)
+    queue.save()
+    return queue
+
+def record_attempt(user_name, pronunciation_result, queue=None):
+    """
+    Add an assessed attempt to a learner's queue and return the queue.
+
+    Call it after weak_index.update: a queue seeded now is built from the
+    index, which already holds the attempt, so it is not added a second time.
+
+    Args:
+        user_name: the learner
+        pronunciation_result: the Azure result of the attempt
+        queue: the queue already loaded in this session, if any
+    """
+    if queue is None:
+        if not os.path.exists(_queue_file(user_name)):
+            return load_queue(user_name)
+        queue = load_queue(user_name)
+    queue.update_from_result(pronunciation_result)
+    queue.save()
+    return queue
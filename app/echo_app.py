@@ -2,8 +2,10 @@ import json
 import streamlit as st
 from time import sleep
 import base64
+import secrets
 from streamlit_extras.customize_running import center_running
 from user import User
+import state_store
 
 st.set_page_config(layout="wide", page_icon="logo/done_all.png")
 
@@ -43,8 +45,66 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+def get_state_store():
+    """Return the shared state store of the [State] secrets, or None to keep state in this process only."""
+    try:
+        return state_store.get_store(st.secrets.get("State", {}))
+    except Exception as e:
+        print(f"State store unavailable: {e}")
+        return None
+
+def remember_login(user):
+    """Record the login under a new session token, so any app process can restore it."""
+    store = get_state_store()
+    if store is None:
+        return
+    token = secrets.token_urlsafe(24)
+    try:
+        store.set(state_store.session_key(token), {"user": user.name}, state_store.SESSION_TTL)
+        st.session_state.session_token = token
+    except Exception as e:
+        print(f"Failed to store the session: {e}")
+
+def restore_login():
+    """Log the browser back in from its session token after a worker restart or a move to another process."""
+    token = st.query_params.get("session")
+    store = get_state_store()
+    if not token or store is None:
+        return
+    try:
+        session = store.get(state_store.session_key(token))
+    except Exception as e:
+        print(f"Failed to load the session: {e}")
+        return
+    user = User.restore(session["user"]) if session else None
+    if user:
+        st.session_state.logged_in = True
+        st.session_state.user = user
+        # a token is good for one restore: the URL gets a new one and a copied or logged link stops working
+        remember_login(user)
+        try:
+            store.delete(state_store.session_key(token))
+        except Exception as e:
+            print(f"Failed to delete the old session: {e}")
+
+def forget_login():
+    """Remove the stored login of this browser session."""
+    token = st.session_state.get("session_token")
+    store = get_state_store()
+    if token and store is not None:
+        try:
+            store.delete(state_store.session_key(token))
+        except Exception as e:
+            print(f"Failed to delete the session: {e}")
+    st.query_params.clear()
+
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
+    restore_login()
+
+# page switches clear the query string; keep the token in the URL on every run
+if st.session_state.get("session_token") and st.query_params.get("session") != st.session_state.session_token:
+    st.query_params["session"] = st.session_state.session_token
 
 # ! learning_data is very important! it will be used to reload the page
 if "learning_data" not in st.session_state:
@@ -79,6 +139,7 @@ def login():
                 st.session_state.logged_in = True
                 # !!!pass the user obj to any page!!!
                 st.session_state.user = user
+                remember_login(user)
                 global learning_page
                 st.switch_page(learning_page)
             
@@ -105,11 +166,13 @@ def register():
                 st.session_state.logged_in = True
                 # !!!pass the user obj to any page!!!
                 st.session_state.user = user
+                remember_login(user)
                 global login_page
                 st.switch_page(login_page)
 
 def logout():
     """Clear session state and rerun the app after logout."""
+    forget_login()
     # After logging out, delete all the keys of st.session_state
     for key in st.session_state.keys():
         del st.session_state[key]
@@ -121,7 +184,8 @@ register_page = st.Page(register, title="新規登録", icon=":material/login:")
 logout_page = st.Page(logout, title="ログアウト", icon=":material/logout:")
 
 # Learning-related Page
-learning_page = st.Page("../app/learn/echo_learning.py", title='フォノエコーラーニング', icon="🔥")
+# default page of a logged-in session, e.g. one restored from its session token on the root URL
+learning_page = st.Page("../app/learn/echo_learning.py", title='フォノエコーラーニング', icon="🔥", default=True)
 # chatbox_page = st.Page("../app/learn/chatbox.py", title='フォノエコー発音先生', icon="🚨")
 
 # Set the navigation of sidebar
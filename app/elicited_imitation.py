@@ -2,6 +2,7 @@ import streamlit as st
 from PIL import Image
 import os
 from datetime import datetime
+import object_store
 
 def save_audio_file(base_dir, audio_data, sentence_num):
     """Persist recorded audio bytes to a timestamped WAV file."""
@@ -15,9 +16,8 @@ def save_audio_file(base_dir, audio_data, sentence_num):
         filename = f"sentence{sentence_num}_{timestamp}.wav"
         file_path = os.path.join(base_dir, filename)
         
-        # Save audio data - use getvalue() to get the bytes
-        with open(file_path, "wb") as f:
-            f.write(audio_data.getvalue())
+        # Save audio data - use getvalue() to get the bytes; uploaded in the background
+        object_store.persist(file_path, audio_data.getvalue())
             
         return file_path
     except Exception as e:
@@ -0,0 +1,114 @@
+"""
+On-disk cache of AI tutor feedback.
+
+Learners on the same lesson often make exactly the same mistakes, which
+produces the same error summary and therefore the same prompt. Feedback is
+stored under a hash of (prompt template, system prompt, normalised error
+summary) in database/feedback_cache/<key>.json. The key does not name a
+model: a hedged request may be answered by either provider, and the entry
+records which one did. Entries expire after a TTL and the cache
+keeps at most max_entries files, evicting the least recently used first.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+from streaming import FrameStream
+
+cache_path = "database/feedback_cache/"
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+# size of the pieces a cached answer is replayed in
+REPLAY_CHUNK = 16
+
+def normalize_summary(error_summary):
+    """Normalise whitespace, case and line order of an error summary."""
+    lines = [re.sub(r"\s+", " ", line).strip().lower() for line in error_summary.splitlines()]
+    return "\n".join(sorted(line for line in lines if line))
+
+def make_key(template, error_summary, system=None):
+    """Return the cache key of a feedback request, whichever provider answers it."""
+    payload = json.dumps(
+        {"template": template, "system": system, "errors": normalize_summary(error_summary)},
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def replay(text):
+    """Replay cached text as a stream, without any artificial delay."""
+    chunks = (text[i:i + REPLAY_CHUNK] for i in range(0, len(text), REPLAY_CHUNK))
+    return FrameStream(chunks)
+
+class FeedbackCache:
+    """Size-bounded, TTL-based feedback cache stored as one JSON file per entry."""
+    def __init__(self, path=cache_path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """Create the cache folder if needed."""
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(self.path, exist_ok=True)
+
+    def _entry_file(self, key):
+        """Return the file holding a cache entry."""
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached feedback for key, or None on a miss or expired entry."""
+        entry_file = self._entry_file(key)
+        try:
+            with open(entry_file, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            self._remove(entry_file)
+            return None
+        # the modification time doubles as the last access time for LRU eviction
+        os.utime(entry_file)
+        return entry["text"]
+
+    def put(self, key, text, model=None):
+        """Store feedback under key and evict old entries beyond the size bound."""
+        if not text:
+            return
+        entry_file = self._entry_file(key)
+        tmp_file = entry_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"created": time.time(), "model": model, "text": text}, f, ensure_ascii=False)
+        os.replace(tmp_file, entry_file)
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over max_entries."""
+        entries = []
+        now = time.time()
+        for file_name in os.listdir(self.path):
+            if not file_name.endswith('.json'):
+                continue
+            entry_file = os.path.join(self.path, file_name)
+            try:
+                mtime = os.path.getmtime(entry_file)
+            except FileNotFoundError:
+                continue
+            entries.append((mtime, entry_file))
+        entries.sort()
+        excess = len(entries) - self.max_entries
+        for i, (mtime, entry_file) in enumerate(entries):
+            # expiry is checked on the last access time here; get() checks creation time
+            if i < excess or now - mtime > self.ttl:
+                self._remove(entry_file)
+
+    def _remove(self, entry_file):
+        """Delete an entry, ignoring races with other sessions."""
+        try:
+            os.remove(entry_file)
+        except FileNotFoundError:
+            pass
+
+    def stream_and_store(self, key, stream, model=None):
+        """Pass a FrameStream through and store its text once it completes."""
+        for frame in stream:
+            yield frame
+        self.put(key, stream.text, model=model)
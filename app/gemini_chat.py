@@ -1,7 +1,9 @@
 import streamlit as st
 import google.generativeai as genai
-import time
 import pandas as pd
+from streaming import FrameStream
+from conversation import ConversationManager, llm_summarizer
+from llm_providers import GeminiProvider
 
 class AIChat:
     """Gemini-backed chat helper for pronunciation feedback."""
@@ -49,15 +51,8 @@ class AIChat:
         return "\n".join(error_summary)
 
     def stream_generator(self, response):
-        """Yield streaming content chunks while collecting the full response."""
-        # used to save the full response in a streaming mode
-        full_response = ""
-        for chunk in response:
-            if chunk.text:
-                new_content = chunk.text
-                full_response += new_content
-                time.sleep(0.01)
-                yield new_content
+        """Yield streaming content chunks coalesced into render frames."""
+        return FrameStream(chunk.text for chunk in response)
 
     def initial_output(self, error_data):
         """Generate the initial response from assessment errors."""
@@ -67,9 +62,7 @@ class AIChat:
         self.set_prompt(formatted_errors)
 
         response = self.model.generate_content(self.prompt, stream=True)
-        full_response = ""
-        for content in self.stream_generator(response):
-            full_response += content
+        full_response = "".join(self.stream_generator(response))
         st.session_state.initial_response = full_response
         return full_response
 
@@ -78,38 +71,24 @@ def main():
     """Run the Streamlit chat UI for the Gemini assistant."""
     st.title("AI Chatbox")
 
-    # Initialize chat history
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-
     # Initialize AIChat instance
     ai_chat = AIChat()
 
-    # Show chat history
-    def show_history():
-        """Render prior chat messages from session state."""
-        for message in st.session_state.messages:
-            if message is not None:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
-
-    # Display chat messages from history on app rerun
-    show_history()
-
-    # Check if error_table exists and is not empty
-    if "error_table" in st.session_state and not st.session_state.error_table.empty:
-        # Set the prompt
-        ai_chat.set_prompt(st.session_state.error_table)
+    # history, rolling summary and initial-feedback dedup live in the manager
+    conversation = ConversationManager(
+        summarizer=llm_summarizer(GeminiProvider(api_key=st.secrets["Gemini"]["GOOGLE_API_KEY"]))
+    )
 
-        # Generate initial output but do not display it yet
-        ai_chat.initial_output()
+    # Generate the initial feedback once per error table, not on every rerun
+    if "error_table" in st.session_state and st.session_state.error_table is not None:
+        error_table = st.session_state.error_table
+        with st.spinner("フィードバックを生成中"):
+            conversation.ensure_initial_feedback(
+                error_table, lambda: ai_chat.initial_output(error_table.to_dict(orient="index"))
+            )
 
-        # Add the initial response to the chat history
-        st.session_state.messages.append({"role": "assistant", "content": st.session_state.initial_response})
-
-        # Display the initial response
-        with st.chat_message("assistant"):
-            st.markdown(st.session_state.initial_response)
+    # Display recent chat messages on app rerun
+    conversation.render()
 
     def chat_bot():    
         """Handle user input and stream assistant replies."""
@@ -118,17 +97,15 @@ def main():
             # Display user message in chat message container
             with st.chat_message("user"):
                 st.markdown(prompt)
-            # Add user message to chat history
-            st.session_state.messages.append({"role": "user", "content": prompt})
 
-            # Generate and display assistant response
-            response = ai_chat.model.generate_content(prompt, stream=True)
-            full_response = ""
+            # Generate and display assistant response with the summarised context
+            response = ai_chat.model.generate_content(conversation.prompt_text(prompt), stream=True)
             with st.chat_message("assistant"):
-                for content in ai_chat.stream_generator(response):
-                    st.markdown(content)
-                    full_response += content
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+                full_response = st.write_stream(ai_chat.stream_generator(response))
+
+            # Add both turns to the chat history
+            conversation.add("user", prompt)
+            conversation.add("assistant", full_response)
 
     # Run the chat bot
     chat_bot()
@@ -1,124 +1,82 @@
 import streamlit as st
 from ai_chat import AIChat
+from conversation import ConversationManager
+from llm_providers import hedged_stream
+from streaming import FrameStream
 
 """
-This file has been deprecated,
-because ai_chat.py has been changed,
-the file can not run any more
+This page is deprecated (the learning page shows the AI feedback itself),
+but still runs: the initial feedback comes from AIChat.request_feedback and
+chat answers stream from AIChat's providers with the same hedging.
 """
 
-def show_history():
-    """Render prior chat messages from session state."""
-    for message in st.session_state.messages:
-        if message is not None:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
+def initial_feedback_text(ai_chat):
+    """Return the tutor feedback on the learner's current errors as text."""
+    learning_state = st.session_state.get('learning_state') or {}
+    try:
+        stream = ai_chat.request_feedback(learning_state.get('current_errors'))
+        return "".join(stream) if stream is not None else None
+    except Exception as e:
+        st.error(f"Error getting chat response: {str(e)}")
+        return None
+
+def stream_reply(ai_chat, prompt_text):
+    """Stream the tutor's answer to prompt_text into the page and return the full text."""
+    try:
+        primary, secondary = ai_chat.get_providers()
+        _, chunks = hedged_stream(
+            primary, secondary, prompt_text, budget=ai_chat.hedge_budget, system=ai_chat.system_prompt
+        )
+        return st.write_stream(FrameStream(chunks))
+    except Exception as e:
+        st.error(f"Error getting chat response: {str(e)}")
+        return None
+
+def chat_page():
+    """Shared body of the chat page and the chat tab."""
+    # Chat history, rolling summary and initial-feedback dedup
+    conversation = ConversationManager()
 
-def main():
-    """Run the deprecated chatbox UI."""
-    st.title("エコー発音先生🤖🧠🇦🇮😎")
-
-    # Initialize chat history
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    
     # Initialize AIChat instance
     ai_chat = AIChat()
 
-    # show history chat first
-    show_history()
+    # Check if error_table exists and is not empty, generate its feedback only once
+    if st.session_state.get('ai_initial_input') is not None:
+        error_table = st.session_state['ai_initial_input']
+        with st.spinner("フィードバックを作成中"):
+            conversation.ensure_initial_feedback(error_table, lambda: initial_feedback_text(ai_chat))
 
-    # Check if error_table exists and is not empty
-    if ("ai_initial_input" in st.session_state and 
-        st.session_state['ai_initial_input'] is not None and 
-        not st.session_state['ai_initial_input'].empty):
-        
-        # Set the prompt and generate new feedback
-        ai_chat.set_prompt(st.session_state['ai_initial_input'])
-        
-        # Generate initial output
-        ai_chat.initial_output()
-        # Add initial response to chat history
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": st.session_state.initial_response
-        })
-        
+    # show recent history chat first
+    conversation.render()
 
-    def chat_bot():    
+    def chat_bot():
         """Handle user input and stream assistant responses."""
         # React to user input
         if prompt := st.chat_input("聞きたい内容を入れてください"):
             # Display user message in chat message container
             with st.chat_message("user"):
                 st.markdown(prompt)
-            # Add user message to chat history
-            st.session_state.messages.append({"role": "user", "content": prompt})
 
-            # Generate and display assistant response
-            response = ai_chat.model.generate_content(prompt, stream=True)
-            full_response = ""
+            # Generate and display assistant response with the summarised context
             with st.chat_message("assistant"):
-                for content in ai_chat.stream_generator(response):
-                    st.markdown(content)
-                    full_response += content
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+                full_response = stream_reply(ai_chat, conversation.prompt_text(prompt))
+
+            # Add both turns to the chat history
+            conversation.add("user", prompt)
+            conversation.add("assistant", full_response)
 
     # Run the chat bot
     chat_bot()
     st.session_state['ai_initial_input'] = None
 
+def main():
+    """Run the deprecated chatbox UI."""
+    st.title("エコー発音先生🤖🧠🇦🇮😎")
+    chat_page()
+
 def ai_chat_tab():
     """Render the chat tab UI for the learning page."""
-    # Initialize chat history
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    
-    # Initialize AIChat instance
-    ai_chat = AIChat()
-
-    # show history chat first
-    show_history()
-
-    # Check if error_table exists and is not empty
-    if ("ai_initial_input" in st.session_state and 
-        st.session_state['ai_initial_input'] is not None and 
-        not st.session_state['ai_initial_input'].empty):
-        
-        # Set the prompt and generate new feedback
-        ai_chat.set_prompt(st.session_state['ai_initial_input'])
-        
-        # Generate initial output
-        ai_chat.initial_output()
-        # Add initial response to chat history
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": st.session_state.initial_response
-        })
-        
-
-    def chat_bot():    
-        """Handle user input and stream assistant responses."""
-        # React to user input
-        if prompt := st.chat_input("聞きたい内容を入れてください"):
-            # Display user message in chat message container
-            with st.chat_message("user"):
-                st.markdown(prompt)
-            # Add user message to chat history
-            st.session_state.messages.append({"role": "user", "content": prompt})
-
-            # Generate and display assistant response
-            response = ai_chat.model.generate_content(prompt, stream=True)
-            full_response = ""
-            with st.chat_message("assistant"):
-                for content in ai_chat.stream_generator(response):
-                    st.markdown(content)
-                    full_response += content
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
-
-    # Run the chat bot
-    chat_bot()
-    st.session_state['ai_initial_input'] = None
+    chat_page()
 
 with st.spinner("ロード中"):
     main()
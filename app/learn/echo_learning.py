@@ -1,6 +1,8 @@
 import io
 import os
+import copy
 import json
+import hashlib
 import librosa
 import time
 import numpy as np
@@ -8,21 +10,35 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
 import soundfile as sf
-import azure.cognitiveservices.speech as speechsdk
 from audio_recorder_streamlit import audio_recorder
 from streamlit_extras.grid import grid as extras_grid
 from dataset import Dataset
 from datetime import datetime
 import traceback
+from concurrent.futures import wait
 from streamlit_extras.let_it_rain import rain
 import altair as alt
 from ai_chat import AIChat
+import assessment
+import assessment_scheduler
+import telemetry
+import traffic_replay
+import weak_index
+import drill_queue
+import session_memory
+import state_store
+import object_store
+from speculative import FeedbackPrefetch
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 import sys
 import os
 # Ensure the tools directory is in the Python path
 sys.path.append(os.path.abspath("app/tools"))	
 
+# shown when Azure processed the recording but recognised no speech
+NO_SPEECH_MESSAGE = "音声を認識できませんでした。マイクに近づいて、もう一度録音してください。"
+
 # Initialize global variables for storing radar chart per attempt and error types
 plt.rcParams["font.family"] = "MS Gothic"
 
@@ -197,6 +213,33 @@ def create_waveform_plot(audio_file, pronunciation_result):
 
     return fig
 
+def get_assessment_scheduler():
+    """Return the process-wide assessment scheduler sized to the Speech quota."""
+    speech_secrets = st.secrets.get("Azure_Speech", {})
+    return assessment_scheduler.get_scheduler(
+        rate=float(speech_secrets.get("MAX_REQUESTS_PER_SECOND", assessment_scheduler.DEFAULT_RATE)),
+        concurrency=int(speech_secrets.get("MAX_CONCURRENCY", assessment_scheduler.DEFAULT_CONCURRENCY)),
+    )
+
+def get_speech_assessor(primary, fallback=None):
+    """Return the Azure assessor, or the captured-traffic one when Recording.REPLAY_DIR is set."""
+    replay_dir = st.secrets.get("Recording", {}).get("REPLAY_DIR")
+    if replay_dir:
+        return traffic_replay.get_replay_assessor(replay_dir)
+    return assessment.get_assessor(primary, fallback)
+
+def wait_for_ticket(ticket, poll_interval=0.5):
+    """Show the queue position of a scheduled assessment until it finishes."""
+    placeholder = st.empty()
+    while not ticket.done():
+        position = ticket.position()
+        if position:
+            placeholder.info(f"順番待ち中です… あと{position}件")
+        else:
+            placeholder.info("発音を評価しています…")
+        wait([ticket], timeout=poll_interval)
+    placeholder.empty()
+
 def pronunciation_assessment(audio_file, reference_text):
     """Run Azure Speech pronunciation assessment for a recorded file."""
     print("進入 pronunciation_assessment 関数")
@@ -208,42 +251,31 @@ def pronunciation_assessment(audio_file, reference_text):
     )
     print(f"SPEECH_KEY: {speech_key}, SPEECH_REGION: {service_region}")
 
-    speech_config = speechsdk.SpeechConfig(
-        subscription=speech_key, region=service_region
-    )
-    print("SpeechConfig 作成成功")
-
-    audio_config = speechsdk.audio.AudioConfig(filename=audio_file)
-    print("AudioConfig 作成成功")
-
-    pronunciation_config = speechsdk.PronunciationAssessmentConfig(
-        reference_text=reference_text,
-        grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
-        granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
-        enable_miscue=True,
-    )
-    pronunciation_config.enable_prosody_assessment()
-    pronunciation_config.phoneme_alphabet = "IPA"
-    print("PronunciationAssessmentConfig 作成成功")
+    # an optional second Speech resource takes over while the primary is failing
+    speech_secrets = st.secrets["Azure_Speech"]
+    fallback = None
+    if speech_secrets.get("FALLBACK_SPEECH_KEY") and speech_secrets.get("FALLBACK_SPEECH_REGION"):
+        fallback = (speech_secrets["FALLBACK_SPEECH_KEY"], speech_secrets["FALLBACK_SPEECH_REGION"])
 
     try:
-        speech_recognizer = speechsdk.SpeechRecognizer(
-            speech_config=speech_config, audio_config=audio_config
-        )
-        print("SpeechRecognizer 作成成功")
-
-        pronunciation_config.apply_to(speech_recognizer)
-        print("PronunciationConfig 適用成功")
-
-        result = speech_recognizer.recognize_once_async().get()
-        print(f"識別結果: {result}")
-
-        pronunciation_result = json.loads(
-            result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
-        )
+        assessor = get_speech_assessor((speech_key, service_region), fallback)
+        print("SpeechConfig 作成成功")
+
+        # every session shares the Speech quota, so the request waits its turn in the scheduler
+        scheduler = get_assessment_scheduler()
+        user_name = st.session_state.user.name if st.session_state.get('user') else "anonymous"
+        assess_fn = assessor.assess
+        if st.secrets.get("Recording", {}).get("CAPTURE"):
+            assess_fn = traffic_replay.get_recorder().wrap(assess_fn, user_name)
+        ticket = scheduler.submit(user_name, assess_fn, audio_file, reference_text, bucket=scheduler.bucket)
+        wait_for_ticket(ticket)
+        pronunciation_result = ticket.result()
         print("JSON 結果解析成功")
 
         return pronunciation_result
+    except assessment.NoSpeechError:
+        # not a failure of the app; the callers ask the learner to record again
+        raise
     except Exception as e:
         st.error(f"pronunciation_assessment 関数で例外をキャッチしました: {str(e)}")
         import traceback
@@ -406,6 +438,8 @@ def save_audio_bytes_to_wav(user, audio_bytes, selection, sample_rate=48000, cha
     output_filename = f"{user.today_path}/{selection}-{current_time}.wav"
     sf.write(output_filename, audio_data, sample_rate, format="WAV", subtype="PCM_16")
     print("Audio saved!")
+    # the assessment reads the local file; the storage copy is made in the background
+    object_store.persist(output_filename)
     return output_filename
 
 def get_audio_from_mic_v2(user, selection):
@@ -483,9 +517,14 @@ def save_scores_to_json(user, lesson_index, scores_history):
     # Save updated data
     with open(json_file, 'w', encoding='utf-8') as f:
         json.dump(all_scores, f, indent=4)
+    object_store.persist(json_file)
 
 def save_error_history(user, lesson_index, error_data):
-    """Save error history to JSON file"""
+    """Save error history to JSON file
+
+    The saved total is the file's previous total plus this attempt's errors,
+    not the session copy, which compact_learning_state may have trimmed.
+    """
     # Create scores directory if not exists
     scores_dir = os.path.join(user.today_path, "scores")
     if not os.path.exists(scores_dir):
@@ -503,14 +542,20 @@ def save_error_history(user, lesson_index, error_data):
         
         # Update with new error data
         lesson_key = f"lesson_{lesson_index}"
+        total = copy.deepcopy(all_errors.get(lesson_key, {}).get('total', {}))
+        for error_type, data in error_data['current'].items():
+            entry = total.setdefault(error_type, {'count': 0, 'words': []})
+            entry['count'] += data['count']
+            entry['words'].extend(data['words'])
         all_errors[lesson_key] = {
             'current': error_data['current'],
-            'total': error_data['total']
+            'total': total
         }
         
         # Save updated data
         with open(error_file, 'w', encoding='utf-8') as f:
             json.dump(all_errors, f, indent=4, ensure_ascii=False)
+        object_store.persist(error_file)
             
     except Exception as e:
         st.error(f"Error saving error history: {str(e)}")
@@ -560,11 +605,24 @@ def store_scores(user, lesson_index, pronunciation_result):
     
     # Save to files
     save_scores_to_json(user, lesson_index, st.session_state.learning_state['scores_history'][lesson_index])
-    save_error_history(user, lesson_index, {
-        'current': error_data,
-        'total': st.session_state.learning_state['total_errors'][lesson_index]
-    })
+    save_error_history(user, lesson_index, {'current': error_data})
     
+    # keep the learner's weak word/phoneme index current without rescanning history;
+    # on first use it is built from the warehouse, which save_pron_history already
+    # gave this attempt, so it is not added a second time
+    try:
+        weak_index.update(user.name, pronunciation_result)
+    except Exception as e:
+        print(f"Failed to update the weak index: {e}")
+
+    # feed the adaptive drill queue with this attempt (a queue seeded now already has it)
+    try:
+        st.session_state.drill_queue = drill_queue.record_attempt(
+            user.name, pronunciation_result, st.session_state.get('drill_queue')
+        )
+    except Exception as e:
+        print(f"Failed to update the drill queue: {e}")
+
     # Add this line to force reload the scores
     user.load_scores_history(lesson_index)
 
@@ -749,6 +807,161 @@ def initialize_lesson_state(user, lesson_index):
             'PronScore': []
         }
 
+def start_feedback_prefetch(ai_chat, error_data):
+    """Start generating AI feedback for error_data in the background."""
+    # resolve the providers here, st.secrets belongs to the script thread
+    try:
+        ai_chat.get_providers()
+    except Exception as e:
+        print(f"AI feedback is unavailable: {e}")
+        return None
+    trace_id = telemetry.current_trace_id()
+
+    def timed_feedback():
+        """Stream the feedback, recording time to first frame and total time."""
+        start = time.perf_counter()
+        error = None
+        first = True
+        try:
+            stream = ai_chat.request_feedback(error_data)
+            if stream is None:
+                return
+            for frame in stream:
+                if first:
+                    first = False
+                    telemetry.record("ai_first_frame", time.perf_counter() - start, trace_id=trace_id,
+                                     provider=ai_chat.last_provider or "cache")
+                yield frame
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            telemetry.record("ai_feedback", time.perf_counter() - start, trace_id=trace_id, error=error,
+                             provider=ai_chat.last_provider or "cache")
+
+    return FeedbackPrefetch(timed_feedback)
+
+def show_figure(container, figure):
+    """Draw a stored chart, either a live figure or PNG bytes left by session_memory."""
+    if isinstance(figure, bytes):
+        container.image(figure, use_container_width=True)
+    else:
+        container.pyplot(figure)
+
+def track_session_memory(user):
+    """Account this session's memory and keep it within the Memory.SESSION_BUDGET_MB budget."""
+    memory_secrets = st.secrets.get("Memory", {})
+    if memory_secrets.get("TRACEMALLOC"):
+        session_memory.start_tracemalloc()
+    try:
+        ctx = get_script_run_ctx()
+        session_memory.account(
+            ctx.session_id if ctx else "local", user.name, st.session_state,
+            budget_mb=float(memory_secrets.get("SESSION_BUDGET_MB", session_memory.DEFAULT_BUDGET_MB)),
+            max_error_words=int(memory_secrets.get("MAX_ERROR_WORDS", session_memory.DEFAULT_MAX_ERROR_WORDS)),
+        )
+    except Exception as e:
+        print(f"Failed to account session memory: {e}")
+
+def get_state_store():
+    """Return the shared state store of the [State] secrets, or None to keep state in this process only."""
+    try:
+        return state_store.get_store(st.secrets.get("State", {}))
+    except Exception as e:
+        print(f"State store unavailable: {e}")
+        return None
+
+def restore_learner_state(user):
+    """Load today's lesson, scores and errors kept by another (or a restarted) app process."""
+    if 'learning_state' in st.session_state:
+        return
+    store = get_state_store()
+    if store is None:
+        return
+    try:
+        document = store.get(state_store.learner_key(user.name))
+    except Exception as e:
+        print(f"Failed to load the learner state: {e}")
+        return
+    # yesterday's state is reloaded from today's files instead
+    if not document or document.get("day") != user.today_path:
+        return
+    lesson_index, learning_state, scores_history = state_store.load_learner_state(document)
+    st.session_state.lesson_index = lesson_index
+    if learning_state is not None:
+        st.session_state.learning_state = learning_state
+    if scores_history is not None:
+        st.session_state.scores_history = scores_history
+
+def persist_learner_state(user):
+    """Write the learner's state to the shared store when this run changed it."""
+    store = get_state_store()
+    if store is None:
+        return
+    document = state_store.dump_learner_state(
+        user.today_path,
+        st.session_state.get('lesson_index', 0),
+        st.session_state.get('learning_state'),
+        st.session_state.get('scores_history'),
+    )
+    digest = hashlib.sha1(json.dumps(document, sort_keys=True).encode('utf-8')).hexdigest()
+    try:
+        if digest != st.session_state.get('learner_state_digest'):
+            store.set(state_store.learner_key(user.name), document, state_store.LEARNER_TTL)
+            st.session_state.learner_state_digest = digest
+        # keep the login alive while the learner is active
+        token = st.session_state.get('session_token')
+        if token and time.time() - st.session_state.get('session_touched', 0) > 300:
+            store.touch(state_store.session_key(token), state_store.SESSION_TTL)
+            st.session_state.session_touched = time.time()
+    except Exception as e:
+        print(f"Failed to store the learner state: {e}")
+
+def get_drill_queue(user):
+    """Return the learner's drill queue, loading it once per session."""
+    if 'drill_queue' not in st.session_state:
+        st.session_state.drill_queue = drill_queue.load_queue(user.name)
+    return st.session_state.drill_queue
+
+def drill_tab(user):
+    """Serve the learner's weakest words and phrases for focused practice."""
+    queue = get_drill_queue(user)
+    next_item = queue.peek()
+    if next_item is None:
+        st.info("まだドリルがありません。まずはレッスンを練習しましょう！")
+        return
+    item, entry = next_item
+
+    st.markdown(f"## {item}")
+    st.caption(f"最近の正確性: {entry['score']:.1f}　練習回数: {entry['attempts']}")
+    with st.form(key='drill_phase'):
+        audio_file_io = st.audio_input("苦手な単語を発音しましょう！", key='drill_audio_input')
+        if_drilled = st.form_submit_button('ドリル開始！')
+    if if_drilled and audio_file_io:
+        audio_file_name = save_audio_bytes_to_wav(user, audio_file_io, "drill")
+        try:
+            with telemetry.trace("drill", user=user.name):
+                pronunciation_result = pronunciation_assessment(
+                    audio_file=audio_file_name, reference_text=item
+                )
+            queue.update_from_result(pronunciation_result)
+            if entry['kind'] == 'phrase':
+                overall = pronunciation_result["NBest"][0]["PronunciationAssessment"]
+                queue.update(item, overall["AccuracyScore"], kind='phrase')
+            queue.save()
+            st.markdown(create_syllable_table(pronunciation_result), unsafe_allow_html=True)
+        except assessment.NoSpeechError:
+            st.warning(NO_SPEECH_MESSAGE)
+        except Exception as e:
+            st.error(f"エラーが発生しました: {str(e)}")
+            print(traceback.format_exc())
+
+    with st.expander("次のドリル"):
+        st.dataframe(pd.DataFrame(
+            [(key, value['kind'], round(value['score'], 1), value['attempts']) for key, value in queue.next_items(5)],
+            columns=['単語・フレーズ', '種類', '最近の正確性', '練習回数']
+        ), use_container_width=True)
+
 # layout of learning page
 def main():
     """Render the main learning page UI."""
@@ -756,9 +969,17 @@ def main():
         st.warning("No user is logined! Something wrong happened!")
     # reset the ai_intial_input to None for state control    
     st.session_state.ai_initial_input = None 
+    st.session_state.feedback_prefetch = None
+    # optional Prometheus scrape endpoint, started once per server process
+    telemetry_secrets = st.secrets.get("Telemetry", {})
+    metrics_port = telemetry_secrets.get("METRICS_PORT")
+    if metrics_port:
+        telemetry.start_metrics_server(int(metrics_port), telemetry_secrets.get("METRICS_HOST", "127.0.0.1"))
+    user = st.session_state.user
+    # a restarted worker or another app process picks up where the learner left off
+    restore_learner_state(user)
     if 'lesson_index' not in st.session_state:
         st.session_state.lesson_index = 0   
-    user = st.session_state.user
     initialize_lesson_state(user, st.session_state.lesson_index)
     # Initialize state at the beginning
     ai_chat = AIChat()
@@ -778,7 +999,7 @@ def main():
     st.title("フォノエコー英語発音トレーニングシステム😆")
     
     # set the names of tabs
-    tab1, tab2 = st.tabs(['ラーニング', 'まとめ'])
+    tab1, tab2, tab3 = st.tabs(['ラーニング', 'まとめ', 'ドリル'])
     with tab1:
         # the layout of the grid structure
         my_grid = extras_grid([0.1, 0.1, 0.8], [0.2, 0.8], 1, 1, [0.3, 0.7], 1, 1, vertical_align="center")
@@ -820,52 +1041,65 @@ def main():
         if if_started:
             # if overall_score and all the other are all None, don't run this
             # save the audio when the submit button is clicked
-            audio_file_name = save_audio_bytes_to_wav(user, audio_file_io, selection)
-            if audio_file_name and not overall_score:
-                try:
-                    pronunciation_result = pronunciation_assessment(
-                        audio_file=audio_file_name, reference_text=text_content
-                    )
-                    # save the pronunciation_result to disk
-                    user.save_pron_history(selection, pronunciation_result)
-
-                    overall_score = pronunciation_result["NBest"][0]["PronunciationAssessment"]
-
-                    # store the pronunciation results into session_state
-                    store_scores(user, st.session_state.lesson_index, pronunciation_result)
-
-                    # Create visualizations and analysis
-                    radar_chart = create_radar_chart(pronunciation_result)
-                    waveform_plot = create_waveform_plot(audio_file_name, pronunciation_result)
-
-                    # Process errors - moved collect_errors before create_error_table
-                    error_data = collect_errors(pronunciation_result)
-                    st.session_state.current_errors = error_data
-                    error_table = create_error_table()
-
-                    syllable_table = create_syllable_table(pronunciation_result)
-
-                    # Store results in session state
-                    st.session_state['learning_data']['overall_score'] = overall_score
-                    st.session_state['learning_data']['radar_chart'] = radar_chart
-                    st.session_state['learning_data']['waveform_plot'] = waveform_plot
-                    st.session_state['learning_data']['error_table'] = error_table
-                    st.session_state['learning_data']['syllable_table'] = syllable_table
-
-                    # Data for AI
-                    st.session_state['ai_initial_input'] = error_table
-                except Exception as e:
-                    st.error(f"エラーが発生しました: {str(e)}")
-                    st.error(
-                        "音声ファイルの処理中に問題が発生した可能性があります。もう一度試すか、別の音声ファイルを使用してください。"
-                    )
-                    print(traceback.format_exc())
+            with telemetry.trace("attempt", user=user.name, lesson=selection):
+                with telemetry.span("save_audio"):
+                    audio_file_name = save_audio_bytes_to_wav(user, audio_file_io, selection)
+                if audio_file_name and not overall_score:
+                    try:
+                        with telemetry.span("assessment"):
+                            pronunciation_result = pronunciation_assessment(
+                                audio_file=audio_file_name, reference_text=text_content
+                            )
+                        # start the AI feedback now so it is generated while the charts render
+                        error_data = collect_errors(pronunciation_result)
+                        st.session_state.feedback_prefetch = start_feedback_prefetch(ai_chat, error_data)
+
+                        # save the pronunciation_result to disk
+                        with telemetry.span("save_history"):
+                            user.save_pron_history(selection, pronunciation_result)
+
+                        overall_score = pronunciation_result["NBest"][0]["PronunciationAssessment"]
+
+                        # store the pronunciation results into session_state
+                        with telemetry.span("store_scores"):
+                            store_scores(user, st.session_state.lesson_index, pronunciation_result)
+
+                        # Create visualizations and analysis
+                        with telemetry.span("radar_chart"):
+                            radar_chart = create_radar_chart(pronunciation_result)
+                        with telemetry.span("waveform_plot"):
+                            waveform_plot = create_waveform_plot(audio_file_name, pronunciation_result)
+
+                        # Process errors - collect_errors already ran before the feedback prefetch
+                        st.session_state.current_errors = error_data
+                        error_table = create_error_table()
+
+                        with telemetry.span("syllable_table"):
+                            syllable_table = create_syllable_table(pronunciation_result)
+
+                        # Store results in session state
+                        st.session_state['learning_data']['overall_score'] = overall_score
+                        st.session_state['learning_data']['radar_chart'] = radar_chart
+                        st.session_state['learning_data']['waveform_plot'] = waveform_plot
+                        st.session_state['learning_data']['error_table'] = error_table
+                        st.session_state['learning_data']['syllable_table'] = syllable_table
+
+                        # Data for AI
+                        st.session_state['ai_initial_input'] = error_table
+                    except assessment.NoSpeechError:
+                        st.warning(NO_SPEECH_MESSAGE)
+                    except Exception as e:
+                        st.error(f"エラーが発生しました: {str(e)}")
+                        st.error(
+                            "音声ファイルの処理中に問題が発生した可能性があります。もう一度試すか、別の音声ファイルを使用してください。"
+                        )
+                        print(traceback.format_exc())
         # row4: waveform
         if st.session_state['learning_data']['waveform_plot']:
-            my_grid.pyplot(st.session_state['learning_data']['waveform_plot'])
+            show_figure(my_grid, st.session_state['learning_data']['waveform_plot'])
         # row5: radar chart and errors' type
         if st.session_state['learning_data']['radar_chart']:
-            my_grid.pyplot(st.session_state['learning_data']['radar_chart'])
+            show_figure(my_grid, st.session_state['learning_data']['radar_chart'])
         if st.session_state['learning_data']['error_table'] is not None:
             my_grid.dataframe(st.session_state['learning_data']['error_table'], use_container_width=True)
         
@@ -896,9 +1130,25 @@ def main():
                 st.write("練習を始めましょう！")
             elif if_started:
                 st.write("GPTによる発音のアドバイス:")
-                feedback = ai_chat.get_chat_response(st.session_state.learning_state['current_errors'])
-                if feedback:
-                    st.write(feedback)
+                prefetch = st.session_state.get('feedback_prefetch')
+                if prefetch is not None:
+                    # the request has been running since the assessment finished
+                    st.write_stream(prefetch.stream())
+                    if prefetch.error is not None:
+                        st.error(f"Error getting chat response: {str(prefetch.error)}")
+                else:
+                    feedback = ai_chat.get_chat_response(st.session_state.learning_state['current_errors'])
+                    if feedback:
+                        st.write_stream(feedback)
             else:
                 st.write("まだ頑張りましょう！")
-main()
+
+    with tab3:
+        drill_tab(user)
+
+    # size this session and compact it if it outgrew its budget
+    track_session_memory(user)
+    persist_learner_state(user)
+# st.Page runs this file as __main__; importing it (e.g. from benchmarks) only defines the functions
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import pandas as pd
+import altair as alt
+import streamlit as st
+from datetime import datetime, timedelta
+
+# Ensure the app directory is in the Python path
+sys.path.append(os.path.abspath("app"))
+import telemetry
+import session_memory
+
+def show_stage_latency(traces):
+    """Show the per-stage latency table and a p50/p95 bar chart."""
+    summary = telemetry.stage_summary(traces)
+    st.write("### ステージ別レイテンシ (ms)")
+    st.dataframe(summary, use_container_width=True)
+    if summary.empty:
+        return
+    # p95 as the bar and p50 as a tick on it (grouped bars need yOffset, which altair 4 lacks)
+    base = alt.Chart(summary.reset_index()).encode(y=alt.Y("stage:N", sort="-x", title=None))
+    p95 = base.mark_bar(color="#4c78a8").encode(x=alt.X("p95:Q", title="ms (bar: p95, tick: p50)"))
+    p50 = base.mark_tick(color="#f58518", thickness=3, size=18).encode(x="p50:Q")
+    st.altair_chart(p95 + p50, use_container_width=True)
+
+def show_recent_attempts(traces, limit=20):
+    """Show the stage durations of the most recent attempts, one row per trace."""
+    st.write("### 最近の提出")
+    attempts = traces[traces["stage"] == "attempt"].sort_values("time", ascending=False).head(limit)
+    if attempts.empty:
+        st.write("まだ記録がありません。")
+        return
+    stages = traces[traces["trace_id"].isin(attempts["trace_id"])]
+    table = stages.pivot_table(index="trace_id", columns="stage", values="duration_ms", aggfunc="sum")
+    info_columns = [c for c in ["time", "user", "lesson"] if c in attempts.columns]
+    table = attempts.set_index("trace_id")[info_columns].join(table)
+    st.dataframe(table.round(1), use_container_width=True)
+
+def show_ops_summary():
+    """Operator view of where the time of an attempt goes."""
+    st.title("運用サマリー: 提出処理のレイテンシ")
+    hours = st.slider("対象期間 (時間)", min_value=1, max_value=24 * 7, value=24)
+    traces = telemetry.load_traces(since=datetime.now() - timedelta(hours=hours))
+    if traces.empty:
+        st.info(f"{telemetry.trace_log_path} にトレースがありません。")
+        return
+
+    st.write(f"- 提出数: {(traces['stage'] == 'attempt').sum()}")
+    st.write(f"- エラーになったステージ: {traces['error'].notna().sum()}")
+    show_stage_latency(traces)
+    show_recent_attempts(traces)
+
+    for metrics_file in telemetry.metrics_files():
+        with st.expander(f"Prometheus metrics ({os.path.basename(metrics_file)})"):
+            with open(metrics_file, 'r', encoding='utf-8') as f:
+                st.code(f.read(), language="text")
+
+def show_session_memory():
+    """Operator view of the memory each session keeps, per server process."""
+    st.header("セッション別メモリ")
+    snapshots = session_memory.load_snapshots()
+    if not snapshots:
+        st.info(f"{session_memory.snapshot_path} にスナップショットがありません。")
+        return
+    for snapshot in snapshots:
+        rss = f"{snapshot['rss_bytes'] / 2**20:.0f} MB" if snapshot.get("rss_bytes") else "不明"
+        st.write(f"#### プロセス {snapshot['pid']} (RSS {rss}, pyplot の未解放図 {snapshot['pyplot_open_figures']})")
+        rows = []
+        for session_id, entry in snapshot["sessions"].items():
+            rows.append({
+                "session": session_id[:8],
+                "user": entry["user"],
+                "MB": round(entry["total_bytes"] / 2**20, 2),
+                "MB before budget": round(entry["total_before_bytes"] / 2**20, 2),
+                "budget MB": round(entry["budget_bytes"] / 2**20) if entry.get("budget_bytes") else None,
+                "compactions": entry["compactions"],
+                "largest entries": ", ".join(f"{k} {v / 2**20:.2f} MB" for k, v in list(entry["entries"].items())[:3]),
+                "last actions": "; ".join(entry.get("last_actions", [])),
+                "updated": datetime.fromtimestamp(entry["updated"]).strftime("%H:%M:%S"),
+            })
+        if rows:
+            st.dataframe(pd.DataFrame(rows).sort_values("MB", ascending=False), use_container_width=True)
+        if snapshot.get("top_allocations"):
+            with st.expander("tracemalloc: 上位の確保箇所"):
+                st.dataframe(pd.DataFrame(snapshot["top_allocations"]), use_container_width=True)
+
+if __name__ == "__main__":
+    show_ops_summary()
+    show_session_memory()
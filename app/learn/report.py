@@ -1,10 +1,16 @@
 import os
+import sys
 import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
 from collections import defaultdict
 
+# Ensure the app directory is in the Python path
+sys.path.append(os.path.abspath("app"))
+import warehouse
+import weak_index
+
 def get_sorted_json_files(folder_path):
     """Get all JSON files in the folder, return their names sorted in ascending order."""
     try:
@@ -49,6 +55,21 @@ def analyze_pronunciation_errors(json_contents):
     
     return dict(error_counts), total_words
 
+def analyze_word_errors(words_df):
+    """Vectorised counterpart of analyze_pronunciation_errors over a warehouse words table."""
+    total_words = len(words_df)
+    error_types = words_df['error_type'].fillna('None')
+    error_counts = error_types[error_types != 'None'].value_counts()
+    return error_counts.to_dict(), total_words
+
+def load_warehouse_words(user_name, dates=None):
+    """Bring the warehouse up to date for a user and scan their words table."""
+    warehouse.ingest_user(user_name)
+    return warehouse.load_table(
+        "words", users=[user_name], dates=dates,
+        columns=["attempt_id", "lesson", "word", "accuracy_score", "error_type"]
+    )
+
 def create_error_pie_chart(error_counts, total_words):
     """Create a pie chart showing error distribution."""
     if not error_counts:
@@ -89,7 +110,36 @@ def show_pronunciation_analysis(folder_path):
     
     # Analyze errors
     error_counts, total_words = analyze_pronunciation_errors(json_contents)
-    
+    show_error_statistics(error_counts, total_words)
+
+def show_user_analysis(user_name, dates=None):
+    """Show pronunciation analysis for a user from the columnar warehouse."""
+    st.title("発音分析レポート")
+
+    words_df = load_warehouse_words(user_name, dates)
+    if words_df.empty:
+        st.error("練習記録が見つかりません。")
+        return
+
+    error_counts, total_words = analyze_word_errors(words_df)
+    show_error_statistics(error_counts, total_words)
+    show_weak_words(user_name)
+
+def show_weak_words(user_name, top=10):
+    """Show the learner's weakest words from the weak index."""
+    index = weak_index.load_index(user_name)
+    st.write("### 苦手な単語")
+    weak_df = pd.DataFrame(
+        [
+            (word, entry["attempts"], round(entry["mean_accuracy"], 1), sum(entry["error_types"].values()))
+            for word, entry in weak_index.weakest_words(index, top=top)
+        ],
+        columns=["単語", "回数", "平均正確性", "エラー回数"]
+    )
+    st.dataframe(weak_df)
+
+def show_error_statistics(error_counts, total_words):
+    """Render the statistics, pie chart and detail table of error counts."""
     # Show statistics
     st.write("### 基本統計")
     st.write(f"- 分析した単語数: {total_words}")
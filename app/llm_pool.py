@@ -0,0 +1,95 @@
+"""
+Process-wide pool of LLM clients.
+
+Streamlit re-executes the page script on every interaction, but imported
+modules stay in memory, so clients created here are shared by all sessions
+and reruns of one server process. Each client owns a keep-alive httpx
+connection pool; a trace hook counts how many requests had to open a new
+connection, which is exposed through pool_metrics().
+"""
+import threading
+import httpx
+from openai import AzureOpenAI
+
+# connection pool limits of each client
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 120
+
+class PoolStats:
+    """Thread-safe counters of requests and newly opened connections."""
+    def __init__(self):
+        """Start all counters at zero."""
+        self._lock = threading.Lock()
+        self.clients = 0
+        self.requests = 0
+        self.connections_opened = 0
+
+    def on_request(self, request):
+        """httpx request hook: count the request and trace connection setup."""
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    def trace(self, event_name, info):
+        """httpcore trace callback: count completed TCP connects."""
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+
+    def snapshot(self):
+        """Return the counters and the share of requests served on a reused connection."""
+        with self._lock:
+            reused = max(self.requests - self.connections_opened, 0)
+            return {
+                "clients": self.clients,
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            }
+
+_lock = threading.Lock()
+_clients = {}
+stats = PoolStats()
+
+def _http_client():
+    """Create an httpx client with keep-alive limits and the stats hook."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        event_hooks={"request": [stats.on_request]},
+    )
+
+def get_azure_client(azure_endpoint, api_key, api_version):
+    """Return the shared AzureOpenAI client for these settings, creating it on first use."""
+    key = ("azure", azure_endpoint, api_key, api_version)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        # another session may have created it while we waited for the lock
+        if key not in _clients:
+            _clients[key] = AzureOpenAI(
+                azure_endpoint=azure_endpoint,
+                api_key=api_key,
+                api_version=api_version,
+                http_client=_http_client(),
+            )
+            stats.clients += 1
+        return _clients[key]
+
+def pool_metrics():
+    """Return connection reuse metrics of the pool."""
+    return stats.snapshot()
+
+def close_all():
+    """Close every pooled client, e.g. at process shutdown."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,234 @@
+"""
+Tutor LLM providers behind one streaming interface, plus hedged requests.
+
+Every provider implements stream(prompt, system, cancel_event) and yields
+text chunks. hedged_stream() sends a request to the primary provider and, if
+no first token arrived within the latency budget (or the primary failed
+before producing one), sends the same request to the secondary provider.
+Whichever stream produces a token first wins and the other one is cancelled.
+"""
+import time
+import queue
+import threading
+import llm_pool
+
+class LLMProvider:
+    """Common interface of the tutor LLM backends."""
+    name = "provider"
+
+    def stream(self, prompt, system=None, cancel_event=None):
+        """Yield text chunks of the answer to prompt until done or cancelled."""
+        raise NotImplementedError
+
+class AzureOpenAIProvider(LLMProvider):
+    """Azure OpenAI chat completions through the shared client pool."""
+    name = "azure_openai"
+
+    def __init__(self, azure_endpoint, api_key, api_version, model, temperature=0.7, max_tokens=800):
+        """Remember the connection and sampling settings."""
+        self.azure_endpoint = azure_endpoint
+        self.api_key = api_key
+        self.api_version = api_version
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def stream(self, prompt, system=None, cancel_event=None):
+        """Yield the delta contents of a streamed chat completion."""
+        client = llm_pool.get_azure_client(self.azure_endpoint, self.api_key, self.api_version)
+        messages = [{"role": "user", "content": prompt}]
+        if system:
+            messages.insert(0, {"role": "system", "content": system})
+        response = client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens
+        )
+        if not response:
+            raise ValueError("Empty response from API")
+        finished = False
+        try:
+            for chunk in response:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                # a malformed chunk raises: this runs off the script thread, so the
+                # error travels to the consumer instead of being reported here
+                if chunk.choices and hasattr(chunk.choices[0].delta, 'content'):
+                    new_content = chunk.choices[0].delta.content
+                    if new_content is not None:  # Add null check
+                        yield new_content
+                if chunk.choices and chunk.choices[0].finish_reason is not None:
+                    # stop before the SDK reads [DONE]: it closes the response right
+                    # there, and a response closed with unread bytes loses its connection
+                    finished = True
+                    break
+        finally:
+            if finished:
+                drain(response.response)
+            # closing a fully read response releases the HTTP connection back to the pool
+            response.close()
+
+def drain(http_response):
+    """Read the rest of a streamed body (the [DONE] event) so its keep-alive connection can be reused."""
+    try:
+        for _ in http_response.stream:
+            pass
+    except Exception as e:
+        # the connection is simply not reused
+        print(f"Failed to drain the response: {e}")
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini streamed generation."""
+    name = "gemini"
+
+    def __init__(self, api_key, model="gemini-pro"):
+        """Configure the Gemini SDK for this API key."""
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model)
+
+    def stream(self, prompt, system=None, cancel_event=None):
+        """Yield the text of each streamed Gemini chunk."""
+        if system:
+            prompt = f"{system}\n\n{prompt}"
+        response = self.model.generate_content(prompt, stream=True)
+        for chunk in response:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if chunk.text:
+                yield chunk.text
+
+class FakeProvider(LLMProvider):
+    """Local provider with scripted latency and failures, for tests and benchmarks."""
+    def __init__(self, text="これはテスト用のフィードバックです。", first_token_delay=0.0,
+                 tokens_per_second=100.0, fail_before_first_token=False, fail_after_tokens=None,
+                 name="fake"):
+        """Configure the answer text, timing and failure mode."""
+        self.text = text
+        self.first_token_delay = first_token_delay
+        self.tokens_per_second = tokens_per_second
+        self.fail_before_first_token = fail_before_first_token
+        self.fail_after_tokens = fail_after_tokens
+        self.name = name
+        self.cancelled = False
+
+    def stream(self, prompt, system=None, cancel_event=None):
+        """Yield the configured text word by word at the configured rate."""
+        if cancel_event is not None and cancel_event.wait(self.first_token_delay):
+            self.cancelled = True
+            return
+        if cancel_event is None:
+            time.sleep(self.first_token_delay)
+        if self.fail_before_first_token:
+            raise ConnectionError(f"{self.name} failed before the first token")
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i, token in enumerate(self.text.split(" ")):
+            if self.fail_after_tokens is not None and i >= self.fail_after_tokens:
+                raise ConnectionError(f"{self.name} failed after {i} tokens")
+            if cancel_event is not None and cancel_event.is_set():
+                self.cancelled = True
+                return
+            yield token if i == 0 else " " + token
+            if interval:
+                time.sleep(interval)
+
+# sentinel that ends a runner's chunk queue
+_END = object()
+
+class _Runner:
+    """Drain one provider stream in a daemon thread."""
+    def __init__(self, provider, prompt, system, events):
+        """Start streaming and report the first token or failure on events."""
+        self.provider = provider
+        self.chunks = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(prompt, system, events), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, prompt, system, events):
+        """Background thread: forward chunks and signal the first one."""
+        first = True
+        try:
+            for chunk in self.provider.stream(prompt, system=system, cancel_event=self.cancel_event):
+                if self.cancel_event.is_set():
+                    break
+                if not chunk:
+                    continue
+                self.chunks.put(chunk)
+                if first:
+                    first = False
+                    events.put(("first", self))
+            if first:
+                events.put(("empty", self))
+        except Exception as e:
+            self.error = e
+            if first:
+                events.put(("error", self))
+        finally:
+            self.chunks.put(_END)
+
+    def cancel(self):
+        """Ask the provider stream to stop as soon as possible."""
+        self.cancel_event.set()
+
+    def __iter__(self):
+        """Yield the chunks of the stream, re-raising a mid-stream failure."""
+        while True:
+            chunk = self.chunks.get()
+            if chunk is _END:
+                break
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+def hedged_stream(primary, secondary, prompt, budget, system=None):
+    """
+    Stream from primary, hedging to secondary after budget seconds without a token.
+
+    Args:
+        primary: LLMProvider asked first
+        secondary: LLMProvider used as the hedge, or None to disable hedging
+        prompt: user prompt
+        budget: seconds to wait for the primary's first token
+        system: optional system prompt
+
+    Returns:
+        (provider name, iterator of text chunks) of the winning stream
+    """
+    events = queue.Queue()
+    runners = [_Runner(primary, prompt, system, events)]
+    deadline = time.monotonic() + budget
+    failed = []
+    winner = None
+
+    while winner is None:
+        hedged = len(runners) > 1 or secondary is None
+        timeout = None if hedged else max(deadline - time.monotonic(), 0)
+        try:
+            kind, runner = events.get(timeout=timeout)
+        except queue.Empty:
+            # latency budget spent without a token: race the secondary
+            runners.append(_Runner(secondary, prompt, system, events))
+            continue
+        if kind == "first":
+            winner = runner
+            continue
+        failed.append(runner)
+        if not hedged:
+            # the primary failed early, no need to wait for the budget
+            runners.append(_Runner(secondary, prompt, system, events))
+        elif len(failed) == len(runners):
+            errors = [r.error for r in failed if r.error is not None]
+            if errors:
+                raise errors[-1]
+            return failed[0].provider.name, iter(())
+
+    for runner in runners:
+        if runner is not winner:
+            runner.cancel()
+    return winner.provider.name, iter(winner)
@@ -0,0 +1,540 @@
+"""
+Object storage for recordings and results, written through a background upload queue.
+
+database/ stays the working copy of every app process: the assessment reads
+the WAV it was just given, the report page and the warehouse read the JSONs.
+With a [Storage] backend configured, every recording and result saved there
+is also copied to the backend by a background queue, so the copy never
+costs a request any network latency. The file itself is always written
+synchronously by persist(), so a failed write reaches the caller and the
+queue only ever uploads files that are already on disk. Backends:
+
+    - LocalStorage: a folder, e.g. a shared mount
+    - S3Storage: any S3-compatible service (AWS S3, MinIO, ...), signed with
+      AWS Signature Version 4 through requests; see tools/fake_s3_server.py
+      for a local stand-in
+
+Keys are paths relative to database/ (database/alice/x.wav -> alice/x.wav).
+Uploads are retried with jittered backoff; files that still fail are
+appended to database/upload_queue/failed.jsonl and retried by the queue
+later and on the next start. Without [Storage] persist() writes the file
+and uploads nothing, as before.
+"""
+import os
+import io
+import json
+import time
+import hmac
+import queue
+import atexit
+import hashlib
+import threading
+import mimetypes
+import xml.etree.ElementTree as ET
+from urllib.parse import quote, urlparse
+import requests
+from resilience import retry_call
+
+database_path = "database/"
+journal_path = "database/upload_queue/"
+
+DEFAULT_WORKERS = 2
+DEFAULT_ATTEMPTS = 5
+# journaled failures are retried this often while the queue is idle
+FAILED_RETRY_INTERVAL = 60
+# seconds the process waits at exit for queued uploads
+FLUSH_TIMEOUT = 10
+
+class StorageError(Exception):
+    """Error response of a storage backend."""
+    def __init__(self, message, status=None):
+        """Remember the HTTP status, if any, to tell retryable errors apart."""
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self):
+        """Throttling and server errors are worth another attempt, client errors are not."""
+        return self.status is None or self.status == 429 or self.status >= 500
+
+class Storage:
+    """Common interface of the storage backends."""
+    name = "storage"
+
+    def put_file(self, key, path):
+        """Store the contents of a local file under key."""
+        with open(path, 'rb') as f:
+            self.put_bytes(key, f.read())
+
+    def put_bytes(self, key, data):
+        """Store data under key."""
+        raise NotImplementedError
+
+    def get_bytes(self, key):
+        """Return the data stored under key, or None if missing."""
+        raise NotImplementedError
+
+    def exists(self, key):
+        """Return whether key is stored."""
+        return self.get_bytes(key) is not None
+
+    def delete(self, key):
+        """Remove key if present."""
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        """Return the stored keys starting with prefix."""
+        raise NotImplementedError
+
+class LocalStorage(Storage):
+    """Objects stored as files under a root folder."""
+    name = "local"
+
+    def __init__(self, root):
+        """Create the root folder if needed."""
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        """Return the file of key, refusing keys that leave the root."""
+        path = os.path.normpath(os.path.join(self.root, key))
+        if os.path.commonpath([os.path.abspath(path), os.path.abspath(self.root)]) != os.path.abspath(self.root):
+            raise StorageError(f"Key outside the storage root: {key}", status=400)
+        return path
+
+    def put_bytes(self, key, data):
+        """Write data to key's file atomically."""
+        write_atomic(self._path(key), data)
+
+    def put_file(self, key, path):
+        """Copy a local file to key's file atomically."""
+        target = self._path(key)
+        if os.path.abspath(target) == os.path.abspath(path):
+            return
+        with open(path, 'rb') as f:
+            write_atomic(target, f.read())
+
+    def get_bytes(self, key):
+        """Return the data stored under key, or None if missing."""
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key):
+        """Return whether key's file exists."""
+        return os.path.isfile(self._path(key))
+
+    def delete(self, key):
+        """Remove key's file if present."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix=""):
+        """Return the stored keys starting with prefix."""
+        keys = []
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(folder, name), self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+def _sha256(data):
+    """Return the hex SHA-256 of bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def _hmac(key, message):
+    """Return the HMAC-SHA256 of message under key."""
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+def sign_v4(method, host, path, query, headers, payload_hash, access_key, secret_key, region,
+            amz_date, service="s3"):
+    """
+    Return the Authorization header of an AWS Signature Version 4 request.
+
+    Args:
+        method: HTTP method
+        host: Host header (with the port if it is not the default one)
+        path: URI-encoded path, e.g. "/bucket/alice/x.wav"
+        query: {name: value} of the query string
+        headers: {name: value} of the headers to sign besides host
+        payload_hash: hex SHA-256 of the body (also sent as x-amz-content-sha256)
+        amz_date: request time as YYYYMMDDTHHMMSSZ (also sent as x-amz-date)
+    """
+    signed = {name.lower(): " ".join(str(value).split()) for name, value in headers.items()}
+    signed["host"] = host
+    names = sorted(signed)
+    canonical_query = "&".join(
+        f"{quote(str(k), safe='-_.~')}={quote(str(v), safe='-_.~')}" for k, v in sorted(query.items())
+    )
+    canonical_request = "\n".join([
+        method,
+        path,
+        canonical_query,
+        "".join(f"{name}:{signed[name]}\n" for name in names),
+        ";".join(names),
+        payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, _sha256(canonical_request.encode('utf-8'))])
+    key = _hmac(f"AWS4{secret_key}".encode('utf-8'), amz_date[:8])
+    for part in (region, service, "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={';'.join(names)}, Signature={signature}"
+
+class S3Storage(Storage):
+    """Objects stored in a bucket of an S3-compatible service, addressed path-style."""
+    name = "s3"
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, region="us-east-1", prefix="",
+                 timeout=30.0, session=None):
+        """
+        Args:
+            endpoint: service URL, e.g. https://s3.ap-northeast-1.amazonaws.com or http://localhost:9000
+            bucket: bucket name
+            access_key, secret_key: credentials
+            region: signing region
+            prefix: prepended to every key, e.g. "phonoecho/"
+            timeout: seconds per HTTP request
+            session: optional requests.Session to share
+        """
+        self.endpoint = endpoint.rstrip('/')
+        self.host = urlparse(self.endpoint).netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def _request(self, method, key=None, query=None, data=b""):
+        """Send a signed request for the bucket (key None) or one of its objects."""
+        path = f"/{self.bucket}"
+        if key is not None:
+            path += "/" + self.prefix + key
+        path = quote(path, safe="/-_.~")
+        query = query or {}
+        payload_hash = _sha256(data)
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        headers = {"x-amz-content-sha256": payload_hash, "x-amz-date": amz_date}
+        if method == "PUT" and key is not None:
+            headers["Content-Type"] = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        headers["Authorization"] = sign_v4(
+            method, self.host, path, query, headers, payload_hash,
+            self.access_key, self.secret_key, self.region, amz_date
+        )
+        url = self.endpoint + path
+        if query:
+            url += "?" + "&".join(f"{quote(str(k), safe='-_.~')}={quote(str(v), safe='-_.~')}"
+                                  for k, v in sorted(query.items()))
+        try:
+            response = self.session.request(method, url, data=data or None, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise StorageError(f"{method} {path} failed: {e}") from e
+        if response.status_code == 404 and method in ("GET", "HEAD", "DELETE") and key is not None:
+            return None
+        if response.status_code >= 300:
+            raise StorageError(
+                f"{method} {path} returned HTTP {response.status_code}: {response.text[:200]}",
+                status=response.status_code
+            )
+        return response
+
+    def create_bucket(self):
+        """Create the bucket, ignoring that it already exists."""
+        try:
+            self._request("PUT")
+        except StorageError as e:
+            if e.status != 409:
+                raise
+
+    def put_bytes(self, key, data):
+        """Upload data under key."""
+        self._request("PUT", key, data=data)
+
+    def get_bytes(self, key):
+        """Return the object stored under key, or None if missing."""
+        response = self._request("GET", key)
+        return None if response is None else response.content
+
+    def exists(self, key):
+        """Return whether key is stored, without downloading it."""
+        return self._request("HEAD", key) is not None
+
+    def delete(self, key):
+        """Remove key if present."""
+        self._request("DELETE", key)
+
+    def list(self, prefix=""):
+        """Return the stored keys starting with prefix (ListObjectsV2, following continuation tokens)."""
+        keys = []
+        query = {"list-type": "2", "prefix": self.prefix + prefix}
+        while True:
+            root = ET.fromstring(self._request("GET", query=query).content)
+            # the namespace is optional in S3-compatible services
+            ns = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ""
+            for contents in root.iter(f"{ns}Contents"):
+                keys.append(contents.find(f"{ns}Key").text[len(self.prefix):])
+            token = root.find(f"{ns}NextContinuationToken")
+            if root.findtext(f"{ns}IsTruncated") != "true" or token is None:
+                return keys
+            query["continuation-token"] = token.text
+
+def write_atomic(path, data):
+    """Write bytes to path through a temporary file, so readers never see a partial file."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def key_for(path):
+    """Return the storage key of a file under database/ (its path relative to database/)."""
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(database_path))
+    if relative.startswith(".."):
+        relative = os.path.relpath(os.path.abspath(path))
+    return relative.replace(os.sep, "/")
+
+class UploadQueue:
+    """Background workers that copy files already on disk to a storage backend."""
+    def __init__(self, storage, workers=DEFAULT_WORKERS, attempts=DEFAULT_ATTEMPTS,
+                 base_delay=0.5, max_delay=8.0, journal=journal_path):
+        """Start the worker threads."""
+        self.storage = storage
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.journal = journal
+        self.stats = {"queued": 0, "uploaded": 0, "retried": 0, "failed": 0, "coalesced": 0}
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._active = set()
+        self._lock = threading.Lock()
+        self._last_failed_retry = time.monotonic()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"upload-{i}", daemon=True) for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, path):
+        """
+        Queue a file for upload.
+
+        A file that is already waiting is not queued twice; the upload reads
+        the file when it runs, so rewrites in between are uploaded once.
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            if path in self._pending:
+                self.stats["coalesced"] += 1
+                return
+            self._pending.add(path)
+            self.stats["queued"] += 1
+        self._queue.put(path)
+
+    def pending(self):
+        """Return the number of files waiting or being uploaded."""
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout=None):
+        """Wait until the queue is empty; return whether it emptied in time."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _work(self):
+        """Worker loop: run jobs, and retry journaled failures while idle."""
+        while True:
+            try:
+                path = self._queue.get(timeout=FAILED_RETRY_INTERVAL / 4)
+            except queue.Empty:
+                if time.monotonic() - self._last_failed_retry > FAILED_RETRY_INTERVAL:
+                    self._last_failed_retry = time.monotonic()
+                    self.retry_failed()
+                continue
+            try:
+                self._run(path)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, path):
+        """Upload one file, journaling it if every attempt failed."""
+        with self._lock:
+            self._pending.discard(path)
+            self._active.add(path)
+        try:
+            if not os.path.exists(path):
+                # removed since it was queued, e.g. a rebuilt lesson folder
+                return
+            calls = []
+            def upload():
+                calls.append(1)
+                try:
+                    self.storage.put_file(key_for(path), path)
+                except StorageError as e:
+                    if not e.retryable:
+                        # e.g. a rejected signature: another attempt would fail the same way
+                        raise RuntimeError(str(e)) from e
+                    raise
+            try:
+                retry_call(upload, retryable=(StorageError, OSError), attempts=self.attempts,
+                           base_delay=self.base_delay, max_delay=self.max_delay)
+            finally:
+                self._count("retried", len(calls) - 1)
+            self._count("uploaded")
+        except Exception as e:
+            self._count("failed")
+            print(f"Failed to store {path}: {e}")
+            if os.path.exists(path):
+                self._journal_failure(path, e)
+        finally:
+            with self._lock:
+                self._active.discard(path)
+
+    def _count(self, name, amount=1):
+        """Add to one of the queue statistics."""
+        with self._lock:
+            self.stats[name] += amount
+
+    def _journal_failure(self, path, error):
+        """Append a failed upload to the journal for a later retry."""
+        try:
+            os.makedirs(self.journal, exist_ok=True)
+            with open(os.path.join(self.journal, "failed.jsonl"), 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"path": path, "error": str(error), "time": time.time()},
+                                   ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Failed to journal the upload of {path}: {e}")
+
+    def retry_failed(self):
+        """Queue the journaled failures again; return how many were queued."""
+        journal_file = os.path.join(self.journal, "failed.jsonl")
+        claimed = os.path.join(self.journal, f"failed-{os.getpid()}-{threading.get_ident()}.retrying")
+        try:
+            # the rename decides which process retries the journal
+            os.replace(journal_file, claimed)
+        except OSError:
+            return 0
+        paths = []
+        with open(claimed, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    paths.append(json.loads(line)["path"])
+                except (json.JSONDecodeError, KeyError):
+                    continue
+        os.remove(claimed)
+        for path in dict.fromkeys(paths):
+            if os.path.exists(path):
+                self.submit(path)
+        return len(paths)
+
+    def close(self, timeout=FLUSH_TIMEOUT):
+        """Wait for the queue at exit and journal what is left for the next start."""
+        if self.flush(timeout):
+            return
+        # uploads still running may be cut off by the exit; uploading twice is harmless
+        with self._lock:
+            active = list(self._active)
+        for path in active:
+            self._journal_failure(path, "upload running at exit")
+        while True:
+            try:
+                path = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._journal_failure(path, "not uploaded before exit")
+            finally:
+                self._queue.task_done()
+
+def create_storage(settings):
+    """Return the backend configured by the [Storage] settings, or None if disabled."""
+    backend = (settings.get("BACKEND") or "").lower()
+    if not backend or backend == "none":
+        return None
+    if backend == "local":
+        return LocalStorage(settings["ROOT"])
+    if backend == "s3":
+        return S3Storage(
+            settings["ENDPOINT"], settings["BUCKET"], settings["ACCESS_KEY"], settings["SECRET_KEY"],
+            region=settings.get("REGION", "us-east-1"), prefix=settings.get("PREFIX", "")
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+_queue_instance = None
+_queue_configured = False
+_queue_lock = threading.Lock()
+
+def _secrets():
+    """Return the [Storage] secrets, or {} outside a Streamlit app without secrets."""
+    try:
+        import streamlit as st
+        return dict(st.secrets.get("Storage", {}))
+    except Exception:
+        return {}
+
+def get_queue(settings=None):
+    """
+    Return the process-wide upload queue, or None if no backend is configured.
+
+    Args:
+        settings: the [Storage] settings; read from st.secrets when None
+    """
+    global _queue_instance, _queue_configured
+    with _queue_lock:
+        if not _queue_configured:
+            _queue_configured = True
+            settings = _secrets() if settings is None else settings
+            try:
+                storage = create_storage(settings)
+            except Exception as e:
+                print(f"Object storage unavailable, files stay local only: {e}")
+                storage = None
+            if storage is not None:
+                _queue_instance = UploadQueue(
+                    storage,
+                    workers=int(settings.get("UPLOAD_WORKERS", DEFAULT_WORKERS)),
+                    attempts=int(settings.get("UPLOAD_ATTEMPTS", DEFAULT_ATTEMPTS)),
+                )
+                atexit.register(_queue_instance.close)
+                # uploads a previous run could not finish
+                _queue_instance.retry_failed()
+        return _queue_instance
+
+def persist(path, data=None):
+    """
+    Keep a file under database/ and copy it to the configured storage in the background.
+
+    Args:
+        path: the file under database/
+        data: bytes to write to path first; None if the caller already wrote the file
+
+    data is written before returning, so a failed write raises to the caller;
+    only the upload runs in the background.
+    """
+    if data is not None:
+        write_atomic(path, data)
+    upload_queue = get_queue()
+    if upload_queue is not None:
+        upload_queue.submit(path)
+
+def image_bytes(image, file_name):
+    """Return a PIL image encoded in the format of file_name's extension."""
+    buffer = io.BytesIO()
+    extension = os.path.splitext(file_name)[1].lstrip('.').lower()
+    image.save(buffer, format={"jpg": "JPEG"}.get(extension, extension.upper() or image.format))
+    return buffer.getvalue()
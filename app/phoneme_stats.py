@@ -0,0 +1,179 @@
+"""
+Phoneme-level accuracy statistics per user and per cohort.
+
+Phonemes are encoded to integer IDs and every aggregate is computed with
+numpy bincount over those IDs:
+    - histogram: attempts per (phoneme, 10-point accuracy bin)
+    - score_sum: summed accuracy per phoneme, for the mean score
+    - low_count: occurrences scored below LOW_SCORE
+
+The statistics of each user are cached in database/<user>/phoneme_stats.npz
+and updated incrementally by User.save_pron_history.
+"""
+import os
+import numpy as np
+import pandas as pd
+import warehouse
+
+database_path = "database/"
+
+BIN_WIDTH = 10
+N_BINS = 100 // BIN_WIDTH
+# same threshold as the red colour of get_color in echo_learning
+LOW_SCORE = 60
+
+# in-process cache of {user: (mtime, stats)}
+_cache = {}
+
+def empty_stats():
+    """Return statistics with no phonemes recorded."""
+    return {
+        "phonemes": np.array([], dtype=str),
+        "histogram": np.zeros((0, N_BINS), dtype=np.int64),
+        "score_sum": np.zeros(0, dtype=np.float64),
+        "low_count": np.zeros(0, dtype=np.int64),
+        "attempts": 0,
+    }
+
+def _stats_file(user_name):
+    """Return the path of the cached statistics of a user."""
+    return os.path.join(database_path, user_name, "phoneme_stats.npz")
+
+def _grow(stats, n_phonemes):
+    """Pad the per-phoneme arrays so they hold n_phonemes rows."""
+    extra = n_phonemes - len(stats["score_sum"])
+    if extra > 0:
+        stats["histogram"] = np.vstack([stats["histogram"], np.zeros((extra, N_BINS), dtype=np.int64)])
+        stats["score_sum"] = np.concatenate([stats["score_sum"], np.zeros(extra)])
+        stats["low_count"] = np.concatenate([stats["low_count"], np.zeros(extra, dtype=np.int64)])
+
+def encode(stats, phonemes):
+    """Map phoneme labels to IDs, extending the vocabulary of stats with new labels."""
+    vocab = {label: i for i, label in enumerate(stats["phonemes"].tolist())}
+    labels, inverse = np.unique(np.asarray(phonemes, dtype=str), return_inverse=True)
+    label_ids = np.empty(len(labels), dtype=np.int64)
+    new_labels = []
+    for i, label in enumerate(labels.tolist()):
+        if label not in vocab:
+            vocab[label] = len(vocab)
+            new_labels.append(label)
+        label_ids[i] = vocab[label]
+    if new_labels:
+        stats["phonemes"] = np.concatenate([stats["phonemes"], np.array(new_labels, dtype=str)])
+        _grow(stats, len(vocab))
+    return label_ids[inverse]
+
+def accumulate(stats, phonemes, scores):
+    """Add phoneme observations to stats with bincount over encoded IDs."""
+    if len(phonemes) == 0:
+        return stats
+    ids = encode(stats, phonemes)
+    scores = np.asarray(scores, dtype=np.float64)
+    n_phonemes = len(stats["phonemes"])
+
+    bins = np.clip((scores // BIN_WIDTH).astype(np.int64), 0, N_BINS - 1)
+    stats["histogram"] += np.bincount(
+        ids * N_BINS + bins, minlength=n_phonemes * N_BINS
+    ).reshape(n_phonemes, N_BINS)
+    stats["score_sum"] += np.bincount(ids, weights=scores, minlength=n_phonemes)
+    stats["low_count"] += np.bincount(ids[scores < LOW_SCORE], minlength=n_phonemes)
+    return stats
+
+def extract_phonemes(pronunciation_result):
+    """Return (phonemes, scores) of one assessment result."""
+    phonemes = []
+    scores = []
+    for word in pronunciation_result.get("NBest", [{}])[0].get("Words", []):
+        for phoneme in word.get("Phonemes", []):
+            score = phoneme.get("PronunciationAssessment", {}).get("AccuracyScore")
+            if score is not None:
+                phonemes.append(phoneme["Phoneme"])
+                scores.append(score)
+    return phonemes, scores
+
+def save_stats(user_name, stats):
+    """Persist the statistics of a user and refresh the in-process cache."""
+    stats_file = _stats_file(user_name)
+    os.makedirs(os.path.dirname(stats_file), exist_ok=True)
+    tmp_file = stats_file + ".tmp.npz"
+    np.savez(tmp_file, **stats)
+    os.replace(tmp_file, stats_file)
+    _cache[user_name] = (os.path.getmtime(stats_file), stats)
+
+def load_stats(user_name):
+    """Load the cached statistics of a user, building them on first use."""
+    stats_file = _stats_file(user_name)
+    if not os.path.exists(stats_file):
+        return build_user(user_name)
+    mtime = os.path.getmtime(stats_file)
+    cached = _cache.get(user_name)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with np.load(stats_file) as data:
+        stats = {key: data[key] for key in data.files}
+    stats["attempts"] = int(stats["attempts"])
+    _cache[user_name] = (mtime, stats)
+    return stats
+
+def build_user(user_name):
+    """Rebuild the statistics of a user from the warehouse phonemes table."""
+    warehouse.ingest_user(user_name)
+    phonemes_df = warehouse.load_table(
+        "phonemes", users=[user_name], columns=["attempt_id", "phoneme", "accuracy_score"]
+    ).dropna(subset=["phoneme", "accuracy_score"])
+    stats = accumulate(empty_stats(), phonemes_df["phoneme"].to_numpy(), phonemes_df["accuracy_score"].to_numpy())
+    stats["attempts"] = int(phonemes_df["attempt_id"].nunique())
+    save_stats(user_name, stats)
+    return stats
+
+def update_user(user_name, pronunciation_result):
+    """Fold a freshly saved attempt into the cached statistics of a user."""
+    stats_file = _stats_file(user_name)
+    if not os.path.exists(stats_file):
+        # the warehouse already holds this attempt, so a rebuild includes it
+        return build_user(user_name)
+    stats = {key: np.copy(value) for key, value in load_stats(user_name).items()}
+    phonemes, scores = extract_phonemes(pronunciation_result)
+    accumulate(stats, phonemes, scores)
+    stats["attempts"] = int(stats["attempts"]) + 1
+    save_stats(user_name, stats)
+    return stats
+
+def merge(stats_list):
+    """Sum the statistics of several users into cohort statistics."""
+    merged = empty_stats()
+    for stats in stats_list:
+        if len(stats["phonemes"]) == 0:
+            continue
+        ids = encode(merged, stats["phonemes"])
+        np.add.at(merged["histogram"], ids, stats["histogram"])
+        np.add.at(merged["score_sum"], ids, stats["score_sum"])
+        np.add.at(merged["low_count"], ids, stats["low_count"])
+        merged["attempts"] += int(stats["attempts"])
+    return merged
+
+def cohort_stats(users=None):
+    """Return merged statistics for the given users (all users by default)."""
+    users = users if users is not None else warehouse.list_users()
+    return merge(load_stats(user_name) for user_name in users)
+
+def histogram_frame(stats):
+    """Return the accuracy histogram as a DataFrame (phoneme x score bin)."""
+    columns = [f"{low}-{low + BIN_WIDTH}" for low in range(0, 100, BIN_WIDTH)]
+    return pd.DataFrame(stats["histogram"], index=stats["phonemes"], columns=columns)
+
+def low_score_ranking(stats, min_count=5, top=10):
+    """Rank phonemes by mean accuracy, lowest first, ignoring rare phonemes."""
+    counts = stats["histogram"].sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ranking = pd.DataFrame({
+            "phoneme": stats["phonemes"],
+            "count": counts,
+            "mean_score": stats["score_sum"] / counts,
+            "low_rate": stats["low_count"] / counts,
+        })
+    ranking = ranking[ranking["count"] >= min_count]
+    return ranking.sort_values(["mean_score", "count"], ascending=[True, False]).head(top).reset_index(drop=True)
+
+if __name__ == "__main__":
+    print(low_score_ranking(cohort_stats()))
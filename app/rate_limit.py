@@ -0,0 +1,41 @@
+"""
+Thread-safe token bucket for Azure Speech request quotas.
+"""
+import time
+import threading
+
+class TokenBucket:
+    """Allow `rate` requests per second on average with bursts of up to `capacity`."""
+    def __init__(self, rate, capacity=None):
+        """Start with a full bucket."""
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """Add the tokens earned since the last update (lock held)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available and return whether it succeeded."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1):
+        """Return the seconds until tokens will be available."""
+        with self._lock:
+            self._refill()
+            return max(tokens - self.tokens, 0) / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available, then take them."""
+        while not self.try_acquire(tokens):
+            time.sleep(self.wait_time(tokens))
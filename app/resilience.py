@@ -0,0 +1,126 @@
+"""
+Retries with jitter and a deadline, and a circuit breaker, for remote calls.
+"""
+import time
+import random
+import threading
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open."""
+
+def retry_call(fn, retryable=(Exception,), attempts=3, base_delay=0.5, max_delay=4.0, deadline=None):
+    """
+    Call fn until it succeeds, retrying retryable exceptions with full-jitter backoff.
+
+    Args:
+        fn: callable without arguments
+        retryable: exception types worth another attempt
+        attempts: maximum number of calls
+        base_delay: backoff before the second call, doubled for every further call
+        max_delay: upper bound of one backoff
+        deadline: time.monotonic() value after which no new attempt is started
+
+    Returns:
+        the result of fn
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retryable:
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+
+class CircuitBreaker:
+    """
+    Stop calling a failing backend for a while.
+
+    closed: calls go through; failure_threshold consecutive failures open it.
+    open: calls fail fast with CircuitOpenError for reset_timeout seconds.
+    half-open: one trial call is let through; success closes, failure re-opens.
+    """
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0):
+        """Start closed."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Return "closed", "open" or "half-open"."""
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        """State without taking the lock."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Return whether a call may go through now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        """Close the circuit."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """Count a failure and open the circuit at the threshold or after a failed trial."""
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self):
+        """Let another half-open trial through without changing the state."""
+        with self._lock:
+            self._trial_running = False
+
+    def call(self, fn, failure_types=(Exception,), success_types=()):
+        """
+        Call fn through the breaker.
+
+        Args:
+            fn: callable without arguments
+            failure_types: exceptions that count as backend failures
+            success_types: exceptions that prove the backend answered, e.g. the audio had no speech
+
+        Any other exception (a Streamlit rerun, KeyboardInterrupt, a bug) is
+        re-raised without counting either way.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            result = fn()
+        except success_types:
+            self.record_success()
+            raise
+        except failure_types:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
@@ -0,0 +1,301 @@
+"""
+Per-session memory accounting and budgets.
+
+account() runs at the end of every learning-page run. It sizes each
+st.session_state entry (figures by their rendered canvas and plotted data,
+DataFrames by memory_usage(deep=True), arrays by nbytes, containers and
+plain objects recursively). If the session is over its budget it compacts
+or evicts the largest entries that have a policy, and it records the result
+in a process-wide table.
+
+The table is written to database/telemetry/session_memory-<pid>.json, one
+file per server process, for the operator page (ops_summary.py). Set
+Memory.TRACEMALLOC to also list the process's top allocation sites there.
+
+Policies only touch state the app can do without:
+    - learning_data: figures become PNG bytes and are closed in pyplot
+    - learning_state / error_history: error word lists keep the newest words
+      (in memory only; error_history.json keeps every word, since
+      save_error_history adds each attempt to the file's own total)
+    - conversations: older turns are folded into the rolling summary
+    - dataset, drill_queue, finished feedback_prefetch: dropped, the page
+      reloads them from disk when needed
+"""
+import io
+import os
+import sys
+import json
+import time
+import glob
+import threading
+import tracemalloc
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from conversation import KEEP_RECENT, truncating_summarizer
+
+snapshot_path = "database/telemetry/"
+
+DEFAULT_BUDGET_MB = 64
+DEFAULT_MAX_ERROR_WORDS = 200
+# sessions that have not run for this long are dropped from the table
+SESSION_TTL = 3600
+# at most one snapshot file write per interval
+SNAPSHOT_INTERVAL = 5
+TRACEMALLOC_INTERVAL = 60
+TOP_ENTRIES = 8
+
+def sizeof(obj, seen=None):
+    """Estimate the bytes held by obj and everything it references."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, Figure):
+        return figure_size(obj)
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum()) if isinstance(obj, pd.DataFrame) \
+            else int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return sys.getsizeof(obj)
+    if isinstance(obj, io.BytesIO):
+        # e.g. the UploadedFile of st.audio_input
+        return sys.getsizeof(obj) + obj.getbuffer().nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, seen) + sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type) and not callable(obj) \
+            and not isinstance(obj, threading.Thread):
+        size += sizeof(vars(obj), seen)
+    return size
+
+def figure_size(fig):
+    """Estimate a figure: its RGBA canvas once drawn plus the arrays it plots."""
+    size = sys.getsizeof(fig)
+    if getattr(fig.canvas, "renderer", None) is not None:
+        width, height = fig.canvas.get_width_height()
+        size += width * height * 4
+    for ax in fig.axes:
+        for line in ax.lines:
+            size += np.asarray(line.get_xydata()).nbytes
+        for collection in ax.collections:
+            size += np.asarray(collection.get_offsets()).nbytes
+            size += sum(path.vertices.nbytes for path in collection.get_paths())
+        for image in ax.images:
+            size += np.asarray(image.get_array()).nbytes
+    return size
+
+def measure(session_state):
+    """Return {key: estimated bytes} of a session, largest first."""
+    sizes = {}
+    for key in list(session_state.keys()):
+        try:
+            sizes[str(key)] = sizeof(session_state[key])
+        except Exception as e:
+            print(f"Failed to size session entry {key}: {e}")
+    return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
+
+def figure_to_png(fig):
+    """Render a figure to PNG bytes and close it, so pyplot no longer holds it."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
+
+def compact_learning_data(learning_data, max_error_words):
+    """Replace the figures of the latest attempt with their PNG bytes."""
+    for name, value in learning_data.items():
+        if isinstance(value, Figure):
+            learning_data[name] = figure_to_png(value)
+    return "figures → PNG"
+
+def compact_errors(total_errors, max_error_words):
+    """Keep the newest max_error_words words per error type; counts are kept.
+
+    Trims the session copy in place; it is never written back to disk.
+    """
+    for lesson_errors in total_errors.values():
+        for data in lesson_errors.values():
+            if isinstance(data, dict) and len(data.get('words', [])) > max_error_words:
+                del data['words'][:-max_error_words]
+
+def compact_learning_state(learning_state, max_error_words):
+    """Trim the error word lists of every lesson."""
+    compact_errors(learning_state.get('total_errors', {}), max_error_words)
+    return f"error words ≤ {max_error_words}"
+
+def compact_error_history(error_history, max_error_words):
+    """Trim the error word lists loaded by User.load_errors_history."""
+    compact_errors(error_history.get('total_errors', {}), max_error_words)
+    return f"error words ≤ {max_error_words}"
+
+def compact_conversation(state, max_error_words):
+    """Fold every turn but the most recent ones into the rolling summary."""
+    messages = state["messages"]
+    if len(messages) > KEEP_RECENT:
+        state["summary"] = truncating_summarizer(state["summary"], messages[:-KEEP_RECENT])
+        del messages[:-KEEP_RECENT]
+    return f"messages ≤ {KEEP_RECENT}"
+
+def is_conversation(value):
+    """Return True for a ConversationManager state dict."""
+    return isinstance(value, dict) and {"messages", "summary", "initial_feedback"} <= value.keys()
+
+COMPACT = {
+    "learning_data": compact_learning_data,
+    "learning_state": compact_learning_state,
+    "error_history": compact_error_history,
+}
+# entries the page rebuilds from disk when they are missing
+EVICT = {"dataset", "drill_queue"}
+
+def policy(key, value):
+    """Return ("compact", fn), ("evict", None) or None for a session entry."""
+    if key in COMPACT:
+        return "compact", COMPACT[key]
+    if is_conversation(value):
+        return "compact", compact_conversation
+    if key in EVICT or (key == "feedback_prefetch" and getattr(value, "done", False)):
+        return "evict", None
+    return None
+
+def enforce_budget(session_state, sizes, budget_bytes, max_error_words=DEFAULT_MAX_ERROR_WORDS):
+    """
+    Compact or evict the largest entries until the session fits its budget.
+
+    Args:
+        session_state: the session's st.session_state
+        sizes: {key: bytes} from measure(), updated in place
+        budget_bytes: allowed total, None to only account
+        max_error_words: words kept per error type when compacting
+
+    Returns:
+        list of "key: action (before → after bytes)" strings
+    """
+    actions = []
+    if budget_bytes is None:
+        return actions
+    for key in list(sizes):
+        if sum(sizes.values()) <= budget_bytes:
+            break
+        value = session_state[key]
+        rule = policy(key, value)
+        if rule is None:
+            continue
+        before = sizes[key]
+        kind, compact = rule
+        if kind == "evict":
+            del session_state[key]
+            sizes.pop(key)
+            actions.append(f"{key}: evicted ({before} B)")
+        else:
+            note = compact(value, max_error_words)
+            sizes[key] = sizeof(value)
+            actions.append(f"{key}: {note} ({before} → {sizes[key]} B)")
+    return actions
+
+_lock = threading.Lock()
+_sessions = {}
+_last_snapshot = 0.0
+_last_tracemalloc = 0.0
+_top_allocations = []
+
+def start_tracemalloc(frames=1):
+    """Start tracing allocations for the operator page (slows the process down)."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+def top_allocations(limit=10):
+    """Return the largest allocation sites of the process, when tracemalloc is on."""
+    if not tracemalloc.is_tracing():
+        return []
+    stats = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+    return [{"site": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count} for stat in stats]
+
+def account(session_id, user_name, session_state, budget_mb=DEFAULT_BUDGET_MB,
+            max_error_words=DEFAULT_MAX_ERROR_WORDS):
+    """Measure a session, enforce its budget, record it and return its entry in the table."""
+    sizes = measure(session_state)
+    total_before = sum(sizes.values())
+    budget_bytes = budget_mb * 2**20 if budget_mb else None
+    actions = enforce_budget(session_state, sizes, budget_bytes, max_error_words)
+    sizes = dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
+    now = time.time()
+    with _lock:
+        entry = _sessions.setdefault(session_id, {"user": user_name, "compactions": 0})
+        entry.update({
+            "user": user_name,
+            "total_bytes": sum(sizes.values()),
+            "total_before_bytes": total_before,
+            "budget_bytes": budget_bytes,
+            "entries": dict(list(sizes.items())[:TOP_ENTRIES]),
+            "updated": now,
+        })
+        if actions:
+            entry["compactions"] += 1
+            entry["last_actions"] = actions
+        for stale in [sid for sid, e in _sessions.items() if now - e["updated"] > SESSION_TTL]:
+            del _sessions[stale]
+    write_snapshot()
+    return entry
+
+def snapshot():
+    """Return the process's session table and process-wide figures."""
+    global _last_tracemalloc, _top_allocations
+    now = time.time()
+    if tracemalloc.is_tracing() and now - _last_tracemalloc > TRACEMALLOC_INTERVAL:
+        _last_tracemalloc = now
+        _top_allocations = top_allocations()
+    try:
+        import psutil
+        rss = psutil.Process().memory_info().rss
+    except Exception:
+        rss = None
+    with _lock:
+        sessions = {sid: dict(entry) for sid, entry in _sessions.items()}
+    return {
+        "pid": os.getpid(),
+        "time": now,
+        "rss_bytes": rss,
+        "pyplot_open_figures": len(plt.get_fignums()),
+        "sessions": sessions,
+        "top_allocations": _top_allocations,
+    }
+
+def write_snapshot(path=snapshot_path, force=False):
+    """Atomically write this process's snapshot file, at most every SNAPSHOT_INTERVAL seconds."""
+    global _last_snapshot
+    now = time.time()
+    if not force and now - _last_snapshot < SNAPSHOT_INTERVAL:
+        return
+    _last_snapshot = now
+    try:
+        os.makedirs(path, exist_ok=True)
+        file_path = os.path.join(path, f"session_memory-{os.getpid()}.json")
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot(), f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+    except OSError as e:
+        print(f"Failed to write the session memory snapshot: {e}")
+
+def load_snapshots(path=snapshot_path, max_age=SESSION_TTL):
+    """Load the snapshot files of every server process updated within max_age seconds."""
+    snapshots = []
+    for file_path in glob.glob(os.path.join(path, "session_memory-*.json")):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if time.time() - data.get("time", 0) <= max_age:
+            snapshots.append(data)
+    return sorted(snapshots, key=lambda s: s["pid"])
@@ -0,0 +1,58 @@
+import threading
+
+class FeedbackPrefetch:
+    """
+    Run an AI feedback request in a background thread while the page renders.
+
+    The request is started as soon as the error data of an attempt exists, so
+    the LLM works while the charts and tables are drawn. Frames are buffered
+    as they arrive; stream() hands them to the chat bubble of the same run,
+    blocking only for frames that have not arrived yet. The page drops the
+    prefetch at the start of every run, so it is shown once.
+
+    The thread has no ScriptRunContext and must not call st.*: a failure is
+    kept in error for the script thread to report after stream() ends.
+    """
+    def __init__(self, stream_factory):
+        """Start a daemon thread that drains the stream returned by stream_factory."""
+        self.frames = []
+        self.error = None
+        self.done = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, args=(stream_factory,), daemon=True)
+        self._thread.start()
+
+    def _run(self, stream_factory):
+        """Background thread: buffer every frame of the stream."""
+        try:
+            stream = stream_factory()
+            if stream is not None:
+                for frame in stream:
+                    with self._condition:
+                        self.frames.append(frame)
+                        self._condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    def stream(self):
+        """Yield the buffered frames, waiting for the ones still in flight."""
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self.frames) and not self.done:
+                    self._condition.wait()
+                if index >= len(self.frames):
+                    return
+                frame = self.frames[index]
+            index += 1
+            yield frame
+
+    @property
+    def text(self):
+        """Return the feedback received so far."""
+        with self._condition:
+            return "".join(self.frames)
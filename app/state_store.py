@@ -0,0 +1,331 @@
+"""
+Pluggable store for session and learner state shared by several app processes.
+
+Streamlit keeps st.session_state in the memory of one server process, so a
+restarted worker forgets its learners and a load balancer has to pin every
+browser to one process. With a [State] backend configured, the app keeps
+what it cannot rebuild from database/ in a store every process can reach:
+
+    session:<token>   the logged-in user of a browser session
+    learner:<user>    lesson_index, learning_state and scores_history of today
+
+Values are JSON documents with an optional time to live. Backends:
+    - SQLiteStateStore: one SQLite file (WAL mode), for processes on one host
+    - RedisStateStore: any server speaking the Redis protocol, through a
+      minimal RESP client (no redis package needed); see
+      tools/fake_redis_server.py for a local stand-in
+
+database/ itself must still be shared by all processes (same host or a
+shared volume); the store only replaces what lived in process memory.
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from urllib.parse import urlparse, unquote
+
+sqlite_path = "database/state/state.sqlite"
+
+# a login is kept for this long after the last page run; short, since its token is in the page URL
+SESSION_TTL = 2 * 60 * 60
+# today's learner state is kept for a day and a bit, it is reloaded from files after
+LEARNER_TTL = 36 * 60 * 60
+# expired SQLite rows are purged every this many writes
+PURGE_EVERY = 200
+
+class StateStore:
+    """Common interface of the state backends: JSON values with an optional TTL."""
+    name = "store"
+
+    def get(self, key):
+        """Return the value stored under key, or None if missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Store a JSON-serialisable value under key, expiring after ttl seconds."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove key if present."""
+        raise NotImplementedError
+
+    def touch(self, key, ttl):
+        """Push the expiry of key ttl seconds into the future."""
+        value = self.get(key)
+        if value is not None:
+            self.set(key, value, ttl)
+
+class SQLiteStateStore(StateStore):
+    """State kept in one SQLite file, safe for several processes on the same host."""
+    name = "sqlite"
+
+    def __init__(self, path=sqlite_path):
+        """Open (and create if needed) the state database."""
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        # one connection per process, shared by the script threads under the lock
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS state_expires ON state (expires)")
+
+    def get(self, key):
+        """Return the value stored under key, or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        """Store a JSON-serialisable value under key, expiring after ttl seconds."""
+        expires = time.time() + ttl if ttl else None
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO state (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+                (key, data, expires)
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM state WHERE expires < ?", (time.time(),))
+
+    def delete(self, key):
+        """Remove key if present."""
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+class RedisError(Exception):
+    """Error reply of a Redis-protocol server."""
+
+class RESPConnection:
+    """One socket to a Redis-protocol server, sending commands as RESP arrays."""
+    def __init__(self, host, port, timeout=5.0):
+        """Connect to host:port."""
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+
+    def execute(self, *args):
+        """Send one command and return its decoded reply."""
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_line(self):
+        """Read one CRLF-terminated line."""
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the state server")
+        return line[:-2]
+
+    def _read_reply(self):
+        """Parse a simple string, error, integer, bulk string or array reply."""
+        line = self._read_line()
+        kind, rest = line[:1], line[1:]
+        if kind == b"+":
+            return rest.decode('utf-8')
+        if kind == b"-":
+            raise RedisError(rest.decode('utf-8'))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by the state server")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from the state server: {line[:40]!r}")
+
+    def close(self):
+        """Close the socket."""
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisStateStore(StateStore):
+    """State kept in a Redis-protocol server, shared by processes on any host."""
+    name = "redis"
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="phonoecho:", timeout=5.0, max_idle=8):
+        """Remember the server; connections are opened on demand and pooled."""
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported state store URL: {url}")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Open and authenticate a new connection."""
+        conn = RESPConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                if self.username:
+                    conn.execute("AUTH", self.username, self.password)
+                else:
+                    conn.execute("AUTH", self.password)
+            if self.db:
+                conn.execute("SELECT", self.db)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def execute(self, *args):
+        """Run a command on a pooled connection, retrying once on a fresh one if the socket broke."""
+        for attempt in range(2):
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            fresh = conn is None
+            if fresh:
+                conn = self._connect()
+            try:
+                reply = conn.execute(*args)
+            except (ConnectionError, OSError):
+                conn.close()
+                # a pooled socket may have been closed by the server; a fresh one failing is real
+                if fresh or attempt:
+                    raise
+                continue
+            except RedisError:
+                self._release(conn)
+                raise
+            self._release(conn)
+            return reply
+
+    def _release(self, conn):
+        """Return a connection to the pool, or close it if the pool is full."""
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def get(self, key):
+        """Return the value stored under key, or None if missing or expired."""
+        data = self.execute("GET", self.prefix + key)
+        return None if data is None else json.loads(data)
+
+    def set(self, key, value, ttl=None):
+        """Store a JSON-serialisable value under key, expiring after ttl seconds."""
+        data = json.dumps(value, ensure_ascii=False)
+        if ttl:
+            self.execute("SET", self.prefix + key, data, "EX", int(ttl))
+        else:
+            self.execute("SET", self.prefix + key, data)
+
+    def delete(self, key):
+        """Remove key if present."""
+        self.execute("DEL", self.prefix + key)
+
+    def touch(self, key, ttl):
+        """Push the expiry of key ttl seconds into the future."""
+        self.execute("EXPIRE", self.prefix + key, int(ttl))
+
+    def close(self):
+        """Close every pooled connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(settings):
+    """
+    Return the process-wide store configured by settings, or None if disabled.
+
+    Args:
+        settings: the [State] secrets, e.g. {"BACKEND": "redis", "REDIS_URL": "redis://host:6379/0"}
+    """
+    backend = (settings.get("BACKEND") or "").lower()
+    if not backend or backend == "none":
+        return None
+    if backend == "sqlite":
+        target = settings.get("SQLITE_PATH", sqlite_path)
+    elif backend == "redis":
+        target = settings.get("REDIS_URL", "redis://localhost:6379/0")
+    else:
+        raise ValueError(f"Unknown state backend: {backend}")
+    with _stores_lock:
+        store = _stores.get((backend, target))
+        if store is None:
+            if backend == "sqlite":
+                store = SQLiteStateStore(target)
+            else:
+                store = RedisStateStore(target, prefix=settings.get("PREFIX", "phonoecho:"))
+            _stores[(backend, target)] = store
+        return store
+
+def session_key(token):
+    """Return the key of a browser session's login."""
+    return f"session:{token}"
+
+def learner_key(user_name):
+    """Return the key of a learner's state."""
+    return f"learner:{user_name}"
+
+def _int_keys(mapping):
+    """JSON turns the lesson indexes into strings; turn them back."""
+    return {int(k): v for k, v in mapping.items()}
+
+def dump_learner_state(day, lesson_index, learning_state, scores_history):
+    """Return the JSON document stored for a learner."""
+    document = {"day": day, "lesson_index": lesson_index}
+    if learning_state is not None:
+        document["learning_state"] = {
+            "scores_history": {str(k): v for k, v in learning_state.get("scores_history", {}).items()},
+            "current_errors": learning_state.get("current_errors", {}),
+            "total_errors": {str(k): v for k, v in learning_state.get("total_errors", {}).items()},
+        }
+    if scores_history is not None:
+        document["scores_history"] = {str(k): v for k, v in scores_history.items()}
+    return document
+
+def load_learner_state(document):
+    """Return (lesson_index, learning_state or None, scores_history or None) of a stored document."""
+    learning_state = document.get("learning_state")
+    if learning_state is not None:
+        learning_state = {
+            "scores_history": _int_keys(learning_state["scores_history"]),
+            "current_errors": learning_state["current_errors"],
+            "total_errors": _int_keys(learning_state["total_errors"]),
+        }
+    scores_history = document.get("scores_history")
+    if scores_history is not None:
+        scores_history = _int_keys(scores_history)
+    return document.get("lesson_index", 0), learning_state, scores_history
@@ -0,0 +1,42 @@
+import time
+
+# how long text may be held back to be rendered together with later tokens
+FRAME_INTERVAL = 0.05
+
+class FrameStream:
+    """
+    Coalesce streamed text chunks into frames on a time budget.
+
+    The first chunk is passed through immediately so the learner sees the
+    start of the answer as early as possible; later chunks are joined and
+    yielded at most once per frame_interval, which keeps Streamlit from
+    re-rendering the message for every single token. All chunks are also
+    collected in a list, so the full response is built once with join.
+    """
+    def __init__(self, chunks, frame_interval=FRAME_INTERVAL):
+        """Wrap an iterable of text chunks."""
+        self.chunks = chunks
+        self.frame_interval = frame_interval
+        self.parts = []
+
+    def __iter__(self):
+        """Yield frames of joined chunks."""
+        pending = []
+        deadline = None
+        for chunk in self.chunks:
+            if not chunk:
+                continue
+            self.parts.append(chunk)
+            pending.append(chunk)
+            now = time.monotonic()
+            if deadline is None or now >= deadline:
+                yield "".join(pending)
+                pending = []
+                deadline = now + self.frame_interval
+        if pending:
+            yield "".join(pending)
+
+    @property
+    def text(self):
+        """Return everything received so far."""
+        return "".join(self.parts)
@@ -0,0 +1,264 @@
+"""
+Stage timing for the attempt pipeline.
+
+Every stage of an attempt (audio save, assessment, history save, charts,
+AI feedback, ...) runs inside span(), and all spans of one submit share the
+trace opened by trace(). Each finished span is
+    - observed in a per-stage latency histogram, exported in the Prometheus
+      text format to database/telemetry/metrics-<pid>.prom, one file per
+      server process with a pid label (and on /metrics when
+      start_metrics_server() was called)
+    - appended as one JSON line to database/telemetry/traces.jsonl, which
+      the operator page (app/learn/ops_summary.py) summarises; the log is
+      rotated to traces.jsonl.1, .2, ... at TRACE_LOG_MAX_BYTES
+Streamlit's rerun and stop exceptions pass through span() unrecorded.
+"""
+import os
+import json
+import glob
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pandas as pd
+try:
+    from streamlit.runtime.scriptrunner_utils.exceptions import RerunException, StopException
+    # st.rerun()/st.stop() and a new widget event end the script run, they are not stage failures
+    SCRIPT_CONTROL = (RerunException, StopException)
+except ImportError:
+    SCRIPT_CONTROL = ()
+
+telemetry_path = "database/telemetry/"
+trace_log_path = telemetry_path + "traces.jsonl"
+metrics_path = telemetry_path + f"metrics-{os.getpid()}.prom"
+
+# the trace log is rotated at this size, keeping this many older files
+TRACE_LOG_MAX_BYTES = 20 * 2**20
+TRACE_LOG_BACKUPS = 3
+
+METRIC_NAME = "phonoecho_stage_duration_seconds"
+ERROR_METRIC_NAME = "phonoecho_stage_errors_total"
+# upper bounds in seconds, from a fast file save up to a slow LLM answer
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_lock = threading.Lock()
+_histograms = {}
+_errors = {}
+_server = None
+# set when the metrics port could not be bound, so reruns do not retry
+_server_error = None
+
+class Histogram:
+    """Cumulative latency histogram of one stage."""
+    def __init__(self):
+        """Start with empty buckets."""
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """Add one observation."""
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+def current_trace_id():
+    """Return the ID of the trace open in this context, or None."""
+    return _current_trace.get()
+
+def record(stage, seconds, trace_id=None, error=None, **attrs):
+    """Record a finished stage: update its histogram and append it to the trace log."""
+    with _lock:
+        _histograms.setdefault(stage, Histogram()).observe(seconds)
+        if error is not None:
+            _errors[stage] = _errors.get(stage, 0) + 1
+        entry = {
+            "trace_id": trace_id or current_trace_id(),
+            "stage": stage,
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(seconds * 1000, 2),
+            "error": error,
+            **attrs,
+        }
+        try:
+            os.makedirs(telemetry_path, exist_ok=True)
+            with open(trace_log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                size = f.tell()
+            if size > TRACE_LOG_MAX_BYTES:
+                rotate_trace_log()
+        except OSError as e:
+            print(f"Failed to write trace log: {e}")
+
+def rotate_trace_log(path=trace_log_path, backups=TRACE_LOG_BACKUPS):
+    """Shift path to path.1, path.1 to path.2, ..., dropping the oldest."""
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    try:
+        os.replace(path, f"{path}.1")
+    except FileNotFoundError:
+        # another process rotated it first
+        pass
+
+@contextmanager
+def span(stage, **attrs):
+    """Time the enclosed block as one stage of the current trace."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except SCRIPT_CONTROL:
+        # the run was interrupted, not the stage: neither its time nor an error is recorded
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        record(stage, time.perf_counter() - start, error=error, **attrs)
+        raise
+    record(stage, time.perf_counter() - start, **attrs)
+
+@contextmanager
+def trace(name, **attrs):
+    """Open a trace for one submit; the whole block is recorded as the stage name."""
+    trace_id = uuid.uuid4().hex[:16]
+    token = _current_trace.set(trace_id)
+    try:
+        with span(name, **attrs):
+            yield trace_id
+    finally:
+        _current_trace.reset(token)
+        write_prometheus()
+
+def prometheus_text(labels=None):
+    """Render the histograms in the Prometheus text exposition format, with extra labels on every series."""
+    extra = "".join(f',{name}="{value}"' for name, value in (labels or {}).items())
+    lines = [
+        f"# HELP {METRIC_NAME} Duration of attempt pipeline stages.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    with _lock:
+        for stage, histogram in sorted(_histograms.items()):
+            for bound, count in zip(BUCKETS, histogram.bucket_counts):
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}"{extra},le="{bound}"}} {count}')
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}"{extra},le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"{extra}}} {histogram.sum:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{stage}"{extra}}} {histogram.count}')
+        lines.append(f"# HELP {ERROR_METRIC_NAME} Attempt pipeline stages that raised.")
+        lines.append(f"# TYPE {ERROR_METRIC_NAME} counter")
+        for stage, count in sorted(_errors.items()):
+            lines.append(f'{ERROR_METRIC_NAME}{{stage="{stage}"{extra}}} {count}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path=metrics_path):
+    """
+    Write this process's metrics atomically, e.g. for the node_exporter textfile collector.
+
+    Every series carries a pid label, so the files of several app processes
+    can be collected side by side.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(prometheus_text({"pid": os.getpid()}))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Failed to write metrics: {e}")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serve prometheus_text() on /metrics."""
+    def do_GET(self):
+        """Answer a scrape."""
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep scrapes out of the app log."""
+        pass
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serve /metrics from a daemon thread; later calls are no-ops.
+
+    Returns None if the port could not be bound (e.g. taken by another app
+    process); the failure is printed once and not retried.
+    """
+    global _server, _server_error
+    with _lock:
+        if _server is not None or _server_error is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            _server_error = e
+            print(f"Metrics server not started on {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+def load_traces(path=trace_log_path, since=None):
+    """
+    Read the trace log into a DataFrame, optionally only entries after since (datetime).
+
+    Rotated files last written before since are not read.
+    """
+    files = [f"{path}.{i}" for i in range(TRACE_LOG_BACKUPS, 0, -1)] + [path]
+    files = [
+        f for f in files
+        if os.path.exists(f) and (since is None or datetime.fromtimestamp(os.path.getmtime(f)) >= since)
+    ]
+    if not files:
+        return pd.DataFrame(columns=["trace_id", "stage", "time", "duration_ms", "error"])
+    rows = []
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a line cut short by a crash
+                    continue
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    df["time"] = pd.to_datetime(df["time"])
+    if since is not None:
+        df = df[df["time"] >= since]
+    return df
+
+def metrics_files(max_age=24 * 60 * 60):
+    """Return the metrics files of the app processes that wrote within max_age seconds, newest first."""
+    files = [
+        f for f in glob.glob(os.path.join(telemetry_path, "metrics-*.prom"))
+        if time.time() - os.path.getmtime(f) <= max_age
+    ]
+    return sorted(files, key=os.path.getmtime, reverse=True)
+
+def stage_summary(df):
+    """Return count, mean, p50, p95, max (ms) and errors per stage."""
+    if df.empty:
+        return pd.DataFrame(columns=["count", "mean", "p50", "p95", "max", "errors"])
+    grouped = df.groupby("stage")["duration_ms"]
+    summary = pd.DataFrame({
+        "count": grouped.count(),
+        "mean": grouped.mean(),
+        "p50": grouped.quantile(0.5),
+        "p95": grouped.quantile(0.95),
+        "max": grouped.max(),
+        "errors": df["error"].notna().groupby(df["stage"]).sum(),
+    })
+    return summary.sort_values("p95", ascending=False).round(1)
@@ -0,0 +1,250 @@
+"""
+Batch avatar synthesis job manager.
+
+Generates avatar videos for a whole lesson set: jobs are submitted and
+polled concurrently over one shared requests.Session, polling backs off
+exponentially while a job is queued or running, finished videos are
+streamed to disk in chunks, and a manifest (avatar_jobs.json in the output
+folder) records every job so an interrupted run resumes polling the jobs it
+already submitted instead of paying for them again.
+
+Usage (from the repository root):
+    python app/tools/avatar_jobs.py --input database/learning_database/<user_name> --workers 4
+"""
+import os
+import json
+import time
+import uuid
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from glob import glob
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = "2024-04-15-preview"
+MANIFEST_NAME = "avatar_jobs.json"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+TERMINAL_STATUSES = ("Succeeded", "Failed")
+
+def build_payload(text_input, voice='en-US-JennyMultilingualNeural', character='Lisa', style='casual-sitting'):
+    """Build the batch synthesis request body for one text."""
+    return {
+        'synthesisConfig': {
+            "voice": voice,
+        },
+        "inputKind": "plainText",
+        "inputs": [
+            {
+                "content": text_input,
+            },
+        ],
+        "avatarConfig": {
+            "customized": False,
+            "talkingAvatarCharacter": character,
+            "talkingAvatarStyle": style,
+            "videoFormat": "mp4",
+            "videoCodec": "h264",
+            "subtitleType": "soft_embedded",
+            "backgroundColor": "#FFFFFFFF",
+        }
+    }
+
+def text_hash(text):
+    """Return the sha256 of a lesson text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class AvatarJobManager:
+    """Submit, poll and download many avatar synthesis jobs concurrently."""
+    def __init__(self, endpoint, auth_headers, output_dir, max_workers=4,
+                 poll_initial=2.0, poll_max=30.0, timeout=3600.0, session=None):
+        """
+        Args:
+            endpoint: speech resource endpoint, e.g. https://<region>.api.cognitive.microsoft.com
+            auth_headers: headers for the synthesis API (subscription key or bearer token)
+            output_dir: folder for the videos and the job manifest
+            max_workers: jobs handled at the same time
+            poll_initial: first polling interval in seconds
+            poll_max: upper bound of the polling interval in seconds
+            timeout: seconds after which a job that has not finished is given up
+            session: optional requests.Session to share
+        """
+        self.endpoint = endpoint.rstrip('/')
+        self.auth_headers = auth_headers
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        # one pooled connection per worker
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """Load the job manifest, or start an empty one."""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f'Ignoring unreadable manifest {self.manifest_path}: {e}')
+            return {}
+
+    def _record(self, name, **fields):
+        """Update one manifest entry and write the manifest atomically."""
+        with self._lock:
+            self.manifest.setdefault(name, {}).update(fields)
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.manifest_path)
+
+    def _job_url(self, job_id):
+        """Return the batch synthesis URL of a job."""
+        return f'{self.endpoint}/avatar/batchsyntheses/{job_id}?api-version={API_VERSION}'
+
+    def submit(self, text_input):
+        """Submit one job and return its ID, raising on HTTP errors."""
+        job_id = str(uuid.uuid4())
+        headers = {'Content-Type': 'application/json'}
+        headers.update(self.auth_headers)
+        response = self.session.put(self._job_url(job_id), data=json.dumps(build_payload(text_input)),
+                                    headers=headers, timeout=30)
+        response.raise_for_status()
+        return job_id
+
+    def poll(self, job_id):
+        """Poll a job with exponential backoff until it finishes; return the final job JSON."""
+        delay = self.poll_initial
+        deadline = time.monotonic() + self.timeout
+        while True:
+            retry_after = None
+            try:
+                response = self.session.get(self._job_url(job_id), headers=self.auth_headers, timeout=30)
+                if response.status_code == 429 or response.status_code >= 500:
+                    retry_after = response.headers.get("Retry-After")
+                    logger.info(f'Job {job_id}: HTTP {response.status_code}, backing off')
+                else:
+                    response.raise_for_status()
+                    job = response.json()
+                    if job.get('status') in TERMINAL_STATUSES:
+                        return job
+            except requests.ConnectionError as e:
+                logger.info(f'Job {job_id}: connection error while polling ({e}), backing off')
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f'Job {job_id} did not finish within {self.timeout} seconds')
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else delay
+            # jitter keeps concurrent jobs from polling in lockstep
+            time.sleep(wait * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, self.poll_max)
+
+    def download(self, url, path):
+        """Stream a finished video to path in chunks and return the byte count."""
+        tmp_path = path + ".part"
+        size = 0
+        # the result URL carries its own SAS token, so no auth headers here
+        with self.session.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+        os.replace(tmp_path, path)
+        return size
+
+    def process(self, name, text):
+        """Bring one lesson from any recorded state to a downloaded video; return its status."""
+        entry = self.manifest.get(name, {})
+        digest = text_hash(text)
+        video_path = os.path.join(self.output_dir, f"{name}.mp4")
+        if entry.get("hash") == digest and entry.get("status") == "Downloaded" and os.path.exists(video_path):
+            return "Skipped"
+
+        job_id = entry.get("job_id") if entry.get("hash") == digest and entry.get("status") != "Failed" else None
+        if job_id is None:
+            job_id = self.submit(text)
+            self._record(name, hash=digest, job_id=job_id, status="Submitted", error=None)
+            logger.info(f'{name}: submitted job {job_id}')
+        else:
+            logger.info(f'{name}: resuming job {job_id}')
+
+        job = self.poll(job_id)
+        if job['status'] == 'Failed':
+            error = job.get('properties', {}).get('error', {}).get('message', 'Job failed')
+            self._record(name, status="Failed", error=error)
+            return "Failed"
+
+        size = self.download(job['outputs']['result'], video_path)
+        self._record(name, status="Downloaded", video=video_path, bytes=size)
+        logger.info(f'{name}: downloaded {size} bytes to {video_path}')
+        return "Downloaded"
+
+    def run(self, lessons):
+        """
+        Generate videos for lessons concurrently.
+
+        Args:
+            lessons: dict of lesson name to text
+
+        Returns:
+            dict of lesson name to final status (Downloaded, Skipped, Failed or Error)
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.process, name, text): name for name, text in lessons.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.error(f'{name}: {e}')
+                    self._record(name, error=str(e))
+                    results[name] = "Error"
+        return results
+
+def load_lessons(input_dir):
+    """Return {lesson name: text} for the non-empty .txt files of a folder."""
+    lessons = {}
+    for txt_file in sorted(glob(os.path.join(input_dir, "*.txt"))):
+        with open(txt_file, 'r', encoding='utf-8') as f:
+            text = f.read().strip()
+        if text:
+            lessons[Path(txt_file).stem] = text
+    return lessons
+
+def main():
+    """Parse command line arguments and generate avatar videos for a lesson folder."""
+    parser = argparse.ArgumentParser(description="Batch avatar video generation for lesson texts")
+    parser.add_argument("--input", required=True, help="folder with lesson .txt files")
+    parser.add_argument("--output", help="folder for the videos and manifest (defaults to --input)")
+    parser.add_argument("--workers", type=int, default=4, help="jobs handled at the same time")
+    parser.add_argument("--poll-max", type=float, default=30.0, help="maximum seconds between polls")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
+    import streamlit as st
+    manager = AvatarJobManager(
+        st.secrets["Azure_Avatar"]["SPEECH_ENDPOINT"],
+        {'Ocp-Apim-Subscription-Key': st.secrets["Azure_Avatar"]["SUBSCRIPTION_KEY"]},
+        args.output or args.input,
+        max_workers=args.workers,
+        poll_max=args.poll_max,
+    )
+    results = manager.run(load_lessons(args.input))
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
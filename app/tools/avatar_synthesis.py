@@ -7,6 +7,7 @@ import uuid
 import requests
 import streamlit as st
 from azure.identity import DefaultAzureCredential
+from avatar_jobs import build_payload, DOWNLOAD_CHUNK_SIZE
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO,
                     format="[%(asctime)s] %(message)s", datefmt="%m/%d/%Y %I:%M:%S %p %Z")
@@ -39,26 +40,7 @@ def submit_synthesis(text_input):
     }
     header.update(_authenticate())
 
-    payload = {
-        'synthesisConfig': {
-            "voice": 'en-US-JennyMultilingualNeural',
-        },
-        "inputKind": "plainText",
-        "inputs": [
-            {
-                "content": text_input,
-            },
-        ],
-        "avatarConfig": {
-            "customized": False,
-            "talkingAvatarCharacter": 'Lisa',
-            "talkingAvatarStyle": 'casual-sitting',
-            "videoFormat": "mp4",
-            "videoCodec": "h264",
-            "subtitleType": "soft_embedded",
-            "backgroundColor": "#FFFFFFFF",
-        }
-    }
+    payload = build_payload(text_input)
 
     response = requests.put(url, json.dumps(payload), headers=header)
     if response.status_code < 400:
@@ -87,11 +69,12 @@ def get_synthesis(job_id):
 def download_video(url):
     """Download a video from a URL and save it locally."""
     logger.info(f'Attempting to download video from {url}')
-    response = requests.get(url)
+    response = requests.get(url, stream=True)
     if response.status_code == 200:
         filename = f"avatar_video_{uuid.uuid4()}.mp4"
         with open(filename, "wb") as f:
-            f.write(response.content)
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
         logger.info(f'Video downloaded successfully to {filename}')
         return filename
     else:
@@ -0,0 +1,216 @@
+"""
+Incremental batch TTS for the lesson library.
+
+Synthesises a reference WAV (<lesson>_stranger.wav, as tts_voice.py does) for
+every .txt file of a folder with a bounded pool of workers. One SpeechConfig
+is shared by all workers and each worker thread keeps its own synthesizer.
+A manifest of content hashes (tts_manifest.json in the output folder) lets a
+rebuild skip lessons whose text and voice have not changed.
+
+Usage (from the repository root):
+    python app/tools/batch_tts.py --input database/learning_database/backup --workers 8
+    python app/tools/batch_tts.py --input some/folder --output /tmp/wavs --fake
+"""
+import os
+import io
+import json
+import math
+import time
+import wave
+import struct
+import hashlib
+import argparse
+import threading
+from glob import glob
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_VOICE = "en-US-GuyNeural"
+MANIFEST_NAME = "tts_manifest.json"
+
+def content_hash(text, voice):
+    """Return the sha256 of the voice and text that produce one WAV."""
+    return hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()
+
+class AzureSynthesizer:
+    """Azure TTS with one shared SpeechConfig and a synthesizer per worker thread."""
+    def __init__(self, speech_key, speech_region, voice=DEFAULT_VOICE):
+        """Build the SpeechConfig once for all workers."""
+        import azure.cognitiveservices.speech as speechsdk
+        self.speechsdk = speechsdk
+        self.voice = voice
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+        self.speech_config.speech_synthesis_voice_name = voice
+        self.speech_config.set_speech_synthesis_output_format(
+            speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
+        )
+        self._local = threading.local()
+
+    def _synthesizer(self):
+        """Return this thread's synthesizer, creating it on first use."""
+        if not hasattr(self._local, "synthesizer"):
+            # audio_config=None keeps the audio in memory instead of playing it
+            self._local.synthesizer = self.speechsdk.SpeechSynthesizer(
+                speech_config=self.speech_config, audio_config=None
+            )
+        return self._local.synthesizer
+
+    def synthesize(self, text):
+        """Return the WAV bytes for text, raising RuntimeError on failure."""
+        result = self._synthesizer().speak_text_async(text).get()
+        if result.reason == self.speechsdk.ResultReason.SynthesizingAudioCompleted:
+            return result.audio_data
+        details = getattr(result, "cancellation_details", None)
+        message = getattr(details, "error_details", None) or result.reason
+        raise RuntimeError(f"Synthesis failed: {message}")
+
+class FakeSynthesizer:
+    """Offline synthesizer that writes a short tone per word, for tests and benchmarks."""
+    def __init__(self, voice="fake", sample_rate=16000, seconds_per_word=0.3, delay=0.0):
+        """Configure the tone length and a simulated service latency."""
+        self.voice = voice
+        self.sample_rate = sample_rate
+        self.seconds_per_word = seconds_per_word
+        self.delay = delay
+
+    def synthesize(self, text):
+        """Return a 16-bit mono WAV whose length follows the word count."""
+        if self.delay:
+            time.sleep(self.delay)
+        frames = int(self.sample_rate * self.seconds_per_word * max(len(text.split()), 1))
+        samples = (int(8000 * math.sin(2 * math.pi * 220 * i / self.sample_rate)) for i in range(frames))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(struct.pack(f"<{frames}h", *samples))
+        return buffer.getvalue()
+
+def load_manifest(output_dir):
+    """Load the manifest of an output folder, or an empty one."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+def save_manifest(output_dir, manifest):
+    """Write the manifest atomically."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def plan_jobs(input_dir, output_dir, voice, manifest, force=False):
+    """
+    Split the .txt files of input_dir into jobs to synthesise and skipped lessons.
+
+    Returns:
+        (jobs, skipped, empty) where jobs is a list of (wav_name, text, hash)
+    """
+    jobs, skipped, empty = [], [], []
+    for txt_file in sorted(glob(os.path.join(input_dir, "*.txt"))):
+        with open(txt_file, 'r', encoding='utf-8') as f:
+            text = f.read().strip()
+        if not text:
+            empty.append(txt_file)
+            continue
+        wav_name = f"{Path(txt_file).stem}_stranger.wav"
+        digest = content_hash(text, voice)
+        entry = manifest.get(wav_name, {})
+        if (not force and entry.get("hash") == digest
+                and os.path.exists(os.path.join(output_dir, wav_name))):
+            skipped.append(wav_name)
+            continue
+        jobs.append((wav_name, text, digest))
+    return jobs, skipped, empty
+
+def _synthesize_to_file(synthesizer, text, wav_path):
+    """Worker: synthesise text and write it atomically to wav_path."""
+    audio = synthesizer.synthesize(text)
+    tmp_path = wav_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(audio)
+    os.replace(tmp_path, wav_path)
+    return len(audio)
+
+def build_tts(input_dir, output_dir, synthesizer, workers=4, force=False):
+    """
+    Synthesise the changed lessons of input_dir into output_dir.
+
+    Args:
+        input_dir: folder with lesson .txt files
+        output_dir: folder for the WAV files and the manifest
+        synthesizer: AzureSynthesizer or FakeSynthesizer
+        workers: maximum number of concurrent synthesis requests
+        force: regenerate every lesson regardless of the manifest
+
+    Returns:
+        dict with generated/skipped/failed/empty counts and the elapsed seconds
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    jobs, skipped, empty = plan_jobs(input_dir, output_dir, synthesizer.voice, manifest, force)
+    print(f"{len(jobs)} to synthesise, {len(skipped)} unchanged, {len(empty)} empty")
+
+    generated, failed = 0, []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_synthesize_to_file, synthesizer, text, os.path.join(output_dir, wav_name)):
+                (wav_name, digest)
+            for wav_name, text, digest in jobs
+        }
+        for future in as_completed(futures):
+            wav_name, digest = futures[future]
+            try:
+                size = future.result()
+            except Exception as e:
+                print(f"Error synthesising {wav_name}: {e}")
+                failed.append(wav_name)
+                continue
+            generated += 1
+            manifest[wav_name] = {"hash": digest, "voice": synthesizer.voice, "bytes": size}
+            # keep the manifest current so an interrupted build resumes where it stopped
+            save_manifest(output_dir, manifest)
+            print(f"[{generated + len(failed)}/{len(jobs)}] {wav_name}")
+
+    return {
+        "generated": generated,
+        "skipped": len(skipped),
+        "failed": failed,
+        "empty": len(empty),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+def main():
+    """Parse command line arguments and build the reference audio."""
+    parser = argparse.ArgumentParser(description="Incremental batch TTS for lesson texts")
+    parser.add_argument("--input", required=True, help="folder with lesson .txt files")
+    parser.add_argument("--output", help="folder for the WAV files (defaults to --input)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent synthesis requests")
+    parser.add_argument("--voice", default=DEFAULT_VOICE)
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and regenerate everything")
+    parser.add_argument("--fake", action="store_true", help="use the offline fake synthesizer")
+    args = parser.parse_args()
+
+    if args.fake:
+        synthesizer = FakeSynthesizer(voice=f"fake:{args.voice}")
+    else:
+        import streamlit as st
+        synthesizer = AzureSynthesizer(
+            st.secrets["Azure_Speech"]["SPEECH_KEY"],
+            st.secrets["Azure_Speech"]["SPEECH_REGION"],
+            args.voice,
+        )
+    summary = build_tts(args.input, args.output or args.input, synthesizer, args.workers, args.force)
+    print(json.dumps(summary, indent=4))
+
+if __name__ == "__main__":
+    main()
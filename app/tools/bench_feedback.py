@@ -0,0 +1,141 @@
+"""
+Offline latency benchmark of the AI feedback path.
+
+Starts the fake OpenAI-compatible server in-process, points AIChat at it and
+measures, through get_chat_response, the time to the first visible frame and
+the total time until the stream is drained.
+
+Usage (from the repository root):
+    python app/tools/bench_feedback.py --runs 20 --first-token-delay 0.8 --tokens-per-second 40
+    python app/tools/bench_feedback.py --secondary-first-token-delay 0.2 --hedge-budget 0.5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+# Ensure the app and tools directories are in the Python path
+sys.path.append(os.path.abspath("app"))
+sys.path.append(os.path.abspath("app/tools"))
+from ai_chat import AIChat
+from feedback_cache import FeedbackCache
+from llm_providers import AzureOpenAIProvider
+from fake_llm_server import FakeLLMConfig, FakeLLMServer
+import llm_pool
+
+ERROR_DATA = {
+    "省略 (Omission)": {"count": 2, "words": ["through", "telescope"]},
+    "発音誤り (Mispronunciation)": {"count": 3, "words": ["galaxy", "spiral", "whirlpool"]},
+}
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of values by nearest rank."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(values):
+    """Return mean/p50/p95/max of a list of seconds."""
+    if not values:
+        return {}
+    return {
+        "mean": statistics.mean(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values),
+    }
+
+def fake_provider(server, model=AIChat.model):
+    """Build an Azure provider that talks to a fake server."""
+    return AzureOpenAIProvider(
+        azure_endpoint=server.url, api_key="fake-key", api_version=AIChat.api_version, model=model
+    )
+
+def run_once(ai_chat):
+    """Time one feedback request: (first frame seconds or None on failure, total seconds, characters)."""
+    start = time.perf_counter()
+    stream = ai_chat.get_chat_response(ERROR_DATA)
+    first_frame = None
+    characters = 0
+    if stream is not None:
+        try:
+            for frame in stream:
+                if first_frame is None:
+                    first_frame = time.perf_counter() - start
+                characters += len(frame)
+        except Exception as e:
+            # e.g. --failure disconnect, or stall once the read times out; run() counts it as a failure
+            print(f"Feedback stream failed: {e}", file=sys.stderr)
+            return None, time.perf_counter() - start, characters
+    return first_frame, time.perf_counter() - start, characters
+
+def run(runs, primary_config, secondary_config=None, hedge_budget=AIChat.hedge_budget, use_cache=False):
+    """Run the benchmark and return a summary dict."""
+    primary_server = FakeLLMServer(primary_config).start()
+    secondary_server = FakeLLMServer(secondary_config).start() if secondary_config else None
+    cache_dir = tempfile.mkdtemp(prefix="feedback_cache_")
+    try:
+        providers = (
+            fake_provider(primary_server),
+            fake_provider(secondary_server) if secondary_server else None,
+        )
+        first_frames, totals, failures = [], [], 0
+        winners = {}
+        for i in range(runs):
+            # without --cache every run starts from an empty cache
+            cache = FeedbackCache(cache_dir if use_cache else tempfile.mkdtemp(prefix="feedback_cache_"))
+            ai_chat = AIChat(providers=providers, cache=cache)
+            ai_chat.hedge_budget = hedge_budget
+            first_frame, total, characters = run_once(ai_chat)
+            if first_frame is None or characters == 0:
+                failures += 1
+                continue
+            first_frames.append(first_frame)
+            totals.append(total)
+            winner = ai_chat.last_provider or "cache"
+            winners[winner] = winners.get(winner, 0) + 1
+        return {
+            "runs": runs,
+            "failures": failures,
+            "time_to_first_frame": summarize(first_frames),
+            "total_time": summarize(totals),
+            "winners": winners,
+            "connection_pool": llm_pool.pool_metrics(),
+        }
+    finally:
+        primary_server.stop()
+        if secondary_server:
+            secondary_server.stop()
+
+def main():
+    """Parse command line arguments, run the benchmark and print JSON results."""
+    parser = argparse.ArgumentParser(description="Offline benchmark of the AI feedback path")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--first-token-delay", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--failure", default="none")
+    parser.add_argument("--failure-rate", type=float, default=1.0)
+    parser.add_argument("--secondary-first-token-delay", type=float, default=None,
+                        help="start a second fake server as the hedge provider")
+    parser.add_argument("--hedge-budget", type=float, default=AIChat.hedge_budget)
+    parser.add_argument("--cache", action="store_true", help="keep the feedback cache between runs")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    primary_config = FakeLLMConfig(args.first_token_delay, args.tokens_per_second, args.failure, args.failure_rate)
+    secondary_config = None
+    if args.secondary_first_token_delay is not None:
+        secondary_config = FakeLLMConfig(args.secondary_first_token_delay, args.tokens_per_second)
+
+    results = run(args.runs, primary_config, secondary_config, args.hedge_budget, args.cache)
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
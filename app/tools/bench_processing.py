@@ -0,0 +1,188 @@
+"""
+Micro-benchmarks of the result-processing hot path.
+
+Times collect_errors, create_syllable_table, create_radar_chart,
+create_waveform_plot and store_scores (learning page) and
+report.analyze_pronunciation_errors on synthetic results of 10, 100 and
+1,000 words, synthetic recordings of 5 to 120 seconds and score histories
+of 10 to 1,000 attempts. Each case reports the median time of --repeat runs
+and the peak traced memory of one run.
+
+Baselines are saved per case; a later run is compared against them and
+exits with status 1 when a case got slower or bigger than --tolerance.
+
+Usage (from the repository root):
+    python app/tools/bench_processing.py --save-baseline
+    python app/tools/bench_processing.py --tolerance 0.25
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import tempfile
+import tracemalloc
+import statistics
+
+# Ensure the app, learn and tools directories are in the Python path
+sys.path.append(os.path.abspath("app"))
+sys.path.append(os.path.abspath("app/learn"))
+sys.path.append(os.path.abspath("app/tools"))
+from synthetic_data import make_result, make_wav
+
+baseline_path = "database/benchmarks/processing_baseline.json"
+
+WORD_COUNTS = (10, 100, 1000)
+AUDIO_SECONDS = (5, 30, 120)
+HISTORY_SIZES = (10, 100, 1000)
+
+def measure(fn, repeat):
+    """Return (median seconds, peak traced bytes) of fn()."""
+    # warm-up: imports, librosa's JIT compilation and font caches are not what we measure
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), peak
+
+def prepare_workdir():
+    """Switch to a scratch directory with the files the app modules expect on import."""
+    workdir = tempfile.mkdtemp(prefix="bench_processing_")
+    os.makedirs(os.path.join(workdir, "database", "all_users"))
+    with open(os.path.join(workdir, "database", "all_users", "users_info.json"), 'w') as f:
+        json.dump({}, f)
+    os.chdir(workdir)
+    return workdir
+
+def build_cases(workdir):
+    """Return a list of (case name, callable) for every benchmarked function and size."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import streamlit as st
+    import echo_learning
+    import report
+    from user import User
+
+    user = User("bench", "bench")
+    cases = []
+
+    def plotted(make_figure):
+        """Close the figure so repeated runs do not accumulate memory."""
+        def run():
+            plt.close(make_figure())
+        return run
+
+    for n_words in WORD_COUNTS:
+        result = make_result(n_words, seed=n_words)
+        cases.append((f"collect_errors/words={n_words}", lambda r=result: echo_learning.collect_errors(r)))
+        cases.append((f"create_syllable_table/words={n_words}",
+                      lambda r=result: echo_learning.create_syllable_table(r)))
+        cases.append((f"create_radar_chart/words={n_words}",
+                      plotted(lambda r=result: echo_learning.create_radar_chart(r))))
+
+    for seconds in AUDIO_SECONDS:
+        # about 2.5 words per second of speech
+        result = make_result(max(int(seconds * 2.5), 1), seconds=seconds, seed=seconds)
+        wav_path = make_wav(os.path.join(workdir, f"audio_{seconds}s.wav"), seconds)
+        cases.append((f"create_waveform_plot/seconds={seconds}",
+                      plotted(lambda w=wav_path, r=result: echo_learning.create_waveform_plot(w, r))))
+
+    for history in HISTORY_SIZES:
+        results = [make_result(100, seed=i) for i in range(history)]
+        cases.append((f"analyze_pronunciation_errors/history={history}",
+                      lambda rs=results: report.analyze_pronunciation_errors(rs)))
+
+        def store(history=history, result=results[-1]):
+            """store_scores with `history` earlier attempts already in the session."""
+            scores = {k: [80.0] * history for k in
+                      ['AccuracyScore', 'FluencyScore', 'CompletenessScore', 'ProsodyScore', 'PronScore']}
+            st.session_state.learning_state = {
+                'scores_history': {0: scores},
+                'current_errors': {},
+                'total_errors': {0: {}},
+            }
+            echo_learning.store_scores(user, 0, result)
+        cases.append((f"store_scores/history={history}", store))
+    return cases
+
+def compare(results, baseline, tolerance):
+    """Return the cases slower or bigger than baseline * (1 + tolerance)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append({
+                    "case": name,
+                    "metric": metric,
+                    "baseline": previous[metric],
+                    "current": current[metric],
+                    "ratio": round(current[metric] / previous[metric], 2),
+                })
+    return regressions
+
+def main():
+    """Parse command line arguments, run the benchmarks and compare with the baseline."""
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of result processing")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--filter", help="only run cases whose name contains this text")
+    parser.add_argument("--baseline", default=baseline_path, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a case counts as a regression")
+    args = parser.parse_args()
+
+    # matplotlib warns about glyphs missing from the Japanese font on every chart
+    warnings.simplefilter("ignore", UserWarning)
+    baseline_file = os.path.abspath(args.baseline)
+    repo_root = os.getcwd()
+    workdir = prepare_workdir()
+    try:
+        results = {}
+        for name, fn in build_cases(workdir):
+            if args.filter and args.filter not in name:
+                continue
+            seconds, peak = measure(fn, args.repeat)
+            results[name] = {"seconds": seconds, "peak_bytes": peak}
+            print(f"{name:50s} {seconds * 1000:10.2f} ms {peak / 1024:12.1f} KiB")
+    finally:
+        os.chdir(repo_root)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_file), exist_ok=True)
+        baseline = {}
+        if os.path.exists(baseline_file):
+            with open(baseline_file, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline saved to {baseline_file}")
+        return
+
+    if not os.path.exists(baseline_file):
+        print(f"No baseline at {baseline_file}; run with --save-baseline first")
+        return
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']} {regression['metric']}: "
+              f"{regression['baseline']:.6g} -> {regression['current']:.6g} (x{regression['ratio']})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Macro benchmarks of the file-based storage layer.
+
+Runs against a database/ tree (usually one made by synthetic_history.py) and
+times, for a sample of users in every history-size bucket:
+
+- User.load_scores_history, initialize_lesson_state and save_scores_to_json
+  on the user's busiest day (the score files grow with the attempts of a day)
+- the report loader over one day folder and over the whole history
+  (get_sorted_json_files + load_json_files + analyze_pronunciation_errors)
+- the warehouse report loader, cold (first ingestion of the history) and warm
+  (manifest up to date, history still listed)
+
+and, for the tree as a whole, loading users_info.json, rewriting it on
+registration and listing the users. Timings are medians over --repeat runs
+(the cold ingestion runs once); results are printed as a table per case and
+bucket and can be written to JSON. The OS page cache stays warm between
+runs, so disk-bound cases look better here than on a cold server. The
+warehouse cases write database/warehouse/ inside the measured tree and the
+score cases rewrite the busiest day's lesson_scores.json with its own content.
+
+Usage (from the repository root):
+    python app/tools/bench_storage.py --root /tmp/echo_scale --sample 3 --output bench_storage.json
+    python app/tools/bench_storage.py --root /tmp/echo_scale --filter report --skip-cold
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import warnings
+import statistics
+
+# Ensure the app, learn and tools directories are in the Python path
+sys.path.append(os.path.abspath("app"))
+sys.path.append(os.path.abspath("app/learn"))
+sys.path.append(os.path.abspath("app/tools"))
+
+# users are grouped by the number of attempts in their history
+BUCKETS = ((0, 100), (100, 1000), (1000, 10000), (10000, None))
+
+def bucket_name(attempts):
+    """Return the label of the bucket a history size falls into."""
+    for low, high in BUCKETS:
+        if high is None or attempts < high:
+            return f"{low}+" if high is None else f"{low}-{high - 1}"
+
+def scan_user(user_name):
+    """Return {"attempts", "days", "busiest_day", "busiest_attempts"} of a user's history."""
+    history_path = os.path.join("database", user_name, "practice_history")
+    stats = {"attempts": 0, "days": 0, "busiest_day": None, "busiest_attempts": 0}
+    for entry in os.scandir(history_path):
+        if not entry.is_dir():
+            continue
+        n = sum(1 for f in os.scandir(entry.path) if f.name.endswith('.json'))
+        stats["attempts"] += n
+        stats["days"] += 1
+        if n > stats["busiest_attempts"]:
+            stats["busiest_day"], stats["busiest_attempts"] = entry.name, n
+    return stats
+
+def user_on_day(user_name, day):
+    """Return a User whose today_path is `day`, without hashing a password."""
+    from user import User
+    user = User.__new__(User)
+    user.name = user_name
+    user.password = None
+    user.user_path = f"database/{user_name}/"
+    user.practice_history_path = user.user_path + "practice_history/"
+    user.today_path = user.practice_history_path + f"{day}/"
+    return user
+
+def busiest_lesson(user):
+    """Return (lesson index, scores history) of the lesson with the most attempts on the user's day."""
+    with open(os.path.join(user.today_path, "scores", "lesson_scores.json"), 'r', encoding='utf-8') as f:
+        all_scores = json.load(f)
+    lesson_key = max(all_scores, key=lambda k: len(all_scores[k]['AccuracyScore']))
+    return int(lesson_key.split('_')[1]), all_scores[lesson_key]
+
+def timed(fn, repeat, setup=None):
+    """Return the run times in seconds of fn(), calling setup() untimed before each run."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+def user_cases(user_name, stats):
+    """Return a list of (case name, fn, setup, single run) for one user."""
+    import streamlit as st
+    import warehouse
+    import report
+    import echo_learning
+
+    user = user_on_day(user_name, stats["busiest_day"])
+    lesson_index, scores_history = busiest_lesson(user)
+    history_path = user.practice_history_path
+
+    def reset_learning_state():
+        """initialize_lesson_state only reads the files on a fresh session."""
+        st.session_state.pop('learning_state', None)
+
+    def report_folder(folder_path):
+        """What show_pronunciation_analysis does before rendering."""
+        json_contents = report.load_json_files(folder_path, report.get_sorted_json_files(folder_path))
+        return report.analyze_pronunciation_errors(json_contents)
+
+    def report_history():
+        """The day-folder report loader applied to every day of the history."""
+        for day in sorted(os.listdir(history_path)):
+            report_folder(os.path.join(history_path, day))
+
+    def reset_warehouse():
+        """Drop the user's partitions and manifest so the next load ingests everything."""
+        for table in warehouse.tables:
+            shutil.rmtree(os.path.join(warehouse.warehouse_path, table, f"user={user_name}"), ignore_errors=True)
+        manifest_file = warehouse._manifest_file(user_name)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+
+    return [
+        ("load_scores_history", lambda: user.load_scores_history(lesson_index), None, False),
+        ("initialize_lesson_state", lambda: echo_learning.initialize_lesson_state(user, lesson_index),
+         reset_learning_state, False),
+        ("save_scores_to_json", lambda: echo_learning.save_scores_to_json(user, lesson_index, scores_history),
+         None, False),
+        ("report_day_folder", lambda: report_folder(user.today_path), None, False),
+        ("report_full_history", report_history, None, False),
+        ("report_warehouse_cold", lambda: report.load_warehouse_words(user_name), reset_warehouse, True),
+        ("report_warehouse_warm", lambda: report.load_warehouse_words(user_name), None, False),
+    ]
+
+def global_cases():
+    """Return a list of (case name, fn) whose cost grows with the number of users."""
+    import warehouse
+    from user import User
+
+    def load_user_info():
+        """What importing user.py does on every app start."""
+        with open(User.user_info_path, 'r') as f:
+            json.load(f)
+
+    def register_rewrite():
+        """save_to_user_info rewrites the whole users file for one registration."""
+        with open(User.user_info_path, 'w') as f:
+            json.dump(User.user_info, f, indent=4)
+
+    return [
+        ("users_info_load", load_user_info),
+        ("users_info_rewrite", register_rewrite),
+        ("warehouse_list_users", warehouse.list_users),
+    ]
+
+def summarize_ms(values):
+    """Return median/p95/max of seconds, in milliseconds."""
+    ordered = sorted(values)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+def main():
+    """Parse command line arguments, run the benchmarks and print the results."""
+    parser = argparse.ArgumentParser(description="Macro benchmarks of the file-based storage layer")
+    parser.add_argument("--root", default=".", help="folder containing the database/ tree")
+    parser.add_argument("--sample", type=int, default=3, help="users measured per history-size bucket")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case and user")
+    parser.add_argument("--filter", help="only run cases whose name contains this text")
+    parser.add_argument("--skip-cold", action="store_true", help="skip the cold warehouse ingestion")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the user sample")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    # matplotlib and bare-mode Streamlit warn on every call outside a running app
+    warnings.simplefilter("ignore", UserWarning)
+    output_file = os.path.abspath(args.output) if args.output else None
+    os.chdir(args.root)
+    import warehouse
+
+    user_names = warehouse.list_users()
+    if not user_names:
+        print(f"No users with a practice history under {os.path.abspath('database')}")
+        return
+
+    scan_start = time.perf_counter()
+    stats = {name: scan_user(name) for name in user_names}
+    scan_seconds = time.perf_counter() - scan_start
+    by_bucket = {}
+    for name, user_stats in stats.items():
+        if user_stats["busiest_day"]:
+            by_bucket.setdefault(bucket_name(user_stats["attempts"]), []).append(name)
+
+    results = {
+        "users": len(user_names),
+        "attempts": sum(s["attempts"] for s in stats.values()),
+        "scan_seconds": round(scan_seconds, 2),
+        "global": {},
+        "buckets": {},
+    }
+    print(f"{results['users']} users, {results['attempts']} attempts, history scan {scan_seconds:.2f} s")
+
+    for name, fn in global_cases():
+        if args.filter and args.filter not in name:
+            continue
+        results["global"][name] = summarize_ms(timed(fn, args.repeat))
+        print(f"{name:28s} {'all users':>12s} {results['global'][name]['median_ms']:12.2f} ms")
+
+    rng = random.Random(args.seed)
+    for low, high in BUCKETS:
+        label = bucket_name(low)
+        names = by_bucket.get(label, [])
+        if not names:
+            continue
+        sample = rng.sample(names, min(args.sample, len(names)))
+        timings = {}
+        for user_name in sample:
+            for case, fn, setup, single in user_cases(user_name, stats[user_name]):
+                if args.filter and args.filter not in case:
+                    continue
+                if args.skip_cold and case == "report_warehouse_cold":
+                    continue
+                timings.setdefault(case, []).extend(timed(fn, 1 if single else args.repeat, setup))
+        bucket = {
+            "users_measured": len(sample),
+            "median_attempts": statistics.median(stats[n]["attempts"] for n in sample),
+            "median_busiest_day": statistics.median(stats[n]["busiest_attempts"] for n in sample),
+            "cases": {case: summarize_ms(values) for case, values in timings.items()},
+        }
+        results["buckets"][label] = bucket
+        print(f"-- bucket {label} attempts: {len(sample)} users, median history {bucket['median_attempts']}, "
+              f"median busiest day {bucket['median_busiest_day']}")
+        for case, summary in bucket["cases"].items():
+            print(f"{case:28s} {label:>12s} {summary['median_ms']:12.2f} ms  (p95 {summary['p95_ms']:.2f}, "
+                  f"max {summary['max_ms']:.2f})")
+
+    if output_file:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results written to {output_file}")
+
+if __name__ == "__main__":
+    main()
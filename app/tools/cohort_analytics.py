@@ -0,0 +1,155 @@
+"""
+Cohort-level analytics over every user's practice history.
+
+Usage (from the repository root):
+    python app/tools/cohort_analytics.py --workers 8
+
+Each user is analysed in a worker process (warehouse ingestion plus pandas
+aggregation) and the results are written to a single SQLite summary store.
+A checkpoint per user records the attempt count it was computed from, so an
+interrupted run resumes where it stopped and unchanged users are skipped.
+"""
+import os
+import sys
+import argparse
+import sqlite3
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Ensure the app directory is in the Python path
+sys.path.append(os.path.abspath("app"))
+import warehouse
+
+summary_path = "database/cohort/summary.sqlite"
+
+SCORE_FIELDS = warehouse.SCORE_FIELDS
+GROUPINGS = {
+    "per_user": ["user"],
+    "per_lesson": ["user", "lesson"],
+    "per_day": ["user", "date"],
+}
+
+def improvement_slope(scores):
+    """Least-squares slope of scores against attempt order (points per attempt)."""
+    scores = np.asarray(scores, dtype=float)
+    scores = scores[~np.isnan(scores)]
+    if len(scores) < 2:
+        return np.nan
+    return np.polyfit(np.arange(len(scores)), scores, 1)[0]
+
+def aggregate(attempts_df, words_df, keys):
+    """Compute score distribution, error-type rates and slopes for one grouping."""
+    attempts_df = attempts_df.sort_values("timestamp")
+    grouped = attempts_df.groupby(keys, sort=True)
+
+    summary = grouped.size().rename("attempts").to_frame()
+    for field in SCORE_FIELDS:
+        summary[f"{field}_mean"] = grouped[field].mean()
+    pron = grouped["PronScore"]
+    summary["PronScore_std"] = pron.std()
+    summary["PronScore_p10"] = pron.quantile(0.1)
+    summary["PronScore_p50"] = pron.quantile(0.5)
+    summary["PronScore_p90"] = pron.quantile(0.9)
+    summary["PronScore_slope"] = pron.agg(improvement_slope)
+
+    # error-type rates are errors per assessed word
+    summary["words"] = words_df.groupby(keys).size()
+    errors = words_df[words_df["error_type"].fillna("None") != "None"]
+    if not errors.empty:
+        error_counts = errors.groupby(keys + ["error_type"]).size().unstack(fill_value=0)
+        error_rates = error_counts.div(summary["words"], axis=0).add_prefix("rate_")
+        summary = summary.join(error_rates)
+    return summary.reset_index()
+
+def analyze_user(user_name):
+    """Worker entry point: ingest a user's history and aggregate it."""
+    # checkpoint against the files on disk so unreadable attempts do not force re-runs
+    attempts = attempt_count(user_name)
+    warehouse.ingest_user(user_name)
+    attempts_df = warehouse.load_table("attempts", users=[user_name])
+    words_df = warehouse.load_table(
+        "words", users=[user_name], columns=["user", "date", "lesson", "error_type"]
+    )
+    results = {}
+    if not attempts_df.empty:
+        for name, keys in GROUPINGS.items():
+            results[name] = aggregate(attempts_df, words_df, keys)
+    return user_name, attempts, results
+
+def attempt_count(user_name):
+    """Count the saved attempts of a user without parsing them."""
+    return sum(1 for _ in warehouse.list_attempt_files(user_name))
+
+def open_store(path):
+    """Open the summary store and make sure the checkpoint table exists."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS checkpoints "
+        "(user TEXT PRIMARY KEY, attempts INTEGER, updated_at TEXT)"
+    )
+    return conn
+
+def load_checkpoints(conn):
+    """Return {user: attempt count} of users already summarised."""
+    return dict(conn.execute("SELECT user, attempts FROM checkpoints").fetchall())
+
+def write_results(conn, user_name, attempts, results):
+    """Replace a user's rows in the summary store and checkpoint them."""
+    with conn:
+        for name, summary in results.items():
+            existing = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+            ).fetchone()
+            if existing:
+                columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{name}")')}
+                # new error types appear as new rate columns
+                for column in summary.columns:
+                    if column not in columns:
+                        conn.execute(f'ALTER TABLE "{name}" ADD COLUMN "{column}"')
+                conn.execute(f'DELETE FROM "{name}" WHERE user = ?', (user_name,))
+            summary.to_sql(name, conn, if_exists="append", index=False)
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+            (user_name, attempts, datetime.now().isoformat(timespec="seconds"))
+        )
+
+def run(users=None, workers=None, output=summary_path, restart=False):
+    """Summarise every user with new attempts since their last checkpoint."""
+    conn = open_store(output)
+    if restart:
+        with conn:
+            conn.execute("DELETE FROM checkpoints")
+    checkpoints = load_checkpoints(conn)
+
+    users = users or warehouse.list_users()
+    pending = [name for name in users if checkpoints.get(name) != attempt_count(name)]
+    print(f"{len(pending)} of {len(users)} users need to be summarised")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(analyze_user, name): name for name in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                user_name, attempts, results = future.result()
+            except Exception as e:
+                print(f"[{done}/{len(pending)}] {name} failed: {e}")
+                continue
+            write_results(conn, user_name, attempts, results)
+            print(f"[{done}/{len(pending)}] {user_name}: {attempts} attempts")
+    conn.close()
+
+def main():
+    """Parse command line arguments and run the batch job."""
+    parser = argparse.ArgumentParser(description="Cohort analytics over database/*/practice_history/")
+    parser.add_argument("--users", nargs="*", help="only summarise these users")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--output", default=summary_path, help="SQLite summary store")
+    parser.add_argument("--restart", action="store_true", help="ignore existing checkpoints")
+    args = parser.parse_args()
+    run(users=args.users, workers=args.workers, output=args.output, restart=args.restart)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Local OpenAI-compatible streaming server for offline latency benchmarks.
+
+Serves streamed chat completions on both the Azure route
+(/openai/deployments/<model>/chat/completions) and the OpenAI route
+(/v1/chat/completions), so AIChat can be pointed at it instead of Azure.
+
+Usage (from the repository root):
+    python app/tools/fake_llm_server.py --port 8900 --first-token-delay 0.8 --tokens-per-second 40
+
+Failure modes:
+    none        always answer
+    http500     reply with HTTP 500
+    http429     reply with HTTP 429 (rate limited)
+    disconnect  drop the connection after half of the tokens
+    stall       send the first token, then stop sending without closing
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_TEXT = (
+    "素晴らしい練習でした！ 今回は いくつかの 単語で 発音の ミスが ありましたが、 "
+    "少しずつ 改善しています。 まず、 ゆっくり 一語ずつ 発音してみましょう。 "
+    "次に、 音声を 聞きながら シャドーイングを してみてください。 この調子で 頑張りましょう！"
+)
+FAILURE_MODES = ("none", "http500", "http429", "disconnect", "stall")
+
+class FakeLLMConfig:
+    """Timing and failure settings shared by all requests of one server."""
+    def __init__(self, first_token_delay=0.5, tokens_per_second=50.0, failure="none",
+                 failure_rate=1.0, text=DEFAULT_TEXT):
+        """Store the server behaviour."""
+        if failure not in FAILURE_MODES:
+            raise ValueError(f"Unknown failure mode: {failure}")
+        self.first_token_delay = first_token_delay
+        self.tokens_per_second = tokens_per_second
+        self.failure = failure
+        self.failure_rate = failure_rate
+        self.text = text
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Answer chat completion requests with a scripted SSE stream."""
+    protocol_version = "HTTP/1.1"
+    config = FakeLLMConfig()
+
+    def log_message(self, format, *args):
+        """Keep benchmark output quiet."""
+        pass
+
+    def do_POST(self):
+        """Stream a chat completion, or fail according to the config."""
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        config = self.config
+        failure = config.failure if random.random() < config.failure_rate else "none"
+        time.sleep(config.first_token_delay)
+        if failure == "http500":
+            self._send_json(500, {"error": {"message": "internal server error"}})
+            return
+        if failure == "http429":
+            self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": "1"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        model = body.get("model", "fake")
+        tokens = [token + " " for token in config.text.split(" ")]
+        interval = 1.0 / config.tokens_per_second if config.tokens_per_second else 0.0
+        for i, token in enumerate(tokens):
+            if failure == "disconnect" and i == len(tokens) // 2:
+                self.close_connection = True
+                return
+            if failure == "stall" and i == 1:
+                # keep the connection open without sending anything
+                time.sleep(3600)
+            self._send_event(self._chunk(model, {"content": token}))
+            if interval:
+                time.sleep(interval)
+        self._send_event(self._chunk(model, {}, finish_reason="stop"))
+        # [DONE] and the terminating chunk go out together, like a buffered server would
+        done = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(done):X}\r\n".encode("ascii") + done + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+    def _chunk(self, model, delta, finish_reason=None):
+        """Build one chat.completion.chunk payload."""
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _send_event(self, payload):
+        """Send one server-sent event."""
+        self._send_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _send_chunk(self, data):
+        """Write one HTTP chunk (an empty chunk ends the body)."""
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        """Send a complete JSON response."""
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeLLMServer:
+    """Run the fake server in a background thread, e.g. inside a benchmark."""
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        """Bind the server; port 0 picks a free port."""
+        handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {"config": config or FakeLLMConfig()})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """Return the base URL to use as azure_endpoint."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving in the background and return self."""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    """Parse command line arguments and serve until interrupted."""
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible streaming server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--first-token-delay", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--failure", choices=FAILURE_MODES, default="none")
+    parser.add_argument("--failure-rate", type=float, default=1.0, help="share of requests that fail")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(args.first_token_delay, args.tokens_per_second, args.failure, args.failure_rate)
+    server = FakeLLMServer(config, args.host, args.port)
+    print(f"Fake LLM server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Local Redis-protocol server for trying the shared state store without Redis.
+
+Speaks RESP over TCP and implements the commands state_store.RedisStateStore
+uses plus a few for inspection: PING, ECHO, AUTH, SELECT, GET, SET (EX/PX/
+NX/XX), DEL, EXISTS, EXPIRE, TTL, KEYS, DBSIZE, FLUSHDB and QUIT. Data lives
+in memory only, so restarting the server drops every login.
+
+Usage (from the repository root):
+    python app/tools/fake_redis_server.py --port 6390
+    python app/tools/fake_redis_server.py --port 6390 --password secret --latency 0.002
+
+and in .streamlit/secrets.toml:
+    [State]
+    BACKEND = "redis"
+    REDIS_URL = "redis://:secret@localhost:6390/0"
+"""
+import time
+import fnmatch
+import argparse
+import threading
+import socketserver
+
+class FakeRedisData:
+    """In-memory databases with per-key expiry, shared by all connections."""
+    def __init__(self, password=None, latency=0.0):
+        """Start with empty databases."""
+        self.password = password
+        self.latency = latency
+        self.dbs = {}
+        self.lock = threading.Lock()
+
+    def db(self, index):
+        """Return {key: (value, expires or None)} of a database."""
+        return self.dbs.setdefault(index, {})
+
+    def live(self, db, key):
+        """Return the value of key, dropping it if expired (lock held)."""
+        entry = db.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            del db[key]
+            return None
+        return value
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """One client connection: read RESP commands and write replies."""
+    def setup(self):
+        """Per-connection state: selected database and authentication."""
+        super().setup()
+        self.db_index = 0
+        self.authenticated = self.server.data.password is None
+
+    def read_command(self):
+        """Return the arguments of the next command as bytes, or None at end of stream."""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # inline command, e.g. from telnet
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        """Encode a reply: str is a status, int an integer, bytes/None a bulk string, list an array, Exception an error."""
+        if isinstance(value, Exception):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(self.reply(item) for item in value)
+        return f"${len(value)}\r\n".encode() + value + b"\r\n"
+
+    def handle(self):
+        """Serve commands until the client disconnects or sends QUIT."""
+        while True:
+            try:
+                args = self.read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            name = args[0].decode().upper()
+            if self.server.data.latency:
+                time.sleep(self.server.data.latency)
+            try:
+                result = self.execute(name, args[1:])
+            except Exception as e:
+                result = Exception(f"ERR {e}")
+            self.wfile.write(self.reply(result))
+            if name == "QUIT":
+                return
+
+    def execute(self, name, args):
+        """Run one command and return its reply value."""
+        data = self.server.data
+        if name == "AUTH":
+            if data.password is None:
+                return Exception("ERR AUTH <password> called without any password configured")
+            if args[-1].decode() != data.password:
+                return Exception("WRONGPASS invalid username-password pair")
+            self.authenticated = True
+            return "OK"
+        if name == "QUIT":
+            return "OK"
+        if not self.authenticated:
+            return Exception("NOAUTH Authentication required.")
+        if name == "PING":
+            return args[0] if args else "PONG"
+        if name == "ECHO":
+            return args[0]
+        if name == "SELECT":
+            self.db_index = int(args[0])
+            return "OK"
+
+        with data.lock:
+            db = data.db(self.db_index)
+            if name == "GET":
+                return data.live(db, args[0])
+            if name == "SET":
+                key, value = args[0], args[1]
+                expires = None
+                only_new = only_existing = False
+                options = [a.decode().upper() for a in args[2:]]
+                i = 0
+                while i < len(options):
+                    if options[i] == "EX":
+                        expires = time.time() + int(options[i + 1])
+                        i += 1
+                    elif options[i] == "PX":
+                        expires = time.time() + int(options[i + 1]) / 1000
+                        i += 1
+                    elif options[i] == "NX":
+                        only_new = True
+                    elif options[i] == "XX":
+                        only_existing = True
+                    else:
+                        return Exception("ERR syntax error")
+                    i += 1
+                exists = data.live(db, key) is not None
+                if (only_new and exists) or (only_existing and not exists):
+                    return None
+                db[key] = (value, expires)
+                return "OK"
+            if name == "DEL":
+                removed = 0
+                for key in args:
+                    if data.live(db, key) is not None:
+                        del db[key]
+                        removed += 1
+                return removed
+            if name == "EXISTS":
+                return sum(1 for key in args if data.live(db, key) is not None)
+            if name == "EXPIRE":
+                value = data.live(db, args[0])
+                if value is None:
+                    return 0
+                db[args[0]] = (value, time.time() + int(args[1]))
+                return 1
+            if name == "TTL":
+                value = data.live(db, args[0])
+                if value is None:
+                    return -2
+                expires = db[args[0]][1]
+                return -1 if expires is None else max(0, round(expires - time.time()))
+            if name == "KEYS":
+                pattern = args[0].decode()
+                return [key for key in list(db) if data.live(db, key) is not None
+                        and fnmatch.fnmatchcase(key.decode(), pattern)]
+            if name == "DBSIZE":
+                return sum(1 for key in list(db) if data.live(db, key) is not None)
+            if name == "FLUSHDB":
+                db.clear()
+                return "OK"
+        return Exception(f"ERR unknown command '{name}'")
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """Threaded TCP server sharing one FakeRedisData."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=6390, password=None, latency=0.0):
+        """Bind to host:port; port 0 picks a free port."""
+        super().__init__((host, port), RESPHandler)
+        self.data = FakeRedisData(password, latency)
+
+    @property
+    def url(self):
+        """Return the redis:// URL of this server."""
+        host, port = self.server_address[:2]
+        auth = f":{self.data.password}@" if self.data.password else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+    def start(self):
+        """Serve in a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main():
+    """Parse command line arguments and serve until interrupted."""
+    parser = argparse.ArgumentParser(description="Local Redis-protocol server for the shared state store")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=6390, help="port to listen on")
+    parser.add_argument("--password", help="require AUTH with this password")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every command (network round trip)")
+    args = parser.parse_args()
+
+    server = FakeRedisServer(args.host, args.port, args.password, args.latency)
+    print(f"Fake Redis server on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
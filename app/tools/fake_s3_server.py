@@ -0,0 +1,243 @@
+"""
+Local S3-compatible server for trying the object storage backend without a cloud account.
+
+Keeps buckets in memory and implements what object_store.S3Storage uses:
+create bucket (PUT /<bucket>), PUT/GET/HEAD/DELETE object and
+ListObjectsV2 (GET /<bucket>?list-type=2) with continuation tokens. Requests
+must carry a valid AWS Signature Version 4 for the configured credentials.
+Latency and random HTTP 503 answers can be injected to exercise the upload
+queue's retries.
+
+Usage (from the repository root):
+    python app/tools/fake_s3_server.py --port 9000 --bucket phonoecho
+    python app/tools/fake_s3_server.py --port 9000 --bucket phonoecho --latency 0.2 --failure-rate 0.3
+
+and in .streamlit/secrets.toml:
+    [Storage]
+    BACKEND = "s3"
+    ENDPOINT = "http://localhost:9000"
+    BUCKET = "phonoecho"
+    ACCESS_KEY = "fake-access-key"
+    SECRET_KEY = "fake-secret-key"
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import threading
+from xml.sax.saxutils import escape
+from urllib.parse import urlparse, parse_qsl, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Ensure the app directory is in the Python path
+sys.path.append(os.path.abspath("app"))
+from object_store import sign_v4
+
+LIST_PAGE_SIZE = 1000
+
+class FakeS3Config:
+    """Credentials, timing and failure settings shared by all requests of one server."""
+    def __init__(self, access_key="fake-access-key", secret_key="fake-secret-key", region="us-east-1",
+                 latency=0.0, failure_rate=0.0):
+        """Store the server behaviour."""
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """Answer S3 object and bucket requests from the in-memory buckets."""
+    protocol_version = "HTTP/1.1"
+    config = FakeS3Config()
+
+    def log_message(self, format, *args):
+        """Keep benchmark output quiet."""
+        pass
+
+    def _error(self, status, code, message=""):
+        """Send an S3 XML error."""
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code>'
+                f'<Message>{escape(message)}</Message></Error>').encode("utf-8")
+        self._send(status, body, {"Content-Type": "application/xml"}, head=self.command == "HEAD")
+
+    def _send(self, status, body=b"", headers=None, head=False):
+        """Send a complete response."""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _authorized(self, body):
+        """Check the request's Signature Version 4 against the configured credentials."""
+        authorization = self.headers.get("Authorization", "")
+        try:
+            fields = dict(part.strip().split("=", 1) for part in authorization[len("AWS4-HMAC-SHA256 "):].split(","))
+            credential = fields["Credential"].split("/")
+            signed_names = fields["SignedHeaders"].split(";")
+        except (ValueError, KeyError):
+            return False
+        if credential[0] != self.config.access_key:
+            return False
+        payload_hash = self.headers.get("x-amz-content-sha256", "")
+        if payload_hash != "UNSIGNED-PAYLOAD" and payload_hash != hashlib.sha256(body).hexdigest():
+            return False
+        parsed = urlparse(self.path)
+        headers = {name: self.headers.get(name, "") for name in signed_names if name != "host"}
+        expected = sign_v4(
+            self.command, self.headers.get("Host", ""), parsed.path,
+            dict(parse_qsl(parsed.query, keep_blank_values=True)), headers, payload_hash,
+            self.config.access_key, self.config.secret_key, credential[2], self.headers.get("x-amz-date", "")
+        )
+        return expected == authorization
+
+    def _handle(self):
+        """Route one request to its bucket or object operation."""
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        config = self.config
+        with config.lock:
+            config.requests += 1
+        if config.latency:
+            time.sleep(config.latency)
+        if random.random() < config.failure_rate:
+            self._error(503, "SlowDown", "Injected failure")
+            return
+        if not self._authorized(body):
+            self._error(403, "SignatureDoesNotMatch", "The request signature we calculated does not match")
+            return
+
+        parsed = urlparse(self.path)
+        bucket_name, _, key = unquote(parsed.path).lstrip("/").partition("/")
+        query = dict(parse_qsl(parsed.query, keep_blank_values=True))
+        with config.lock:
+            if not key:
+                if self.command == "PUT":
+                    if bucket_name in config.buckets:
+                        self._error(409, "BucketAlreadyOwnedByYou", bucket_name)
+                        return
+                    config.buckets[bucket_name] = {}
+                    self._send(200)
+                    return
+                bucket = config.buckets.get(bucket_name)
+                if bucket is None:
+                    self._error(404, "NoSuchBucket", bucket_name)
+                    return
+                if self.command == "GET":
+                    self._send(200, self._list(bucket_name, bucket, query), {"Content-Type": "application/xml"})
+                    return
+                self._error(405, "MethodNotAllowed", self.command)
+                return
+
+            bucket = config.buckets.get(bucket_name)
+            if bucket is None:
+                self._error(404, "NoSuchBucket", bucket_name)
+                return
+            if self.command == "PUT":
+                bucket[key] = (body, self.headers.get("Content-Type", "application/octet-stream"))
+                self._send(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+            elif self.command in ("GET", "HEAD"):
+                if key not in bucket:
+                    self._error(404, "NoSuchKey", key)
+                    return
+                data, content_type = bucket[key]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if self.command == "GET":
+                    self.wfile.write(data)
+            elif self.command == "DELETE":
+                bucket.pop(key, None)
+                self._send(204)
+            else:
+                self._error(405, "MethodNotAllowed", self.command)
+
+    def _list(self, bucket_name, bucket, query):
+        """Return the ListObjectsV2 XML of one page of keys."""
+        prefix = query.get("prefix", "")
+        page_size = int(query.get("max-keys", LIST_PAGE_SIZE))
+        start = query.get("continuation-token", "")
+        keys = sorted(k for k in bucket if k.startswith(prefix) and k > start)
+        page, truncated = keys[:page_size], len(keys) > page_size
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key><Size>{len(bucket[k][0])}</Size></Contents>" for k in page
+        )
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        return (f'<?xml version="1.0" encoding="UTF-8"?>'
+                f'<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f'<Name>{escape(bucket_name)}</Name><Prefix>{escape(prefix)}</Prefix>'
+                f'<KeyCount>{len(page)}</KeyCount><IsTruncated>{str(truncated).lower()}</IsTruncated>'
+                f'{token}{contents}</ListBucketResult>').encode("utf-8")
+
+    do_PUT = do_GET = do_DELETE = _handle
+
+    def do_HEAD(self):
+        """HEAD answers like GET without a body (errors included)."""
+        self._handle()
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """Do not print a traceback when a client drops a kept-alive connection."""
+    def handle_error(self, request, client_address):
+        """Ignore connection resets, report anything else."""
+        if not isinstance(sys.exc_info()[1], ConnectionResetError):
+            super().handle_error(request, client_address)
+
+class FakeS3Server:
+    """Run the fake server in a background thread, e.g. inside a benchmark."""
+    def __init__(self, config=None, host="127.0.0.1", port=0, buckets=()):
+        """Bind the server and create the given buckets; port 0 picks a free port."""
+        self.config = config or FakeS3Config()
+        for bucket in buckets:
+            self.config.buckets.setdefault(bucket, {})
+        handler = type("ConfiguredFakeS3Handler", (FakeS3Handler,), {"config": self.config})
+        self.httpd = QuietHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """Return the endpoint URL."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving in the background and return self."""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    """Parse command line arguments and serve until interrupted."""
+    parser = argparse.ArgumentParser(description="Local S3-compatible server for the object storage backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--bucket", action="append", default=[], help="bucket created at start (repeatable)")
+    parser.add_argument("--access-key", default="fake-access-key")
+    parser.add_argument("--secret-key", default="fake-secret-key")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered with HTTP 503")
+    args = parser.parse_args()
+
+    config = FakeS3Config(args.access_key, args.secret_key, latency=args.latency, failure_rate=args.failure_rate)
+    server = FakeS3Server(config, args.host, args.port, args.bucket)
+    print(f"Fake S3 server listening on {server.url} (buckets: {', '.join(args.bucket) or 'none'})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+"""
+Concurrent-learner load generator for the Streamlit app.
+
+Starts echo_app.py in its own `streamlit run` server process inside a scratch
+folder (learner accounts, lessons, captured-traffic mock assessment backend
+and a fake LLM server for the feedback), then drives N simulated learners
+over Streamlit's websocket protocol, the way browsers do. Each learner opens
+the app, logs in, and per attempt moves to another lesson, uploads a
+recorded WAV through the audio input and starts the assessment, then opens
+the summary tab. Streamlit tabs switch in the browser, so the summary is
+rendered by every rerun; opening it only fetches the media it references,
+and the number of charts it holds is reported.
+
+For every step of --learners it reports rerun latency percentiles per
+action and the server process's CPU time and RSS, per session and in total,
+so the number of learners one server process can carry within --slo-ms can
+be read off the sweep. Every step starts a fresh server; a warm-up learner
+runs the scenario once before measuring, so imports and caches are part of
+the baseline rather than of the first learner.
+
+Streamlit's testing AppTest swaps process-global state on every run, so
+concurrent sessions inside one process cannot be simulated with it; that is
+why this talks to a real server.
+
+Usage (from the repository root):
+    python app/tools/load_test.py --learners 1,5,10,20 --attempts 3 --think 2
+    python app/tools/load_test.py --learners 10 --service-ms 800 --rate 5 --concurrency 2 --output load.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+import psutil
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.websocket import websocket_connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ClientState_pb2 import ClientState
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState, WidgetStates
+from streamlit.proto.Common_pb2 import FileURLsRequest, FileUploaderState, UploadedFileInfo
+
+# Ensure the app and tools directories are in the Python path
+sys.path.append(os.path.abspath("app"))
+sys.path.append(os.path.abspath("app/tools"))
+from synthetic_data import WORDS, make_result, make_wav
+from synthetic_history import prepare_root
+from fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+repo_root = os.path.abspath(".")
+app_script = os.path.join(repo_root, "app", "echo_app.py")
+
+# first line of the secrets file this tool writes; any other secrets.toml is left alone
+SECRETS_MARKER = "# written by app/tools/load_test.py"
+
+ACTIONS = ("open", "login", "navigate", "submit", "summary")
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of values by nearest rank."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(values):
+    """Return count/p50/p95/p99/max of a list of seconds, in milliseconds."""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+def free_port():
+    """Return a TCP port nobody is listening on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def prepare_load_root(root, names, password, lessons, service_ms, captures, llm_url, rate, concurrency):
+    """
+    Fill the scratch folder the server runs in.
+
+    Registers the learners, gives each of them `lessons` lessons, writes
+    synthetic captures for the mock assessment backend (unless captures is
+    given) and .streamlit/secrets.toml pointing the app at both fakes.
+    """
+    secrets_file = os.path.join(root, ".streamlit", "secrets.toml")
+    if os.path.exists(secrets_file):
+        with open(secrets_file, 'r', encoding='utf-8') as f:
+            if f.readline().strip() != SECRETS_MARKER:
+                raise SystemExit(f"{secrets_file} was not written by this tool; use an empty --root")
+
+    # the app reads app/ and logo/ relative to its working directory
+    for name in ("app", "logo"):
+        link = os.path.join(root, name)
+        if not os.path.exists(link):
+            os.makedirs(root, exist_ok=True)
+            os.symlink(os.path.join(repo_root, name), link)
+    prepare_root(root, names, password)
+
+    rng = random.Random(0)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + "." for _ in range(lessons)]
+    video = os.path.join(repo_root, "logo", "PhonoEcho.mp4")
+    for name in names:
+        lesson_dir = os.path.join("database", "learning_database", name)
+        # rebuilt on every run so a smaller --lessons takes effect
+        shutil.rmtree(lesson_dir, ignore_errors=True)
+        os.makedirs(lesson_dir)
+        for i, text in enumerate(texts):
+            with open(os.path.join(lesson_dir, f"lesson{i + 1:02d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text)
+            video_path = os.path.join(lesson_dir, f"lesson{i + 1:02d}.mp4")
+            try:
+                os.link(video, video_path)
+            except OSError:
+                shutil.copyfile(video, video_path)
+
+    if not captures:
+        captures = os.path.abspath(os.path.join("database", "load_captures", "captures-synthetic.jsonl"))
+        os.makedirs(os.path.dirname(captures), exist_ok=True)
+        with open(captures, 'w', encoding='utf-8') as f:
+            now = time.time()
+            for i, text in enumerate(texts):
+                f.write(json.dumps({
+                    "arrival": now + i,
+                    "user": "synthetic",
+                    "audio_sha256": uuid.uuid4().hex,
+                    "reference_text": text,
+                    "queue_ms": 0,
+                    "duration_ms": service_ms,
+                    "error": None,
+                    "response": make_result(len(text.split()), seconds=5, seed=i),
+                }, ensure_ascii=False) + "\n")
+
+    os.makedirs(os.path.dirname(secrets_file), exist_ok=True)
+    with open(secrets_file, 'w', encoding='utf-8') as f:
+        f.write(f"""{SECRETS_MARKER}
+[Azure_Speech]
+SPEECH_KEY = "load-test"
+SPEECH_REGION = "local"
+MAX_REQUESTS_PER_SECOND = {rate}
+MAX_CONCURRENCY = {concurrency}
+
+[Recording]
+REPLAY_DIR = {json.dumps(os.path.abspath(captures))}
+
+[AzureGPT]
+AZURE_OPENAI_ENDPOINT = {json.dumps(llm_url)}
+AZURE_OPENAI_API_KEY = "load-test"
+""")
+
+class ServerProcess:
+    """A `streamlit run echo_app.py` process and samples of its CPU time and RSS."""
+    def __init__(self, root, port, log_path):
+        """Remember where and how to start the server."""
+        self.root = root
+        self.port = port
+        self.log_path = log_path
+        self.popen = None
+        self.process = None
+        self.peak_rss = 0
+        self._sampler = None
+
+    @property
+    def base_url(self):
+        """Return the http URL of the server."""
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, timeout=60):
+        """Start the server and wait until its health check answers."""
+        self.log = open(self.log_path, 'a', encoding='utf-8')
+        self.popen = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", app_script,
+             "--server.headless", "true",
+             "--server.port", str(self.port),
+             "--server.address", "127.0.0.1",
+             "--server.enableXsrfProtection", "false",
+             "--server.fileWatcherType", "none",
+             "--browser.gatherUsageStats", "false"],
+            cwd=self.root, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        self.process = psutil.Process(self.popen.pid)
+        client = AsyncHTTPClient()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.popen.poll() is not None:
+                raise RuntimeError(f"Streamlit exited with status {self.popen.returncode}, see {self.log_path}")
+            try:
+                await client.fetch(f"{self.base_url}/_stcore/health", request_timeout=2)
+                self._sampler = asyncio.ensure_future(self._sample())
+                return
+            except Exception:
+                await asyncio.sleep(0.5)
+        raise RuntimeError(f"Streamlit did not answer within {timeout} s, see {self.log_path}")
+
+    async def _sample(self, interval=0.25):
+        """Track the peak RSS while the server runs."""
+        while True:
+            try:
+                self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            except psutil.Error:
+                return
+            await asyncio.sleep(interval)
+
+    def cpu_seconds(self):
+        """Return the user + system CPU time the server has used so far."""
+        times = self.process.cpu_times()
+        return times.user + times.system
+
+    def rss(self):
+        """Return the current resident set size in bytes."""
+        return self.process.memory_info().rss
+
+    def stop(self):
+        """Terminate the server."""
+        if self._sampler:
+            self._sampler.cancel()
+        if self.popen and self.popen.poll() is None:
+            self.popen.terminate()
+            try:
+                self.popen.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.popen.kill()
+        self.log.close()
+
+class Learner:
+    """One simulated browser session speaking Streamlit's websocket protocol."""
+    def __init__(self, name, password, server, audio_bytes, attempts, think, seed):
+        """
+        Args:
+            name, password: login of the learner
+            server: ServerProcess to talk to
+            audio_bytes: WAV uploaded on every attempt
+            attempts: lesson attempts after logging in
+            think: mean seconds between actions
+            seed: random seed of the think times
+        """
+        self.name = name
+        self.password = password
+        self.server = server
+        self.audio_bytes = audio_bytes
+        self.attempts = attempts
+        self.think = think
+        self.rng = random.Random(seed)
+        self.timings = {action: [] for action in ACTIONS}
+        self.errors = []
+        self.ws = None
+        self.session_id = None
+        self.page_script_hash = ""
+        self.widgets = {}
+        self.tab_paths = {}
+        self.rendered = []
+        self.summary_charts = []
+
+    async def connect(self):
+        """Open the websocket like a browser tab does."""
+        url = self.server.base_url.replace("http", "ws", 1) + "/_stcore/stream"
+        self.ws = await websocket_connect(url, subprotocols=["streamlit"], max_message_size=256 * 1024 * 1024)
+
+    async def send(self, back_msg):
+        """Send one BackMsg."""
+        await self.ws.write_message(back_msg.SerializeToString(), binary=True)
+
+    async def receive(self):
+        """Return the next ForwardMsg, raising when the server closed the connection."""
+        data = await self.ws.read_message()
+        if data is None:
+            raise ConnectionError("websocket closed by the server")
+        msg = ForwardMsg()
+        msg.ParseFromString(data)
+        return msg
+
+    def handle(self, msg):
+        """Record what a rerun renders: widgets by label, tab blocks, elements and errors."""
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            self.session_id = msg.new_session.initialize.session_id
+            self.page_script_hash = msg.new_session.page_script_hash
+            self.widgets, self.tab_paths, self.rendered = {}, {}, []
+        elif kind == "delta":
+            path = tuple(msg.metadata.delta_path)
+            delta_kind = msg.delta.WhichOneof("type")
+            if delta_kind == "add_block" and msg.delta.add_block.WhichOneof("type") == "tab":
+                self.tab_paths[path] = msg.delta.add_block.tab.label
+            elif delta_kind == "new_element":
+                element = msg.delta.new_element
+                element_kind = element.WhichOneof("type")
+                urls = [img.url for img in element.imgs.imgs] if element_kind == "imgs" else []
+                self.rendered.append((path, element_kind, urls))
+                if element_kind in ("button", "text_input", "audio_input"):
+                    widget = getattr(element, element_kind)
+                    self.widgets[(element_kind, widget.label)] = widget
+                elif element_kind == "exception":
+                    self.errors.append(f"{element.exception.type}: {element.exception.message}")
+                elif element_kind == "alert" and element.alert.format == element.alert.ERROR:
+                    self.errors.append(element.alert.body)
+
+    async def rerun(self, action, widget_states=()):
+        """Request a rerun and time it until the script finishes on its final page."""
+        start = time.perf_counter()
+        await self.send(BackMsg(rerun_script=ClientState(
+            query_string="",
+            widget_states=WidgetStates(widgets=list(widget_states)),
+            page_script_hash=self.page_script_hash,
+        )))
+        while True:
+            msg = await self.receive()
+            self.handle(msg)
+            # st.switch_page ends the run early and starts the target page
+            if msg.WhichOneof("type") == "script_finished" and \
+                    msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.timings[action].append(time.perf_counter() - start)
+
+    def widget(self, kind, label):
+        """Return the widget rendered in the last run with this type and label."""
+        widget = self.widgets.get((kind, label))
+        if widget is None:
+            raise LookupError(f"no {kind} labelled {label!r} on the page")
+        return widget
+
+    async def upload_audio(self):
+        """Upload the recording the way st.audio_input does and return its widget value."""
+        request_id = uuid.uuid4().hex
+        await self.send(BackMsg(file_urls_request=FileURLsRequest(
+            request_id=request_id, file_names=["recording.wav"], session_id=self.session_id,
+        )))
+        while True:
+            msg = await self.receive()
+            if msg.WhichOneof("type") == "file_urls_response" and msg.file_urls_response.response_id == request_id:
+                break
+            self.handle(msg)
+        file_urls = msg.file_urls_response.file_urls[0]
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="recording.wav"\r\n'
+            f"Content-Type: audio/wav\r\n\r\n"
+        ).encode() + self.audio_bytes + f"\r\n--{boundary}--\r\n".encode()
+        upload_url = file_urls.upload_url
+        if upload_url.startswith("/"):
+            upload_url = self.server.base_url + upload_url
+        await AsyncHTTPClient().fetch(HTTPRequest(
+            upload_url, method="PUT", body=body,
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        ))
+        return FileUploaderState(uploaded_file_info=[UploadedFileInfo(
+            file_id=file_urls.file_id, name="recording.wav", size=len(self.audio_bytes), file_urls=file_urls,
+        )])
+
+    async def open_summary(self):
+        """Show the summary tab: count its charts and fetch the media it references."""
+        # tabs switch in the browser; the summary was already rendered by the last rerun
+        summary_paths = [path for path, label in self.tab_paths.items() if label == "まとめ"]
+        in_summary = [(kind, urls) for path, kind, urls in self.rendered
+                      if any(path[:len(prefix)] == prefix for prefix in summary_paths)]
+        self.summary_charts.append(sum(1 for kind, _ in in_summary if kind in ("vega_lite_chart", "imgs")))
+        start = time.perf_counter()
+        client = AsyncHTTPClient()
+        await asyncio.gather(*(client.fetch(self.server.base_url + url if url.startswith("/") else url)
+                               for _, urls in in_summary for url in urls))
+        self.timings["summary"].append(time.perf_counter() - start)
+
+    async def pause(self):
+        """Wait a think time between 0.5 and 1.5 times --think."""
+        if self.think:
+            await asyncio.sleep(self.think * self.rng.uniform(0.5, 1.5))
+
+    async def run(self):
+        """Play the whole scenario; errors are recorded, not raised."""
+        try:
+            await self.connect()
+            await self.rerun("open")
+            await self.pause()
+            await self.rerun("login", [
+                WidgetState(id=self.widget("text_input", "ユーザー名").id, string_value=self.name),
+                WidgetState(id=self.widget("text_input", "パスワード").id, string_value=self.password),
+                WidgetState(id=self.widget("button", "ログイン").id, trigger_value=True),
+            ])
+            for _ in range(self.attempts):
+                await self.pause()
+                forward = self.widgets.get(("button", "次 ▶"))
+                button = forward if forward is not None and not forward.disabled else self.widget("button", "◀ 前")
+                await self.rerun("navigate", [WidgetState(id=button.id, trigger_value=True)])
+                await self.pause()
+                recording = await self.upload_audio()
+                await self.rerun("submit", [
+                    WidgetState(id=self.widget("audio_input", self.audio_label()).id,
+                                file_uploader_state_value=recording),
+                    WidgetState(id=self.widget("button", "学習開始！").id, trigger_value=True),
+                ])
+                await self.pause()
+                await self.open_summary()
+        except Exception as e:
+            self.errors.append(f"{type(e).__name__}: {e}")
+        finally:
+            if self.ws is not None:
+                self.ws.close()
+
+    def audio_label(self):
+        """Return the label of the page's audio input."""
+        for kind, label in self.widgets:
+            if kind == "audio_input":
+                return label
+        raise LookupError("no audio input on the page")
+
+async def run_step(args, root, n_learners, names, audio_bytes):
+    """Start a fresh server, warm it up, run n_learners concurrently and return the step's results."""
+    server = ServerProcess(root, free_port(), os.path.join(root, "streamlit.log"))
+    await server.start()
+    try:
+        warmup = Learner(names[0], args.password, server, audio_bytes, 1, 0, seed=-1)
+        await warmup.run()
+        if warmup.errors:
+            print(f"warm-up errors: {warmup.errors[:3]}")
+        await asyncio.sleep(1)
+
+        baseline_rss = server.rss()
+        server.peak_rss = baseline_rss
+        cpu_start = server.cpu_seconds()
+        start = time.perf_counter()
+        learners = [
+            Learner(names[i + 1], args.password, server, audio_bytes, args.attempts, args.think, seed=i)
+            for i in range(n_learners)
+        ]
+
+        async def staggered(i, learner):
+            """Spread the arrivals over --ramp seconds."""
+            await asyncio.sleep(args.ramp * i / max(1, n_learners))
+            await learner.run()
+
+        await asyncio.gather(*(staggered(i, learner) for i, learner in enumerate(learners)))
+        wall = time.perf_counter() - start
+        cpu = server.cpu_seconds() - cpu_start
+        end_rss = server.rss()
+    finally:
+        server.stop()
+
+    timings = {action: [t for learner in learners for t in learner.timings[action]] for action in ACTIONS}
+    reruns = [t for action in ("open", "login", "navigate", "submit") for t in timings[action]]
+    errors = [e for learner in learners for e in learner.errors]
+    rerun_summary = summarize(reruns)
+    summary_charts = [n for learner in learners for n in learner.summary_charts]
+    return {
+        "learners": n_learners,
+        "wall_seconds": round(wall, 2),
+        "reruns": rerun_summary,
+        "actions": {action: summarize(values) for action, values in timings.items()},
+        "summary_charts_mean": round(statistics.mean(summary_charts), 1) if summary_charts else 0,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "server": {
+            "cpu_seconds": round(cpu, 2),
+            "cpu_cores_used": round(cpu / wall, 2) if wall else None,
+            "cpu_seconds_per_session": round(cpu / n_learners, 3),
+            "cpu_ms_per_rerun": round(cpu / len(reruns) * 1000, 1) if reruns else None,
+            "baseline_rss_mb": round(baseline_rss / 2**20, 1),
+            "peak_rss_mb": round(server.peak_rss / 2**20, 1),
+            "end_rss_mb": round(end_rss / 2**20, 1),
+            "rss_mb_per_session": round((server.peak_rss - baseline_rss) / 2**20 / n_learners, 2),
+        },
+        "within_slo": bool(reruns) and not errors and rerun_summary["p95_ms"] <= args.slo_ms,
+    }
+
+async def run_sweep(args, root, steps, names, audio_bytes):
+    """Run every step of the sweep, printing a line per step."""
+    results = []
+    for n_learners in steps:
+        step = await run_step(args, root, n_learners, names, audio_bytes)
+        results.append(step)
+        server = step["server"]
+        print(f"{n_learners:4d} learners: rerun p50 {step['reruns'].get('p50_ms')} ms, "
+              f"p95 {step['reruns'].get('p95_ms')} ms, p99 {step['reruns'].get('p99_ms')} ms | "
+              f"CPU {server['cpu_seconds_per_session']} s/session, {server['cpu_cores_used']} cores | "
+              f"RSS {server['rss_mb_per_session']} MB/session (peak {server['peak_rss_mb']} MB) | "
+              f"errors {step['errors']}{'' if step['within_slo'] else ' | over SLO'}")
+    return results
+
+def main():
+    """Parse command line arguments, prepare the scratch folder and run the sweep."""
+    parser = argparse.ArgumentParser(description="Concurrent-learner load generator for the Streamlit app")
+    parser.add_argument("--learners", default="1,5,10", help="comma-separated concurrent learners per step")
+    parser.add_argument("--attempts", type=int, default=3, help="lesson attempts per learner")
+    parser.add_argument("--think", type=float, default=2.0, help="mean seconds between a learner's actions")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which the learners of a step arrive")
+    parser.add_argument("--lessons", type=int, default=2,
+                        help="lessons per learner (the learning page links questionnaires for two)")
+    parser.add_argument("--audio-seconds", type=float, default=5.0, help="length of the uploaded recording")
+    parser.add_argument("--service-ms", type=float, default=1500, help="mock assessment service time")
+    parser.add_argument("--captures", help="replay these captures instead of synthetic ones")
+    parser.add_argument("--rate", type=float, default=20.0, help="assessment requests per second (scheduler)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent assessments (scheduler)")
+    parser.add_argument("--llm-first-token-delay", type=float, default=0.5, help="fake LLM time to first token")
+    parser.add_argument("--slo-ms", type=float, default=3000, help="p95 rerun latency a step must stay within")
+    parser.add_argument("--root", help="scratch folder the server runs in (default: a new temp folder)")
+    parser.add_argument("--password", default="load-test", help="password of the simulated learners")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    steps = [int(n) for n in args.learners.split(",")]
+    output_file = os.path.abspath(args.output) if args.output else None
+    root = os.path.abspath(args.root or tempfile.mkdtemp(prefix="echo_load_"))
+    # learner 0 is the warm-up session of every step
+    names = [f"load_{i:04d}" for i in range(max(steps) + 1)]
+
+    llm_server = FakeLLMServer(FakeLLMConfig(args.llm_first_token_delay)).start()
+    try:
+        prepare_load_root(root, names, args.password, args.lessons, args.service_ms, args.captures,
+                          llm_server.url, args.rate, args.concurrency)
+        audio_path = make_wav(os.path.join(root, "recording.wav"), args.audio_seconds)
+        with open(audio_path, 'rb') as f:
+            audio_bytes = f.read()
+        print(f"Running in {root}")
+        steps_results = asyncio.run(run_sweep(args, root, steps, names, audio_bytes))
+    finally:
+        llm_server.stop()
+
+    within = [step["learners"] for step in steps_results if step["within_slo"]]
+    results = {
+        "settings": {key: value for key, value in vars(args).items() if key != "password"},
+        "steps": steps_results,
+        "max_learners_within_slo": max(within) if within else 0,
+    }
+    print(f"Largest step within p95 {args.slo_ms:.0f} ms and without errors: {results['max_learners_within_slo']} learners")
+    if output_file:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+        print(f"Results written to {output_file}")
+
+if __name__ == "__main__":
+    main()
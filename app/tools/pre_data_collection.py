@@ -1,8 +1,13 @@
 import streamlit as st
 from PIL import Image
 import os
+import sys
 from datetime import datetime
 
+# Ensure the app directory is in the Python path
+sys.path.append(os.path.abspath("app"))
+import object_store
+
 def save_audio_file(base_dir, audio_data, sentence_num):
     """Persist recorded audio bytes to a timestamped WAV file."""
     try:
@@ -15,9 +20,8 @@ def save_audio_file(base_dir, audio_data, sentence_num):
         filename = f"sentence{sentence_num}_{timestamp}.wav"
         file_path = os.path.join(base_dir, filename)
         
-        # Save audio data - use getvalue() to get the bytes
-        with open(file_path, "wb") as f:
-            f.write(audio_data.getvalue())
+        # Save audio data - use getvalue() to get the bytes; uploaded in the background
+        object_store.persist(file_path, audio_data.getvalue())
             
         return file_path
     except Exception as e:
@@ -71,7 +75,7 @@ if photo:
 
     if not user_data["photo_saved"] and user_data["base_dir"]:
         photo_path = os.path.join(user_data["base_dir"], f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{photo.name.split('.')[-1]}")
-        image.save(photo_path)
+        object_store.persist(photo_path, object_store.image_bytes(image, photo_path))
         user_data["photo_saved"] = True
         st.success("写真が保存されました！")
     elif user_data["photo_saved"]:
@@ -0,0 +1,247 @@
+"""
+Offline bulk re-assessment of stored recordings.
+
+Re-runs Azure pronunciation assessment over every WAV under
+database/<user>/practice_history/<date>/, e.g. after turning prosody or
+miscue detection on or off, without replaying anything by hand.
+
+Usage (from the repository root):
+    python app/tools/reassess.py --workers 4 --rate 0.3
+    python app/tools/reassess.py --users alice bob --no-prosody --run no_prosody
+
+Results are written in the User.save_pron_history format (one JSON per
+attempt, named like the recording) to
+database/<user>/reassessed/<run>/<date>/<lesson>-<timestamp>.json, so the
+live history and everything derived from it stay untouched.
+
+    - an AssessmentScheduler at BATCH priority bounds the requests in
+      flight (--workers) and takes a token from its bucket for every
+      Speech call, retries included (--rate)
+    - a checkpoint per run records finished recordings, so an interrupted
+      run resumes where it stopped
+    - results are cached by recording content, reference text and options,
+      so a recording is never sent twice with the same settings
+"""
+import os
+import sys
+import json
+import glob
+import hashlib
+import argparse
+import threading
+from concurrent.futures import as_completed
+
+# Ensure the app directory is in the Python path
+sys.path.append(os.path.abspath("app"))
+import warehouse
+from dataset import Dataset
+from assessment_scheduler import AssessmentScheduler, BATCH
+
+database_path = "database/"
+cache_path = "database/assessment_cache/"
+checkpoint_path = "database/reassess_checkpoints/"
+
+def default_options():
+    """Return the assessment options used by the learning page."""
+    import assessment
+    return dict(assessment.DEFAULT_OPTIONS)
+
+def options_hash(options):
+    """Return a short stable hash of the assessment options."""
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def lesson_texts(user_name):
+    """Map lesson selections ("レッスンN") to their reference text, as the learning page does."""
+    dataset = Dataset(user_name)
+    dataset.load_data()
+    texts = {}
+    for i, text_file in enumerate(dataset.text_data):
+        with open(dataset.path + text_file, 'r', encoding='utf-8') as f:
+            texts[f"レッスン{i + 1}"] = f.read()
+    return texts
+
+def find_recordings(user_name):
+    """Yield (date, wav path, lesson) for every recording of a user."""
+    history = os.path.join(database_path, user_name, "practice_history")
+    for wav_path in sorted(glob.glob(os.path.join(history, "*", "*.wav"))):
+        date = os.path.basename(os.path.dirname(wav_path))
+        _, lesson, _ = warehouse.parse_attempt_name(wav_path)
+        yield date, wav_path, lesson
+
+def output_file(user_name, run, date, wav_path):
+    """Return where the re-assessed result of a recording is written."""
+    stem = os.path.splitext(os.path.basename(wav_path))[0]
+    return os.path.join(database_path, user_name, "reassessed", run, date, f"{stem}.json")
+
+def _write_json(path, data):
+    """Write JSON atomically, creating the parent folder."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+class ResultCache:
+    """Assessment results on disk, keyed by recording content, reference text and options."""
+    def __init__(self, path=cache_path):
+        """Create the cache folder if needed."""
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, wav_path, reference_text, options):
+        """Return the cache key of one assessment request."""
+        digest = hashlib.sha256()
+        with open(wav_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        digest.update(reference_text.encode("utf-8"))
+        digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached result or None."""
+        file_path = os.path.join(self.path, f"{key}.json")
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def put(self, key, result):
+        """Store a result."""
+        _write_json(os.path.join(self.path, f"{key}.json"), result)
+
+class Checkpoint:
+    """Finished and failed recordings of one run, saved after every update."""
+    def __init__(self, run, options, restart=False):
+        """Load the checkpoint of run unless restarting."""
+        self.file_path = os.path.join(checkpoint_path, f"{run}.json")
+        self.state = {"options": options, "done": {}, "failed": {}}
+        if not restart and os.path.exists(self.file_path):
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get("options") == options:
+                self.state = saved
+            else:
+                print(f"Options changed since the last run of {run}, starting over")
+        self._lock = threading.Lock()
+
+    def is_done(self, wav_path):
+        """Return whether a recording was already re-assessed in this run."""
+        return wav_path in self.state["done"]
+
+    def mark(self, wav_path, output_path=None, error=None):
+        """Record a finished (or failed) recording and save the checkpoint."""
+        with self._lock:
+            if error is None:
+                self.state["done"][wav_path] = output_path
+                self.state["failed"].pop(wav_path, None)
+            else:
+                self.state["failed"][wav_path] = error
+            _write_json(self.file_path, self.state)
+
+def reassess_one(assess_fn, bucket, cache, wav_path, reference_text, options, output_path):
+    """Worker: re-assess one recording (from the cache if possible) and write the result."""
+    key = cache.key(wav_path, reference_text, options)
+    result = cache.get(key)
+    cached = result is not None
+    if not cached:
+        result = assess_fn(wav_path, reference_text, bucket)
+        cache.put(key, result)
+    _write_json(output_path, result)
+    return cached
+
+def reassess(users, assess_fn, options, run, workers=4, rate=0.3, restart=False):
+    """
+    Re-assess the recordings of users.
+
+    Args:
+        users: user names to process
+        assess_fn: callable (wav_path, reference_text, bucket) -> result dict, taking
+            a token from bucket before every Speech call
+        options: assessment options, part of the cache key and checkpoint
+        run: name of the output folder and checkpoint
+        workers: maximum requests in flight
+        rate: maximum requests per second across all workers
+        restart: ignore the checkpoint of a previous run
+
+    Returns:
+        dict of counters (assessed, cached, skipped, no_reference, failed)
+    """
+    checkpoint = Checkpoint(run, options, restart)
+    scheduler = AssessmentScheduler(rate, concurrency=workers)
+    cache = ResultCache()
+    counts = {"assessed": 0, "cached": 0, "skipped": 0, "no_reference": 0, "failed": 0}
+
+    jobs = []
+    for user_name in users:
+        texts = lesson_texts(user_name)
+        for date, wav_path, lesson in find_recordings(user_name):
+            if checkpoint.is_done(wav_path):
+                counts["skipped"] += 1
+                continue
+            # drill recordings have no lesson text to assess against
+            if lesson not in texts:
+                counts["no_reference"] += 1
+                continue
+            jobs.append((user_name, wav_path, texts[lesson], output_file(user_name, run, date, wav_path)))
+    print(f"{len(jobs)} recordings to re-assess, {counts['skipped']} already done")
+
+    tickets = {
+        scheduler.submit(user_name, reassess_one, assess_fn, scheduler.bucket, cache, wav_path, text, options,
+                         output_path, priority=BATCH):
+            (wav_path, output_path)
+        for user_name, wav_path, text, output_path in jobs
+    }
+    for ticket in as_completed(tickets):
+        wav_path, output_path = tickets[ticket]
+        try:
+            cached = ticket.result()
+        except Exception as e:
+            print(f"Failed to re-assess {wav_path}: {e}")
+            checkpoint.mark(wav_path, error=str(e))
+            counts["failed"] += 1
+            continue
+        checkpoint.mark(wav_path, output_path)
+        counts["cached" if cached else "assessed"] += 1
+    return counts
+
+def main():
+    """Parse command line arguments and re-assess the stored recordings."""
+    parser = argparse.ArgumentParser(description="Re-assess stored recordings with Azure Speech")
+    parser.add_argument("--users", nargs="*", help="only re-assess these users")
+    parser.add_argument("--workers", type=int, default=4, help="maximum requests in flight")
+    parser.add_argument("--rate", type=float, default=0.3, help="maximum requests per second")
+    parser.add_argument("--run", help="output folder name (defaults to a hash of the options)")
+    parser.add_argument("--no-prosody", action="store_true", help="disable prosody assessment")
+    parser.add_argument("--no-miscue", action="store_true", help="disable miscue detection")
+    parser.add_argument("--granularity", choices=["Phoneme", "Word", "FullText"], default="Phoneme")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of this run")
+    args = parser.parse_args()
+
+    import assessment
+    import streamlit as st
+    options = default_options()
+    options.update({
+        "enable_prosody": not args.no_prosody,
+        "enable_miscue": not args.no_miscue,
+        "granularity": args.granularity,
+    })
+    # transient Speech errors are retried with backoff before a recording counts as failed
+    assessor = assessment.ResilientAssessor(assessment.SpeechBackend(
+        "primary",
+        st.secrets["Azure_Speech"]["SPEECH_KEY"],
+        st.secrets["Azure_Speech"]["SPEECH_REGION"],
+        options["language"],
+    ))
+
+    def assess_fn(wav_path, reference_text, bucket):
+        """Assess one recording with the shared speech config, within the --rate quota."""
+        return assessor.assess(wav_path, reference_text, options, bucket=bucket)
+
+    run = args.run or options_hash(options)
+    users = args.users or warehouse.list_users()
+    counts = reassess(users, assess_fn, options, run, args.workers, args.rate, args.restart)
+    print(json.dumps({"run": run, **counts}, indent=4))
+
+if __name__ == "__main__":
+    main()
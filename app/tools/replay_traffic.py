@@ -0,0 +1,160 @@
+"""
+Replay captured assessment traffic as a repeatable load test.
+
+Reads the captures written by traffic_replay.TrafficRecorder, re-issues the
+requests at their original arrival times (compressed by --speed) through an
+AssessmentScheduler, and answers them from a MockBackend with the recorded
+(or scaled) service time. With --pipeline every answer also goes through
+the in-memory part of what a save does: warehouse flattening, the weak-word
+index, phoneme statistics and the drill queue.
+
+Usage (from the repository root):
+    python app/tools/replay_traffic.py --captures database/recordings --speed 4
+    python app/tools/replay_traffic.py --speed 10 --latency-scale 0.5 --rate 5 --concurrency 2 --pipeline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime
+
+# Ensure the app directory is in the Python path
+sys.path.append(os.path.abspath("app"))
+import warehouse
+import weak_index
+import phoneme_stats
+import drill_queue
+from traffic_replay import MockBackend, load_captures, recordings_path
+from assessment_scheduler import AssessmentScheduler, DEFAULT_RATE, DEFAULT_CONCURRENCY
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of values by nearest rank."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(values):
+    """Return count/mean/p50/p95/max of a list of milliseconds."""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), 2),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "max": round(max(values), 2),
+    }
+
+class Pipeline:
+    """In-memory downstream processing of assessment results, per user."""
+    def __init__(self):
+        """Start with empty per-user state."""
+        self.indexes = {}
+        self.stats = {}
+        self.queues = {}
+
+    def process(self, user_name, capture, result):
+        """Run one result through flattening, the weak index, phoneme stats and the drill queue."""
+        timestamp = datetime.fromtimestamp(capture["arrival"])
+        warehouse.flatten_attempt(capture["audio_sha256"][:16], None, timestamp, result)
+        index = self.indexes.setdefault(user_name, weak_index.empty_index())
+        weak_index.add_attempt(index, result)
+        stats = self.stats.setdefault(user_name, phoneme_stats.empty_stats())
+        phoneme_stats.accumulate(stats, *phoneme_stats.extract_phonemes(result))
+        queue = self.queues.setdefault(user_name, drill_queue.WeaknessQueue(user_name))
+        queue.update_from_result(result)
+
+def run(captures, speed=1.0, latency_scale=1.0, rate=DEFAULT_RATE, concurrency=DEFAULT_CONCURRENCY,
+        pipeline=False):
+    """
+    Replay captures and return a summary dict.
+
+    Args:
+        captures: capture dicts ordered by arrival
+        speed: arrival-time compression (2 replays twice as fast as recorded)
+        latency_scale: multiplier of the recorded service time
+        rate: scheduler requests per second
+        concurrency: scheduler worker threads
+        pipeline: also run the in-memory downstream processing
+    """
+    backend = MockBackend(captures, latency_scale)
+    scheduler = AssessmentScheduler(rate, concurrency)
+    downstream = Pipeline() if pipeline else None
+
+    def handle(capture, submitted):
+        """Scheduler job: answer one request and time its stages."""
+        # one recorded request is one Speech call, so it takes one token (counted as queue time)
+        scheduler.bucket.acquire()
+        started = time.perf_counter()
+        timings = {"queue_ms": (started - submitted) * 1000}
+        try:
+            result = backend.replay(capture)
+        finally:
+            timings["service_ms"] = (time.perf_counter() - started) * 1000
+        if downstream is not None:
+            pipeline_start = time.perf_counter()
+            downstream.process(capture["user"], capture, result)
+            timings["pipeline_ms"] = (time.perf_counter() - pipeline_start) * 1000
+        timings["total_ms"] = (time.perf_counter() - submitted) * 1000
+        return timings
+
+    start = time.perf_counter()
+    first_arrival = captures[0]["arrival"]
+    tickets = []
+    for capture in captures:
+        # keep the recorded inter-arrival gaps, compressed by speed
+        delay = (capture["arrival"] - first_arrival) / speed - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        tickets.append(scheduler.submit(capture["user"], handle, capture, time.perf_counter()))
+
+    timings = {"queue_ms": [], "service_ms": [], "pipeline_ms": [], "total_ms": []}
+    errors = {}
+    for ticket in tickets:
+        try:
+            for key, value in ticket.result().items():
+                timings[key].append(value)
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    recorded_span = captures[-1]["arrival"] - first_arrival
+    return {
+        "requests": len(captures),
+        "users": len({c["user"] for c in captures}),
+        "recorded_seconds": round(recorded_span, 2),
+        "replay_seconds": round(elapsed, 2),
+        "throughput_per_second": round(len(captures) / elapsed, 2) if elapsed else None,
+        "errors": errors,
+        "recorded_service_ms": summarize([c["duration_ms"] for c in captures]),
+        **{key: summarize(values) for key, values in timings.items() if values},
+    }
+
+def main():
+    """Parse command line arguments, replay the captures and print JSON results."""
+    parser = argparse.ArgumentParser(description="Replay captured assessment traffic")
+    parser.add_argument("--captures", default=recordings_path, help="capture folder or .jsonl file")
+    parser.add_argument("--speed", type=float, default=1.0, help="arrival-time compression factor")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier of the recorded service time")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="scheduler requests per second")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="scheduler worker threads")
+    parser.add_argument("--limit", type=int, help="only replay the first N captures")
+    parser.add_argument("--pipeline", action="store_true", help="also run the in-memory save pipeline")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    captures = load_captures(args.captures)[:args.limit]
+    if not captures:
+        print(f"No captures found in {args.captures}")
+        return
+    results = run(captures, args.speed, args.latency_scale, args.rate, args.concurrency, args.pipeline)
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
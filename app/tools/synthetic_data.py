@@ -0,0 +1,89 @@
+"""
+Synthetic assessment results and recordings for benchmarks.
+
+make_result() builds an Azure pronunciation assessment JSON with the same
+structure the app saves (NBest -> Words -> Phonemes, offsets in 100ns
+ticks), with reproducible random scores and error types. make_wav() writes
+a mono 16 kHz speech-like WAV of a given length.
+"""
+import random
+import numpy as np
+import soundfile as sf
+
+TICKS_PER_SECOND = 10000000
+ERROR_TYPES = ["None"] * 8 + ["Mispronunciation", "Omission", "Insertion", "UnexpectedBreak", "MissingBreak", "Monotone"]
+WORDS = ["the", "galaxy", "spiral", "through", "telescope", "whirlpool", "bright", "distant",
+         "stars", "orbit", "around", "center", "light", "years", "away", "from", "earth"]
+PHONEMES = ["ð", "ə", "ɡ", "æ", "l", "k", "s", "i", "p", "aɪ", "r", "θ", "u", "t", "ɛ", "o", "w", "ɝ", "b", "n"]
+
+def _score(rng):
+    """Return a plausible accuracy score, mostly good with a tail of weak ones."""
+    return round(min(100.0, max(0.0, rng.gauss(82, 15))), 1)
+
+def make_result(n_words, seconds=None, seed=0):
+    """
+    Build a synthetic pronunciation assessment result.
+
+    Args:
+        n_words: number of words in NBest[0].Words
+        seconds: length of the recording the offsets span (defaults to 0.4 s per word)
+        seed: random seed, the same arguments always give the same result
+    """
+    rng = random.Random(seed)
+    seconds = seconds or n_words * 0.4
+    word_ticks = int(seconds * TICKS_PER_SECOND / n_words)
+    words = []
+    for i in range(n_words):
+        word_text = WORDS[rng.randrange(len(WORDS))]
+        n_phonemes = rng.randint(2, 5)
+        phoneme_ticks = word_ticks // n_phonemes
+        phonemes = [
+            {
+                "Phoneme": PHONEMES[rng.randrange(len(PHONEMES))],
+                "PronunciationAssessment": {"AccuracyScore": _score(rng)},
+                "Offset": i * word_ticks + j * phoneme_ticks,
+                "Duration": phoneme_ticks,
+            }
+            for j in range(n_phonemes)
+        ]
+        words.append({
+            "Word": word_text,
+            "Offset": i * word_ticks,
+            "Duration": word_ticks,
+            "PronunciationAssessment": {
+                "AccuracyScore": _score(rng),
+                "ErrorType": ERROR_TYPES[rng.randrange(len(ERROR_TYPES))],
+            },
+            "Phonemes": phonemes,
+        })
+    text = " ".join(word["Word"] for word in words)
+    return {
+        "RecognitionStatus": "Success",
+        "Offset": 0,
+        "Duration": int(seconds * TICKS_PER_SECOND),
+        "DisplayText": text,
+        "NBest": [{
+            "Confidence": 0.95,
+            "Lexical": text,
+            "Display": text,
+            "PronunciationAssessment": {
+                "AccuracyScore": _score(rng),
+                "FluencyScore": _score(rng),
+                "CompletenessScore": _score(rng),
+                "ProsodyScore": _score(rng),
+                "PronScore": _score(rng),
+            },
+            "Words": words,
+        }],
+    }
+
+def make_wav(path, seconds, sample_rate=16000, seed=0):
+    """Write a mono PCM_16 WAV of amplitude-modulated tones, roughly shaped like speech."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    # syllable-rate envelope over a few formant-like tones plus a little noise
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+    signal = sum(np.sin(2 * np.pi * f * t) for f in (180, 720, 1240)) / 3
+    audio = 0.3 * envelope * signal + 0.01 * rng.standard_normal(len(t))
+    sf.write(path, audio.astype(np.float32), sample_rate, format="WAV", subtype="PCM_16")
+    return path
@@ -0,0 +1,206 @@
+"""
+Generate a synthetic database/ tree at scale.
+
+Writes the same layout the app does for every user:
+
+    database/all_users/users_info.json
+    database/<user>/practice_history/<YYYY-MM-DD>/<lesson>-<YYYY-mm-dd_HH-MM-SS>.json
+    database/<user>/practice_history/<YYYY-MM-DD>/<lesson>-<YYYY-mm-dd_HH-MM-SS>.wav  (with --audio-seconds)
+    database/<user>/practice_history/<YYYY-MM-DD>/scores/lesson_scores.json
+    database/<user>/practice_history/<YYYY-MM-DD>/scores/error_history.json
+
+User activity is heavy-tailed like real cohorts: most users practice on a
+few days, a few practice almost daily with long sessions. Attempt JSONs come
+from synthetic_data.make_result; the score and error files hold what
+store_scores would have accumulated over the day. Every generated user can
+log in with --password.
+
+Usage (from the repository root):
+    python app/tools/synthetic_history.py --root /tmp/echo_scale --users 2000 --days 120 --workers 8
+    python app/tools/synthetic_history.py --root /tmp/echo_small --users 50 --days 30 --audio-seconds 1
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+# Ensure the app, learn and tools directories are in the Python path
+sys.path.append(os.path.abspath("app"))
+sys.path.append(os.path.abspath("app/learn"))
+sys.path.append(os.path.abspath("app/tools"))
+from synthetic_data import make_result, make_wav
+
+SCORE_FIELDS = ['AccuracyScore', 'FluencyScore', 'CompletenessScore', 'ProsodyScore', 'PronScore']
+
+# sessions start in the morning; later attempts follow every 20 s to 2 min
+DAY_START = 8 * 3600
+
+def lesson_name(lesson_index):
+    """Return the selection name the learning page saves attempts under."""
+    return f"レッスン{lesson_index + 1}"
+
+def user_profile(rng, mean_attempts):
+    """Return (fraction of days practiced, mean attempts per practice day) of one user."""
+    # Pareto-distributed engagement: a long tail of near-daily learners
+    active_fraction = min(1.0, 0.05 * rng.paretovariate(1.2))
+    intensity = max(1.0, rng.lognormvariate(math.log(mean_attempts), 0.8))
+    return active_fraction, intensity
+
+def generate_user(user_name, start_date, days, lessons, words, mean_attempts, seed, audio_template=None):
+    """
+    Write the practice history of one user and return its counts.
+
+    Args:
+        user_name: folder name under database/
+        start_date: first day of the history
+        days: number of days the history spans
+        lessons: number of lessons attempts are spread over
+        words: mean number of words per attempt
+        mean_attempts: mean attempts per practice day across users
+        seed: random seed of this user
+        audio_template: WAV file linked next to every attempt, or None
+    """
+    from echo_learning import collect_errors
+
+    rng = random.Random(seed)
+    active_fraction, intensity = user_profile(rng, mean_attempts)
+    history_path = os.path.join("database", user_name, "practice_history")
+    os.makedirs(history_path, exist_ok=True)
+    counts = {"days": 0, "attempts": 0, "bytes": 0}
+
+    # learners move through the lessons over the months
+    current_lesson = 0
+    for day_offset in range(days):
+        if rng.random() >= active_fraction:
+            continue
+        day = start_date + timedelta(days=day_offset)
+        day_path = os.path.join(history_path, str(day))
+        os.makedirs(os.path.join(day_path, "scores"), exist_ok=True)
+        n_attempts = 1 + int(rng.expovariate(1 / intensity))
+        spacing = min(rng.randint(20, 120), max(1, (86400 - DAY_START) // n_attempts))
+        timestamp = datetime.combine(day, datetime.min.time()) + timedelta(seconds=DAY_START)
+
+        scores_history = {}
+        total_errors = {}
+        current_errors = {}
+        for _ in range(n_attempts):
+            if rng.random() < 0.05:
+                current_lesson = min(lessons - 1, current_lesson + 1)
+            lesson_index = current_lesson if rng.random() < 0.8 else rng.randrange(lessons)
+            n_words = max(1, int(rng.gauss(words, words / 4)))
+            result = make_result(n_words, seed=rng.getrandbits(32))
+            stem = f"{lesson_name(lesson_index)}-{timestamp.strftime('%Y-%m-%d_%H-%M-%S')}"
+            file_path = os.path.join(day_path, f"{stem}.json")
+            with open(file_path, 'w') as f:
+                json.dump(result, f, indent=4)
+            counts["bytes"] += os.path.getsize(file_path)
+            if audio_template:
+                wav_path = os.path.join(day_path, f"{stem}.wav")
+                try:
+                    os.link(audio_template, wav_path)
+                except OSError:
+                    shutil.copyfile(audio_template, wav_path)
+
+            # what store_scores accumulates in the session over the day
+            scores = result["NBest"][0]["PronunciationAssessment"]
+            lesson_scores = scores_history.setdefault(lesson_index, {field: [] for field in SCORE_FIELDS})
+            for field in SCORE_FIELDS:
+                lesson_scores[field].append(scores[field])
+            error_data = collect_errors(result)
+            current_errors[lesson_index] = error_data
+            lesson_errors = total_errors.setdefault(lesson_index, {})
+            for error_type, data in error_data.items():
+                entry = lesson_errors.setdefault(error_type, {'count': 0, 'words': []})
+                entry['count'] += data['count']
+                entry['words'].extend(data['words'])
+
+            counts["attempts"] += 1
+            timestamp += timedelta(seconds=spacing)
+
+        with open(os.path.join(day_path, "scores", "lesson_scores.json"), 'w', encoding='utf-8') as f:
+            json.dump({f"lesson_{i}": s for i, s in scores_history.items()}, f, indent=4)
+        with open(os.path.join(day_path, "scores", "error_history.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                f"lesson_{i}": {'current': current_errors[i], 'total': total_errors[i]}
+                for i in total_errors
+            }, f, indent=4, ensure_ascii=False)
+        counts["days"] += 1
+    return counts
+
+def prepare_root(root, user_names, password):
+    """Create root/database with users_info.json and switch to root, like running the app there."""
+    info_folder = os.path.join(root, "database", "all_users")
+    os.makedirs(info_folder, exist_ok=True)
+    info_path = os.path.join(info_folder, "users_info.json")
+    if not os.path.exists(info_path):
+        with open(info_path, 'w') as f:
+            json.dump({}, f)
+    os.chdir(root)
+
+    from user import User
+    user_info = User.user_info
+    # one bcrypt hash shared by every synthetic user keeps generation fast
+    hashed = User.hash_password(password)
+    for name in user_names:
+        user_info[name] = {"password": hashed, "history": []}
+    with open(User.user_info_path, 'w') as f:
+        json.dump(user_info, f, indent=4)
+
+def main():
+    """Parse command line arguments and generate the tree."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic database/ tree at scale")
+    parser.add_argument("--root", required=True, help="folder the database/ tree is created in")
+    parser.add_argument("--users", type=int, default=1000, help="number of users")
+    parser.add_argument("--days", type=int, default=90, help="days of practice history")
+    parser.add_argument("--end-date", default=str(date.today()), help="last day of the history (YYYY-MM-DD)")
+    parser.add_argument("--lessons", type=int, default=10, help="number of lessons")
+    parser.add_argument("--words", type=int, default=12, help="mean words per attempt")
+    parser.add_argument("--mean-attempts", type=float, default=15, help="mean attempts per practice day")
+    parser.add_argument("--audio-seconds", type=float, default=0, help="also place a WAV of this length next to every attempt")
+    parser.add_argument("--password", default="synthetic", help="password of every generated user")
+    parser.add_argument("--prefix", default="synthetic", help="user name prefix")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parallel worker processes")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    width = len(str(args.users - 1))
+    user_names = [f"{args.prefix}_{i:0{width}d}" for i in range(args.users)]
+    start_date = date.fromisoformat(args.end_date) - timedelta(days=args.days - 1)
+    prepare_root(root, user_names, args.password)
+    # imported once here so the forked workers share it
+    import echo_learning
+
+    audio_template = None
+    if args.audio_seconds:
+        os.makedirs(os.path.join("database", "all_users"), exist_ok=True)
+        audio_template = make_wav(os.path.abspath(os.path.join("database", "all_users", "synthetic_template.wav")),
+                                  args.audio_seconds)
+
+    start = time.perf_counter()
+    totals = {"users": args.users, "days": 0, "attempts": 0, "bytes": 0}
+    # workers inherit the working directory and the imported app modules
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(generate_user, name, start_date, args.days, args.lessons, args.words,
+                            args.mean_attempts, args.seed * 1000003 + i, audio_template)
+            for i, name in enumerate(user_names)
+        ]
+        for done, future in enumerate(futures, 1):
+            counts = future.result()
+            for key in ("days", "attempts", "bytes"):
+                totals[key] += counts[key]
+            if done % 100 == 0 or done == len(futures):
+                print(f"{done}/{len(futures)} users, {totals['attempts']} attempts")
+    totals["seconds"] = round(time.perf_counter() - start, 1)
+    totals["root"] = root
+    print(json.dumps(totals, indent=4))
+
+if __name__ == "__main__":
+    main()
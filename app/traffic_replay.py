@@ -0,0 +1,162 @@
+"""
+Record and replay of assessment traffic.
+
+TrafficRecorder (opt-in with the Recording.CAPTURE secret) appends one JSON
+line per assessment request to database/recordings/captures-<date>.jsonl:
+arrival time, user, audio hash, reference text, queue wait, service time,
+error and the full Azure JSON response.
+
+MockBackend answers assessments from those captures with the recorded
+latency (optionally scaled) and errors. It plugs into
+assessment.ResilientAssessor like a real SpeechBackend, so the learning page
+can run against captured traffic (Recording.REPLAY_DIR secret) and
+tools/replay_traffic.py can replay the original arrival pattern.
+"""
+import os
+import json
+import time
+import glob
+import hashlib
+import threading
+from datetime import datetime
+import assessment
+from resilience import CircuitBreaker
+
+recordings_path = "database/recordings/"
+
+def audio_hash(audio_file):
+    """Return the sha256 of an audio file."""
+    digest = hashlib.sha256()
+    with open(audio_file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TrafficRecorder:
+    """Append every assessment request and its outcome to a daily JSONL capture file."""
+    def __init__(self, path=recordings_path):
+        """Create the capture folder if needed."""
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, capture):
+        """Append one capture."""
+        file_path = os.path.join(self.path, f"captures-{datetime.now().strftime('%Y-%m-%d')}.jsonl")
+        with self._lock:
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(capture, ensure_ascii=False) + "\n")
+
+    def wrap(self, assess_fn, user_name):
+        """Return assess_fn recording its call; the arrival time is taken now, before queueing."""
+        arrival = time.time()
+
+        def recorded(audio_file, reference_text, options=None, bucket=None):
+            """Run assess_fn and capture the request, response and timings."""
+            start = time.time()
+            result, error = None, None
+            try:
+                result = assess_fn(audio_file, reference_text, options, bucket=bucket)
+                return result
+            except Exception as e:
+                error = {"type": type(e).__name__, "message": str(e)}
+                raise
+            finally:
+                try:
+                    self.write({
+                        "arrival": arrival,
+                        "time": datetime.fromtimestamp(arrival).isoformat(timespec="milliseconds"),
+                        "user": user_name,
+                        "audio_sha256": audio_hash(audio_file),
+                        "audio_bytes": os.path.getsize(audio_file),
+                        "reference_text": reference_text,
+                        "queue_ms": round((start - arrival) * 1000, 2),
+                        "duration_ms": round((time.time() - start) * 1000, 2),
+                        "error": error,
+                        "response": result,
+                    })
+                except Exception as e:
+                    print(f"Failed to record assessment traffic: {e}")
+        return recorded
+
+def load_captures(path=recordings_path):
+    """Load every capture under path (a folder or one .jsonl file), ordered by arrival."""
+    files = [path] if path.endswith(".jsonl") else sorted(glob.glob(os.path.join(path, "*.jsonl")))
+    captures = []
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    captures.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return sorted(captures, key=lambda c: c["arrival"])
+
+class MockBackend:
+    """Assessment backend that answers from captured traffic."""
+    def __init__(self, captures, latency_scale=1.0, name="replay"):
+        """
+        Args:
+            captures: list of capture dicts from load_captures
+            latency_scale: multiplier of the recorded service time (0 answers at once)
+            name: backend name reported by ResilientAssessor
+        """
+        self.name = name
+        self.latency_scale = latency_scale
+        self.breaker = CircuitBreaker(name)
+        self.captures = captures
+        self.by_audio = {(c["audio_sha256"], c["reference_text"]): c for c in captures}
+        self.by_text = {}
+        for capture in captures:
+            self.by_text.setdefault(capture["reference_text"], []).append(capture)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def find(self, audio_sha256, reference_text):
+        """Return the capture of this exact request, one for the same text, or the next one."""
+        capture = self.by_audio.get((audio_sha256, reference_text))
+        if capture is None and self.by_text.get(reference_text):
+            capture = self.by_text[reference_text][-1]
+        if capture is None:
+            if not self.captures:
+                raise assessment.AssessmentError("No captured traffic to replay")
+            with self._lock:
+                capture = self.captures[self._next % len(self.captures)]
+                self._next += 1
+        return capture
+
+    def replay(self, capture):
+        """Wait the recorded service time, then return the recorded response or raise its error."""
+        if self.latency_scale:
+            time.sleep(capture["duration_ms"] / 1000 * self.latency_scale)
+        error = capture.get("error")
+        if error:
+            error_type = getattr(assessment, error["type"], None)
+            if not (isinstance(error_type, type) and issubclass(error_type, Exception)):
+                error_type = assessment.AssessmentError
+            raise error_type(error["message"])
+        return capture["response"]
+
+    def assess(self, audio_file, reference_text, options=None):
+        """Answer like SpeechBackend.assess from the matching capture."""
+        return self.replay(self.find(audio_hash(audio_file), reference_text))
+
+_lock = threading.Lock()
+_recorder = None
+_replay_assessors = {}
+
+def get_recorder():
+    """Return the process-wide TrafficRecorder."""
+    global _recorder
+    with _lock:
+        if _recorder is None:
+            _recorder = TrafficRecorder()
+        return _recorder
+
+def get_replay_assessor(replay_dir, latency_scale=1.0):
+    """Return the process-wide assessor answering from the captures in replay_dir."""
+    with _lock:
+        if replay_dir not in _replay_assessors:
+            backend = MockBackend(load_captures(replay_dir), latency_scale)
+            _replay_assessors[replay_dir] = assessment.ResilientAssessor(backend)
+        return _replay_assessors[replay_dir]
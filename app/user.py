@@ -4,6 +4,9 @@ import streamlit as st
 import bcrypt
 from datetime import datetime
 from datetime import date
+import warehouse
+import object_store
+import phoneme_stats
 
 class User:
     """Represent a user profile and manage auth/history storage."""
@@ -35,15 +38,28 @@ class User:
         # suppose user's name is unique
         return hash(self.name)
 
+    @classmethod
+    def reload_user_info(cls) -> None:
+        """Re-read the shared user info file, picking up users registered by other app processes."""
+        try:
+            with open(cls.user_info_path, "r") as f:
+                cls.user_info = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Failed to reload {cls.user_info_path}: {e}")
+
     def save_to_user_info(self) -> None:
         """Persist the user record to the shared user info file."""
+        # other app processes may have registered users since this one loaded the file
+        User.reload_user_info()
         # update the user_info like registering a new user
         User.user_info[self.name] = {
             "password": self.password,
             "history": []
         }
-        with open(User.user_info_path, 'w') as f:
+        tmp_path = User.user_info_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(User.user_info, f, indent=4)
+        os.replace(tmp_path, User.user_info_path)
 
     def save_pron_history(self, selection:str, pronunciation_result:str):
         """Save a pronunciation result JSON for the current session."""
@@ -53,11 +69,23 @@ class User:
         result_file_path = f"{self.today_path}{selection}-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
         with open(result_file_path, 'w') as f:
             json.dump(pronunciation_result, f, indent=4)
+        object_store.persist(result_file_path)
+        # keep the columnar warehouse in sync without rescanning the history
+        try:
+            warehouse.ingest_attempt(self.name, result_file_path, pronunciation_result)
+        except Exception as e:
+            print(f"Failed to ingest {result_file_path} into the warehouse: {e}")
+        try:
+            phoneme_stats.update_user(self.name, pronunciation_result)
+        except Exception as e:
+            print(f"Failed to update phoneme statistics: {e}")
+        return result_file_path
     
     @classmethod
     def register(cls, name:str, password:str):
         """Register a new user and create storage if the name is free."""
         # check if the user already existed 
+        cls.reload_user_info()
         if name in cls.user_info:
             st.warning("ユーザーは既に存在しています!")
             return None
@@ -133,12 +161,31 @@ class User:
     @classmethod
     def login(cls, name:str, password:str):
         """Authenticate and return a User instance when credentials match."""
+        if name not in User.user_info:
+            # registered by another app process
+            User.reload_user_info()
         if name in User.user_info:
             if User.check_password(User.user_info[name]['password'], password):
                 # user's folder has been already created when in registration
                 return cls(name, password)
         st.warning('入力されたパスワードが間違っています！')
         
+    @classmethod
+    def restore(cls, name:str):
+        """Rebuild an already authenticated user, e.g. from an externalised session, without its password."""
+        if name not in cls.user_info:
+            cls.reload_user_info()
+        if name not in cls.user_info:
+            return None
+        user = cls.__new__(cls)
+        user.name = name
+        user.password = cls.user_info[name]['password']
+        user.user_path = f"database/{name}/"
+        user.practice_history_path = user.user_path + "practice_history/"
+        user.today_path = user.practice_history_path + f"{str(date.today())}/"
+        os.makedirs(user.today_path, exist_ok=True)
+        return user
+
     @staticmethod
     def hash_password(password, rounds=12):
         """Hash a plaintext password with bcrypt."""
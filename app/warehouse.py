@@ -0,0 +1,362 @@
+"""
+Columnar warehouse of pronunciation attempts.
+
+Every attempt JSON written by User.save_pron_history is flattened into three
+Parquet tables (attempts, words, phonemes), partitioned by user and date:
+
+    database/warehouse/<table>/user=<name>/date=<YYYY-MM-DD>/<part>.parquet
+
+A per-user manifest remembers which JSON files were already ingested, so
+re-running the ingestion only touches new attempts. It is append-only
+(one JSON line per file), and ingestion skips attempt_ids the partition
+already holds, so a crash between the Parquet write and the manifest
+append never ingests an attempt twice. Partitions are compacted into one
+file once they collect COMPACT_MIN_PARTS parts; `python app/warehouse.py`
+ingests and compacts everything.
+"""
+import os
+import re
+import json
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+database_path = "database/"
+warehouse_path = "database/warehouse/"
+tables = ("attempts", "words", "phonemes")
+
+# Azure reports offsets and durations in 100ns ticks
+TICKS_PER_SECOND = 10000000
+
+# attempt files are named "<lesson>-<YYYY-mm-dd_HH-MM-SS>.json"
+ATTEMPT_NAME = re.compile(r"^(?P<lesson>.+)-(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})$")
+
+# a partition is merged into one file once it has this many parts
+COMPACT_MIN_PARTS = 8
+
+# columns identifying one row of each table, used to drop duplicates when compacting
+ROW_KEYS = {
+    "attempts": ["attempt_id"],
+    "words": ["attempt_id", "word_index"],
+    "phonemes": ["attempt_id", "word_index", "phoneme_index"],
+}
+
+SCORE_FIELDS = ['AccuracyScore', 'FluencyScore', 'CompletenessScore', 'ProsodyScore', 'PronScore']
+
+SCHEMAS = {
+    "attempts": pa.schema([
+        ("attempt_id", pa.string()),
+        ("lesson", pa.string()),
+        ("timestamp", pa.timestamp("s")),
+        ("display_text", pa.string()),
+        ("offset", pa.float64()),
+        ("duration", pa.float64()),
+        ("n_words", pa.int32()),
+        ("n_errors", pa.int32()),
+    ] + [(field, pa.float64()) for field in SCORE_FIELDS]),
+    "words": pa.schema([
+        ("attempt_id", pa.string()),
+        ("lesson", pa.string()),
+        ("timestamp", pa.timestamp("s")),
+        ("word_index", pa.int32()),
+        ("word", pa.string()),
+        ("offset", pa.float64()),
+        ("duration", pa.float64()),
+        ("accuracy_score", pa.float64()),
+        ("error_type", pa.string()),
+    ]),
+    "phonemes": pa.schema([
+        ("attempt_id", pa.string()),
+        ("lesson", pa.string()),
+        ("timestamp", pa.timestamp("s")),
+        ("word_index", pa.int32()),
+        ("phoneme_index", pa.int32()),
+        ("word", pa.string()),
+        ("phoneme", pa.string()),
+        ("offset", pa.float64()),
+        ("duration", pa.float64()),
+        ("accuracy_score", pa.float64()),
+    ]),
+}
+
+def parse_attempt_name(file_path):
+    """Split an attempt file name into (attempt_id, lesson, timestamp)."""
+    attempt_id = os.path.splitext(os.path.basename(file_path))[0]
+    match = ATTEMPT_NAME.match(attempt_id)
+    if not match:
+        return attempt_id, None, None
+    timestamp = pd.to_datetime(match.group("timestamp"), format="%Y-%m-%d_%H-%M-%S")
+    return attempt_id, match.group("lesson"), timestamp
+
+def _seconds(ticks):
+    """Convert Azure 100ns ticks to seconds, keeping missing values as None."""
+    return ticks / TICKS_PER_SECOND if ticks is not None else None
+
+def flatten_attempt(attempt_id, lesson, timestamp, pronunciation_result):
+    """Flatten one NBest result into attempt, word and phoneme rows."""
+    nbest = pronunciation_result.get("NBest") or [{}]
+    best = nbest[0]
+    overall = best.get("PronunciationAssessment", {})
+    words = best.get("Words", [])
+
+    word_rows = []
+    phoneme_rows = []
+    for word_index, word in enumerate(words):
+        assessment = word.get("PronunciationAssessment", {})
+        word_rows.append({
+            "attempt_id": attempt_id,
+            "lesson": lesson,
+            "timestamp": timestamp,
+            "word_index": word_index,
+            "word": word.get("Word"),
+            "offset": _seconds(word.get("Offset")),
+            "duration": _seconds(word.get("Duration")),
+            "accuracy_score": assessment.get("AccuracyScore"),
+            "error_type": assessment.get("ErrorType", "None"),
+        })
+        for phoneme_index, phoneme in enumerate(word.get("Phonemes", [])):
+            phoneme_rows.append({
+                "attempt_id": attempt_id,
+                "lesson": lesson,
+                "timestamp": timestamp,
+                "word_index": word_index,
+                "phoneme_index": phoneme_index,
+                "word": word.get("Word"),
+                "phoneme": phoneme.get("Phoneme"),
+                "offset": _seconds(phoneme.get("Offset")),
+                "duration": _seconds(phoneme.get("Duration")),
+                "accuracy_score": phoneme.get("PronunciationAssessment", {}).get("AccuracyScore"),
+            })
+
+    attempt_row = {
+        "attempt_id": attempt_id,
+        "lesson": lesson,
+        "timestamp": timestamp,
+        "display_text": pronunciation_result.get("DisplayText"),
+        "offset": _seconds(pronunciation_result.get("Offset")),
+        "duration": _seconds(pronunciation_result.get("Duration")),
+        "n_words": len(words),
+        "n_errors": sum(1 for row in word_rows if row["error_type"] not in (None, "None")),
+    }
+    for field in SCORE_FIELDS:
+        attempt_row[field] = overall.get(field)
+
+    return {"attempts": [attempt_row], "words": word_rows, "phonemes": phoneme_rows}
+
+def _partition_dir(table, user_name, date):
+    """Return the hive-style partition folder for a table."""
+    return os.path.join(warehouse_path, table, f"user={user_name}", f"date={date}")
+
+def _parquet_parts(partition_dir):
+    """Return the Parquet part names of a partition folder (none if it does not exist)."""
+    if not os.path.isdir(partition_dir):
+        return []
+    return [f for f in os.listdir(partition_dir) if f.endswith('.parquet')]
+
+def partition_attempt_ids(user_name, date):
+    """Return the attempt_ids already stored in a (user, date) partition."""
+    partition_dir = _partition_dir("attempts", user_name, date)
+    if not _parquet_parts(partition_dir):
+        return set()
+    ids = ds.dataset(partition_dir, format="parquet").to_table(columns=["attempt_id"]).column("attempt_id")
+    return set(ids.to_pylist())
+
+def _write_partition(user_name, date, rows):
+    """Append one Parquet part per table to the (user, date) partition."""
+    part_name = f"part-{uuid.uuid4().hex}.parquet"
+    for table in tables:
+        if not rows[table]:
+            continue
+        partition_dir = _partition_dir(table, user_name, date)
+        os.makedirs(partition_dir, exist_ok=True)
+        arrow_table = pa.Table.from_pylist(rows[table], schema=SCHEMAS[table])
+        # write to a temporary name first so readers never see half a file
+        tmp_path = os.path.join(partition_dir, f".{part_name}.tmp")
+        pq.write_table(arrow_table, tmp_path)
+        os.replace(tmp_path, os.path.join(partition_dir, part_name))
+
+def _manifest_file(user_name):
+    """Return the path of the ingestion manifest for a user."""
+    return os.path.join(warehouse_path, "_manifests", f"{user_name}.jsonl")
+
+def load_manifest(user_name):
+    """Load the {relative json path: mtime} manifest of ingested attempts."""
+    manifest = {}
+    # manifests written as one JSON document before the append-only format
+    legacy_file = os.path.splitext(_manifest_file(user_name))[0] + ".json"
+    if os.path.exists(legacy_file):
+        with open(legacy_file, 'r', encoding='utf-8') as f:
+            manifest.update(json.load(f))
+    manifest_file = _manifest_file(user_name)
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut off by a crash; its attempt is found in the partition again
+                    continue
+                manifest[entry["path"]] = entry["mtime"]
+    return manifest
+
+def append_manifest(user_name, entries):
+    """Append {relative json path: mtime} entries to the ingestion manifest of a user."""
+    manifest_file = _manifest_file(user_name)
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    with open(manifest_file, 'a', encoding='utf-8') as f:
+        for path, mtime in entries.items():
+            f.write(json.dumps({"path": path, "mtime": mtime}, ensure_ascii=False) + "\n")
+
+def list_attempt_files(user_name):
+    """Yield (date, json path) for every saved attempt of a user."""
+    history_path = os.path.join(database_path, user_name, "practice_history")
+    if not os.path.isdir(history_path):
+        return
+    for date in sorted(os.listdir(history_path)):
+        day_path = os.path.join(history_path, date)
+        if not os.path.isdir(day_path):
+            continue
+        # only the top level of a day folder holds attempts, scores/ holds aggregates
+        for file_name in sorted(os.listdir(day_path)):
+            if file_name.endswith('.json'):
+                yield date, os.path.join(day_path, file_name)
+
+def list_users():
+    """Return every user folder that has a practice history."""
+    if not os.path.isdir(database_path):
+        return []
+    return sorted(
+        name for name in os.listdir(database_path)
+        if os.path.isdir(os.path.join(database_path, name, "practice_history"))
+    )
+
+def ingest_attempt(user_name, result_file_path, pronunciation_result):
+    """Ingest a freshly saved attempt without rescanning the history."""
+    date = os.path.basename(os.path.dirname(os.path.normpath(result_file_path)))
+    attempt_id, lesson, timestamp = parse_attempt_name(result_file_path)
+    if attempt_id not in partition_attempt_ids(user_name, date):
+        rows = flatten_attempt(attempt_id, lesson, timestamp, pronunciation_result)
+        _write_partition(user_name, date, rows)
+        compact_user_date(user_name, date)
+    append_manifest(user_name, {
+        os.path.relpath(result_file_path, database_path): os.path.getmtime(result_file_path)
+    })
+
+def ingest_user(user_name):
+    """Ingest every attempt of a user that is not in the manifest yet."""
+    manifest = load_manifest(user_name)
+    pending = {}
+    ingested = {}
+    stored_ids = {}
+    for date, file_path in list_attempt_files(user_name):
+        key = os.path.relpath(file_path, database_path)
+        if key in manifest:
+            continue
+        attempt_id, lesson, timestamp = parse_attempt_name(file_path)
+        if date not in stored_ids:
+            stored_ids[date] = partition_attempt_ids(user_name, date)
+        if attempt_id in stored_ids[date]:
+            # written before a crash cut off its manifest entry
+            ingested[key] = os.path.getmtime(file_path)
+            continue
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                pronunciation_result = json.load(f)
+        except Exception as e:
+            print(f"Skipping {file_path}: {e}")
+            continue
+        rows = flatten_attempt(attempt_id, lesson, timestamp, pronunciation_result)
+        day_rows = pending.setdefault(date, {table: [] for table in tables})
+        for table in tables:
+            day_rows[table].extend(rows[table])
+        ingested[key] = os.path.getmtime(file_path)
+
+    # one part per touched day keeps the number of small files low
+    for date, rows in pending.items():
+        _write_partition(user_name, date, rows)
+        compact_user_date(user_name, date)
+    if ingested:
+        append_manifest(user_name, ingested)
+    return sum(len(rows["attempts"]) for rows in pending.values())
+
+def ingest_all():
+    """Incrementally ingest the history of every user."""
+    ingested = {}
+    for user_name in list_users():
+        ingested[user_name] = ingest_user(user_name)
+    return ingested
+
+def compact_partition(table, user_name, date, min_parts=2):
+    """Merge the parts of one partition into a single Parquet file once it has min_parts of them."""
+    partition_dir = _partition_dir(table, user_name, date)
+    parts = _parquet_parts(partition_dir)
+    if len(parts) < max(min_parts, 2):
+        return False
+    merged = pa.concat_tables([pq.read_table(os.path.join(partition_dir, f)) for f in parts])
+    # rows ingested twice (e.g. by an older version after a crash) are kept once
+    merged = pa.Table.from_pandas(
+        merged.to_pandas().drop_duplicates(subset=ROW_KEYS[table]), schema=SCHEMAS[table], preserve_index=False
+    )
+    part_name = f"part-{uuid.uuid4().hex}.parquet"
+    tmp_path = os.path.join(partition_dir, f".{part_name}.tmp")
+    pq.write_table(merged, tmp_path)
+    os.replace(tmp_path, os.path.join(partition_dir, part_name))
+    for f in parts:
+        os.remove(os.path.join(partition_dir, f))
+    return True
+
+def compact_user_date(user_name, date, min_parts=COMPACT_MIN_PARTS):
+    """Compact the (user, date) partition of every table that has collected min_parts parts."""
+    for table in tables:
+        compact_partition(table, user_name, date, min_parts)
+
+def compact_all(min_parts=2):
+    """Compact every partition with more than one part; return how many were merged."""
+    merged = 0
+    for table in tables:
+        table_path = os.path.join(warehouse_path, table)
+        if not os.path.isdir(table_path):
+            continue
+        for user_dir in sorted(os.listdir(table_path)):
+            if not user_dir.startswith("user="):
+                continue
+            for date_dir in sorted(os.listdir(os.path.join(table_path, user_dir))):
+                if date_dir.startswith("date="):
+                    merged += compact_partition(table, user_dir[len("user="):], date_dir[len("date="):], min_parts)
+    return merged
+
+def load_table(table, users=None, dates=None, columns=None):
+    """
+    Scan a warehouse table into a DataFrame.
+
+    Args:
+        table: one of "attempts", "words" or "phonemes"
+        users: optional list of user names to keep
+        dates: optional list of "YYYY-MM-DD" dates to keep
+        columns: optional list of columns to read
+
+    Returns:
+        pandas.DataFrame with the "user" and "date" partition columns added
+    """
+    table_path = os.path.join(warehouse_path, table)
+    if not os.path.isdir(table_path):
+        return pd.DataFrame(columns=SCHEMAS[table].names + ["user", "date"])
+
+    partitioning = ds.partitioning(
+        pa.schema([("user", pa.string()), ("date", pa.string())]), flavor="hive"
+    )
+    dataset = ds.dataset(table_path, format="parquet", partitioning=partitioning)
+    filters = None
+    if users is not None:
+        filters = ds.field("user").isin(list(users))
+    if dates is not None:
+        date_filter = ds.field("date").isin(list(dates))
+        filters = date_filter if filters is None else filters & date_filter
+    return dataset.to_table(columns=columns, filter=filters).to_pandas()
+
+if __name__ == "__main__":
+    for name, count in ingest_all().items():
+        print(f"{name}: {count} new attempts")
+    print(f"{compact_all()} partitions compacted")
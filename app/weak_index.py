@@ -0,0 +1,152 @@
+"""
+Persistent inverted index of the words and phonemes a learner practised.
+
+The index lives in database/<user>/weak_index.json:
+
+    {
+        "attempts": 12,
+        "words": {
+            "<word>": {"attempts": 3, "score_sum": 180.0, "mean_accuracy": 60.0,
+                       "error_types": {"Mispronunciation": 2}, "last_seen": "..."}
+        },
+        "phonemes": {"<phoneme>": {"<word>": {"count": 4, "score_sum": 210.0}}}
+    }
+
+store_scores updates it after every assessment, so questions such as "which
+words does this learner keep mispronouncing?" are dictionary lookups instead
+of a rescan of practice_history.
+"""
+import os
+import json
+import pandas as pd
+from datetime import datetime
+import warehouse
+
+database_path = "database/"
+
+# in-process cache of {user: (mtime, index)}
+_cache = {}
+
+def empty_index():
+    """Return an index with no attempts recorded."""
+    return {"attempts": 0, "words": {}, "phonemes": {}}
+
+def normalize_word(word):
+    """Normalise a word so that case and surrounding punctuation do not split entries."""
+    return word.strip(".,!?;:\"'()").lower()
+
+def _index_file(user_name):
+    """Return the path of the weak index of a user."""
+    return os.path.join(database_path, user_name, "weak_index.json")
+
+def save_index(user_name, index):
+    """Persist the index of a user and refresh the in-process cache."""
+    index_file = _index_file(user_name)
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    tmp_file = index_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_file, index_file)
+    _cache[user_name] = (os.path.getmtime(index_file), index)
+
+def load_index(user_name):
+    """Load the index of a user, building it from the history on first use."""
+    index_file = _index_file(user_name)
+    if not os.path.exists(index_file):
+        return build_index(user_name)
+    mtime = os.path.getmtime(index_file)
+    cached = _cache.get(user_name)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(index_file, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    _cache[user_name] = (mtime, index)
+    return index
+
+def add_word(index, word, accuracy_score, error_type, seen_at):
+    """Record one occurrence of a word."""
+    entry = index["words"].setdefault(word, {
+        "attempts": 0, "score_sum": 0.0, "mean_accuracy": 0.0, "error_types": {}, "last_seen": None
+    })
+    entry["attempts"] += 1
+    entry["score_sum"] += accuracy_score
+    entry["mean_accuracy"] = entry["score_sum"] / entry["attempts"]
+    if error_type and error_type != "None":
+        entry["error_types"][error_type] = entry["error_types"].get(error_type, 0) + 1
+    if entry["last_seen"] is None or seen_at > entry["last_seen"]:
+        entry["last_seen"] = seen_at
+
+def add_phoneme(index, phoneme, word, accuracy_score):
+    """Record one occurrence of a phoneme inside a word."""
+    entry = index["phonemes"].setdefault(phoneme, {}).setdefault(word, {"count": 0, "score_sum": 0.0})
+    entry["count"] += 1
+    entry["score_sum"] += accuracy_score
+
+def add_attempt(index, pronunciation_result, seen_at=None):
+    """Fold one assessment result into the index."""
+    seen_at = seen_at or datetime.now().isoformat(timespec="seconds")
+    for word in pronunciation_result["NBest"][0]["Words"]:
+        assessment = word.get("PronunciationAssessment", {})
+        word_text = normalize_word(word["Word"])
+        add_word(index, word_text, assessment.get("AccuracyScore", 0), assessment.get("ErrorType"), seen_at)
+        for phoneme in word.get("Phonemes", []):
+            score = phoneme.get("PronunciationAssessment", {}).get("AccuracyScore", 0)
+            add_phoneme(index, phoneme["Phoneme"], word_text, score)
+    index["attempts"] += 1
+    return index
+
+def update(user_name, pronunciation_result):
+    """Add a freshly assessed attempt to the persistent index of a user."""
+    if not os.path.exists(_index_file(user_name)):
+        # save_pron_history already put this attempt in the warehouse, so a rebuild includes it
+        return build_index(user_name)
+    index = load_index(user_name)
+    add_attempt(index, pronunciation_result)
+    save_index(user_name, index)
+    return index
+
+def build_index(user_name):
+    """Rebuild the index of a user from the warehouse tables."""
+    warehouse.ingest_user(user_name)
+    index = empty_index()
+    words_df = warehouse.load_table(
+        "words", users=[user_name],
+        columns=["attempt_id", "timestamp", "word", "accuracy_score", "error_type"]
+    ).dropna(subset=["word"]).fillna({"accuracy_score": 0})
+    for row in words_df.itertuples(index=False):
+        seen_at = row.timestamp.isoformat() if pd.notna(row.timestamp) else ""
+        add_word(index, normalize_word(row.word), row.accuracy_score, row.error_type, seen_at)
+    phonemes_df = warehouse.load_table(
+        "phonemes", users=[user_name], columns=["word", "phoneme", "accuracy_score"]
+    ).dropna(subset=["word", "phoneme"]).fillna({"accuracy_score": 0})
+    for row in phonemes_df.itertuples(index=False):
+        add_phoneme(index, row.phoneme, normalize_word(row.word), row.accuracy_score)
+    index["attempts"] = int(words_df["attempt_id"].nunique())
+    save_index(user_name, index)
+    return index
+
+def lookup_word(index, word):
+    """Return the statistics of a word, or None if it was never practised."""
+    return index["words"].get(normalize_word(word))
+
+def words_with_phoneme(index, phoneme):
+    """Return {word: {"count", "score_sum"}} of the words containing a phoneme."""
+    return index["phonemes"].get(phoneme, {})
+
+def weakest_words(index, top=10, min_attempts=1):
+    """Return the lowest-accuracy words as (word, entry) pairs."""
+    candidates = [
+        (word, entry) for word, entry in index["words"].items()
+        if entry["attempts"] >= min_attempts
+    ]
+    candidates.sort(key=lambda item: item[1]["mean_accuracy"])
+    return candidates[:top]
+
+def frequent_errors(index, top=10):
+    """Return the words with the most recorded errors as (word, error count) pairs."""
+    counts = [
+        (word, sum(entry["error_types"].values())) for word, entry in index["words"].items()
+    ]
+    counts = [item for item in counts if item[1] > 0]
+    counts.sort(key=lambda item: item[1], reverse=True)
+    return counts[:top]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app modules import each other flatly, as under `streamlit run app/echo_app.py`
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
@@ -0,0 +1,59 @@
+"""The first assessed attempt of a learner is counted once in the weak index and the drill queue."""
+import os
+import json
+import warehouse
+import weak_index
+import drill_queue
+
+def make_result(score):
+    """Return a minimal Azure result of one word with one phoneme."""
+    return {
+        "DisplayText": "Hello.",
+        "NBest": [{
+            "PronunciationAssessment": {field: score for field in warehouse.SCORE_FIELDS},
+            "Words": [{
+                "Word": "hello",
+                "Offset": 0,
+                "Duration": 5000000,
+                "PronunciationAssessment": {"AccuracyScore": score, "ErrorType": "Mispronunciation"},
+                "Phonemes": [{"Phoneme": "h", "Offset": 0, "Duration": 1000000,
+                              "PronunciationAssessment": {"AccuracyScore": score}}],
+            }],
+        }],
+    }
+
+def save_attempt(user_name, timestamp, result):
+    """Save an attempt like User.save_pron_history: JSON file, then warehouse ingest."""
+    day_path = os.path.join("database", user_name, "practice_history", timestamp[:10])
+    os.makedirs(day_path, exist_ok=True)
+    file_path = os.path.join(day_path, f"1-{timestamp}.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    warehouse.ingest_attempt(user_name, file_path, result)
+
+def store_attempt(user_name, result, queue=None):
+    """Update the index and the queue in the order store_scores does."""
+    weak_index.update(user_name, result)
+    return drill_queue.record_attempt(user_name, result, queue)
+
+def test_first_attempt_is_counted_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(weak_index, "_cache", {})
+    result = make_result(40.0)
+    save_attempt("learner", "2026-10-19_10-00-00", result)
+    queue = store_attempt("learner", result)
+
+    index = weak_index.load_index("learner")
+    assert index["attempts"] == 1
+    assert index["words"]["hello"]["attempts"] == 1
+    assert queue.items["hello"]["attempts"] == 1
+
+    # later attempts are added incrementally
+    second = make_result(80.0)
+    save_attempt("learner", "2026-10-19_10-05-00", second)
+    queue = store_attempt("learner", second, queue)
+
+    index = weak_index.load_index("learner")
+    assert index["attempts"] == 2
+    assert index["words"]["hello"]["attempts"] == 2
+    assert queue.items["hello"]["attempts"] == 2